@@ -0,0 +1,58 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+from benchmarks import aggregation, codec, encryption, imports, rounds, transport
+
+BENCHMARKS = {
+    'encryption': encryption.run,
+    'aggregation': aggregation.run,
+    'codec': codec.run,
+    'transport': transport.run,
+    'rounds': rounds.run,
+    'imports': imports.run,
+}
+
+def environment():
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description=f"Run benchmarks and emit JSON. Available: {', '.join(BENCHMARKS)}")
+    parser.add_argument('benchmarks', nargs='*', help="benchmarks to run (all by default)")
+    parser.add_argument('--quick', action='store_true', help="small sizes, for a smoke run")
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    report = {'environment': environment(), 'quick': args.quick, 'results': {}, 'durations_s': {}}
+    # Progress output goes to stderr so stdout stays valid JSON.
+    with contextlib.redirect_stdout(sys.stderr):
+        for name in args.benchmarks or BENCHMARKS:
+            start = time.perf_counter()
+            report['results'][name] = BENCHMARKS[name](quick=args.quick)
+            report['durations_s'][name] = time.perf_counter() - start
+            print(f"{name}: done in {report['durations_s'][name]:.1f} s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == '__main__':
+    main()
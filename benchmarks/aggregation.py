@@ -0,0 +1,83 @@
+import argparse
+import time
+import numpy as np
+from federated_learning_framework.aggregation import BLOCK_SIZE, WeightedAggregator, EncryptedAggregator, get_aggregator
+from federated_learning_framework.encryption import PROFILES, DEFAULT_PROFILE, create_context, encrypt_weights, public_context
+from federated_learning_framework.validation import UpdateValidator
+from benchmarks.common import make_weights
+
+ROBUST = ('median', 'trimmed_mean', 'krum')
+
+def bench_plaintext(weights, num_clients):
+    aggregator = WeightedAggregator(np.float32)
+    start = time.perf_counter()
+    for i in range(num_clients):
+        aggregator.add(weights, num_samples=i + 1)
+    aggregator.result()
+    return num_clients / (time.perf_counter() - start)
+
+def bench_encrypted(weights, num_clients, context):
+    # Encrypting is the clients' cost, so every simulated client reuses one ciphertext set.
+    encrypted = encrypt_weights(context, weights)
+    aggregator = EncryptedAggregator(public_context(context))
+    start = time.perf_counter()
+    for i in range(num_clients):
+        aggregator.add(encrypted, num_samples=i + 1)
+    aggregator.result()
+    return num_clients / (time.perf_counter() - start)
+
+def bench_robust(weights, num_clients, name, block_size):
+    # Clients' updates are the same weights plus noise, generated before timing.
+    rng = np.random.default_rng(0)
+    updates = [[weight + rng.normal(0, 0.01, weight.shape).astype(weight.dtype) for weight in weights]
+               for _ in range(num_clients)]
+    aggregator = get_aggregator(name, dtype=np.float32, block_size=block_size)
+    start = time.perf_counter()
+    for update in updates:
+        aggregator.add(update)
+    aggregator.result()
+    return num_clients / (time.perf_counter() - start)
+
+def bench_validation(weights, num_clients, max_norm=1.0):
+    validator = UpdateValidator(max_norm=max_norm)
+    update = [weight + 1 for weight in weights]
+    start = time.perf_counter()
+    for _ in range(num_clients):
+        validator.validate(update, weights)
+    return num_clients / (time.perf_counter() - start)
+
+def run(num_clients=20, num_params=100000, num_layers=4, profile=DEFAULT_PROFILE, quick=False):
+    if quick:
+        num_params, profile = 10000, 'fast'
+    weights = make_weights(num_params, num_layers)
+    return {
+        'clients': num_clients,
+        'params': num_params,
+        'profile': profile,
+        'plaintext_clients_s': bench_plaintext(weights, num_clients),
+        'encrypted_clients_s': bench_encrypted(weights, num_clients, create_context(profile)),
+        'validation_clients_s': bench_validation(weights, num_clients),
+        # block_size None is the single vectorized pass; BLOCK_SIZE bounds the temporaries.
+        'robust': [{'aggregator': name, 'block_size': block_size,
+                    'clients_s': bench_robust(weights, num_clients, name, block_size)}
+                   for name in ROBUST for block_size in (None, BLOCK_SIZE)],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregation throughput: plaintext vs. CKKS, update validation and robust aggregators")
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--params', type=int, default=100000)
+    parser.add_argument('--layers', type=int, default=4)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default=DEFAULT_PROFILE)
+    args = parser.parse_args(argv)
+
+    result = run(args.clients, args.params, args.layers, args.profile)
+    print(f"params={args.params} layers={args.layers} clients={args.clients} profile={args.profile}")
+    print(f"plaintext: {result['plaintext_clients_s']:.1f} clients/s")
+    print(f"encrypted: {result['encrypted_clients_s']:.1f} clients/s")
+    print(f"validation with clipping: {result['validation_clients_s']:.1f} clients/s")
+    for robust in result['robust']:
+        print(f"{robust['aggregator']} (block_size={robust['block_size']}): {robust['clients_s']:.1f} clients/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import time
+import tracemalloc
+from federated_learning_framework.codec import BinaryCodec, PickleCodec
+from benchmarks.common import make_weights
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def bench_codec(codec, message, nbytes):
+    buffers, encode_time, encode_peak = measure(lambda: codec.encode(message))
+    # What the receiver gets off the socket is one contiguous bytes object.
+    data = buffers[0] if len(buffers) == 1 else b''.join(buffers)
+    del buffers
+    _, decode_time, decode_peak = measure(lambda: codec.decode(data))
+    mb = nbytes / 2**20
+    return {
+        'encode_mb_s': mb / encode_time,
+        'decode_mb_s': mb / decode_time,
+        'encode_peak_mb': encode_peak / 2**20,
+        'decode_peak_mb': decode_peak / 2**20,
+    }
+
+def run(num_params=100_000_000, num_layers=20, quick=False):
+    if quick:
+        num_params = 1_000_000
+    weights = make_weights(num_params, num_layers)
+    message = {'weights': weights, 'round': 1, 'num_samples': 128}
+    nbytes = sum(weight.nbytes for weight in weights)
+    return {'params': num_params, 'payload_mb': nbytes / 2**20,
+            **{codec.name: bench_codec(codec, message, nbytes) for codec in (BinaryCodec(), PickleCodec())}}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Wire codec throughput and peak memory, binary vs. pickle")
+    parser.add_argument('--params', type=int, default=100_000_000)
+    parser.add_argument('--layers', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    results = run(args.params, args.layers)
+    print(f"params={args.params} layers={args.layers} payload={results['payload_mb']:.1f} MB")
+    for codec in (BinaryCodec(), PickleCodec()):
+        result = results[codec.name]
+        print(f"{codec.name:>7}: encode {result['encode_mb_s']:.0f} MB/s (peak {result['encode_peak_mb']:.1f} MB), "
+              f"decode {result['decode_mb_s']:.0f} MB/s (peak {result['decode_peak_mb']:.1f} MB)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+import numpy as np
+
+def make_weights(num_params, num_layers):
+    sizes = np.full(num_layers, num_params // num_layers)
+    sizes[0] += num_params - sizes.sum()
+    return [np.random.rand(size).astype(np.float32) for size in sizes]
+
+def payload_mb(weights):
+    return sum(weight.nbytes for weight in weights) / 2**20
+
+def latency_summary(samples):
+    samples = np.asarray(samples) * 1000
+    return {'p50_ms': float(np.percentile(samples, 50)), 'p99_ms': float(np.percentile(samples, 99)),
+            'mean_ms': float(samples.mean())}
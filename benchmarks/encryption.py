@@ -0,0 +1,46 @@
+import argparse
+import time
+from federated_learning_framework.encryption import PROFILES, create_context, decrypt_weights, encrypt_weights
+from benchmarks.common import make_weights, payload_mb
+
+def bench_profile(context, weights):
+    start = time.perf_counter()
+    encrypted = encrypt_weights(context, weights)
+    encrypt_time = time.perf_counter() - start
+    start = time.perf_counter()
+    decrypt_weights(context, encrypted)
+    decrypt_time = time.perf_counter() - start
+    mb = payload_mb(weights)
+    ciphertext_mb = sum(len(chunk) for chunk in encrypted['chunks']) / 2**20
+    return {
+        'encrypt_mb_s': mb / encrypt_time,
+        'decrypt_mb_s': mb / decrypt_time,
+        'chunks': len(encrypted['chunks']),
+        'ciphertext_mb': ciphertext_mb,
+        'expansion': ciphertext_mb / mb,
+    }
+
+def run(sizes=(10_000, 100_000, 1_000_000), profiles=tuple(PROFILES), layers=4, quick=False):
+    if quick:
+        sizes, profiles = (10_000, 100_000), ('fast',)
+    results = []
+    for profile in profiles:
+        context = create_context(profile)
+        for size in sizes:
+            result = bench_profile(context, make_weights(size, layers))
+            results.append({'profile': profile, 'params': size, **result})
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="encrypt_weights/decrypt_weights throughput by model size and CKKS profile")
+    parser.add_argument('--params', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--profiles', choices=sorted(PROFILES), nargs='+', default=sorted(PROFILES))
+    parser.add_argument('--layers', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    for result in run(args.params, args.profiles, args.layers):
+        print(f"{result['profile']:>8} params={result['params']}: encrypt {result['encrypt_mb_s']:.2f} MB/s, "
+              f"decrypt {result['decrypt_mb_s']:.2f} MB/s, {result['chunks']} chunks, {result['expansion']:.1f}x expansion")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# What each target imports. Every measurement runs in a fresh interpreter, so
+# nothing is already cached in sys.modules.
+TARGETS = {
+    'core': "import federated_learning_framework as fl; fl.CentralServer, fl.ClientDevice",
+    'encryption': "from federated_learning_framework.encryption import create_context; create_context('fast')",
+    'tensorflow': "from federated_learning_framework import TensorFlowModel",
+    'pytorch': "from federated_learning_framework import PyTorchModel",
+}
+HEAVY_MODULES = ('tensorflow', 'torch', 'tenseal')
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  'loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+def measure_import(statement, repeats=1):
+    # Best of `repeats` cold imports; max_rss_mb is the child's peak resident set.
+    best = None
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+def run(targets=tuple(TARGETS), repeats=3, quick=False):
+    if quick:
+        targets, repeats = ('core', 'encryption'), 1
+    return [{'target': target, **measure_import(TARGETS[target], repeats)} for target in targets]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold import time and peak RSS of the core package and each backend")
+    parser.add_argument('--targets', choices=sorted(TARGETS), nargs='+', default=list(TARGETS))
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    for result in run(args.targets, args.repeats):
+        print(f"{result['target']:>10}: {result['seconds'] * 1000:.0f} ms, peak RSS {result['max_rss_mb']:.0f} MB, "
+              f"loaded {', '.join(result['loaded']) or 'no backend'}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+import tempfile
+import time
+import numpy as np
+from federated_learning_framework.models.abstract_model import AbstractModel
+from federated_learning_framework.simulation import Simulation
+
+class PerturbModel(AbstractModel):
+    # Stand-in for a real model: "training" nudges the weights, so round time is
+    # the framework's own cost (dispatch, decode, upload, aggregation).
+    def __init__(self, num_params):
+        self.weights = [np.zeros(num_params, dtype=np.float32)]
+        self.rng = np.random.default_rng(0)
+
+    def get_weights(self):
+        return self.weights
+
+    def set_weights(self, weights):
+        self.weights = [np.array(weight, dtype=np.float32) for weight in weights]
+
+    def train(self, x_train, y_train, epochs=1):
+        self.weights[0] += self.rng.standard_normal(self.weights[0].size, dtype=np.float32) * 0.01
+
+    def predict(self, data):
+        return np.zeros(len(data))
+
+def bench_rounds(num_clients, num_params, num_rounds, samples_per_client=4):
+    x = np.zeros((num_clients * samples_per_client, 1), dtype=np.float32)
+    y = np.zeros(num_clients * samples_per_client, dtype=np.float32)
+    with tempfile.TemporaryDirectory() as workdir:
+        setup = time.perf_counter()
+        simulation = Simulation(PerturbModel(num_params), x, y, num_clients, workdir=workdir, seed=0)
+        setup = time.perf_counter() - setup
+        stats = asyncio.run(simulation.run(num_rounds))
+    result = {'clients': num_clients, 'params': num_params, 'rounds': num_rounds, 'setup_s': setup}
+    for key in ('total', 'dispatch', 'slowest_client', 'aggregation'):
+        values = [round_stats[key] for round_stats in stats if round_stats[key] is not None]
+        result[f'{key}_s'] = float(np.mean(values)) if values else None
+    return result
+
+def run(client_counts=(10, 100, 1000, 5000), num_params=100_000, num_rounds=3, quick=False):
+    if quick:
+        client_counts, num_params, num_rounds = (10, 100), 10_000, 2
+    return [bench_rounds(count, num_params, num_rounds) for count in client_counts]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Full-round wall time with N simulated clients")
+    parser.add_argument('--clients', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--params', type=int, default=100_000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    for result in run(args.clients, args.params, args.rounds):
+        print(f"clients={result['clients']} params={result['params']}: round {result['total_s']:.3f} s "
+              f"(dispatch {result['dispatch_s']:.3f} s, aggregation {result['aggregation_s']:.4f} s)")
+
+if __name__ == '__main__':
+    main()
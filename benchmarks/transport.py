@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import time
+from websockets.exceptions import ConnectionClosed
+from federated_learning_framework.connection import ConnectionClient, ConnectionServer
+from benchmarks.common import latency_summary, make_weights, payload_mb
+
+# Loopback benchmarks per transport: request/acknowledge round trips for latency
+# and throughput, and one broadcast to many connected clients for fan-out cost.
+TRANSPORTS = ('websocket', 'tcp', 'shm', 'memory')
+
+def uri(connection_type, port):
+    return f"{'ws' if connection_type == 'websocket' else connection_type}://localhost:{port}"
+
+async def start_server(port, handler, connection_type='websocket'):
+    server = ConnectionServer(connection_type, 'localhost', port, handler)
+    task = asyncio.ensure_future(server.start())
+    await asyncio.sleep(0.2)
+    return server, task
+
+async def connect_clients(port, count, connection_type='websocket'):
+    clients = []
+    for _ in range(count):
+        client = ConnectionClient(connection_type, uri(connection_type, port))
+        await client.connect()
+        clients.append(client)
+    return clients
+
+async def stop(server_task, clients):
+    for client in clients:
+        await client.channel.close()
+    server_task.cancel()
+    await asyncio.gather(server_task, return_exceptions=True)
+
+async def bench_send_receive(num_params, messages, port, connection_type='websocket'):
+    async def handler(websocket, client_id):
+        try:
+            while True:
+                message = await server.receive(client_id)
+                await server.send(client_id, {'ack': message['seq']})
+        except ConnectionClosed:
+            pass
+
+    server, task = await start_server(port, handler, connection_type)
+    clients = await connect_clients(port, 1, connection_type)
+    weights = make_weights(num_params, 4)
+    latencies = []
+    try:
+        started = time.perf_counter()
+        for seq in range(messages):
+            start = time.perf_counter()
+            await clients[0].send({'weights': weights, 'seq': seq})
+            await clients[0].receive()
+            latencies.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - started
+    finally:
+        await stop(task, clients)
+    return {'transport': connection_type, 'params': num_params, 'messages': messages, 'mb_s': payload_mb(weights) * messages / elapsed,
+            **latency_summary(latencies)}
+
+async def bench_broadcast(num_clients, num_params, port, repeats=3, connection_type='websocket'):
+    async def handler(websocket, client_id):
+        try:
+            while True:
+                await server.receive(client_id)
+        except ConnectionClosed:
+            pass
+
+    server, task = await start_server(port, handler, connection_type)
+    clients = await connect_clients(port, num_clients, connection_type)
+    # Stream transports register a client once its hello arrives, after connect() returns.
+    while len(server.clients) < num_clients:
+        await asyncio.sleep(0.01)
+    weights = make_weights(num_params, 4)
+    times = []
+    try:
+        for round_id in range(repeats):
+            start = time.perf_counter()
+            await server.broadcast(list(server.clients), {'weights': weights, 'round': round_id})
+            await asyncio.gather(*[client.receive() for client in clients])
+            times.append(time.perf_counter() - start)
+    finally:
+        await stop(task, clients)
+    return {'transport': connection_type, 'clients': num_clients, 'params': num_params, **latency_summary(times),
+            'per_client_ms': 1000 * min(times) / num_clients}
+
+async def run_async(sizes, messages, client_counts, broadcast_params, port, transports):
+    send_receive = [await bench_send_receive(size, messages, port, connection_type=connection_type)
+                    for connection_type in transports for size in sizes]
+    fan_out = [await bench_broadcast(count, broadcast_params, port, connection_type=connection_type)
+               for connection_type in transports for count in client_counts]
+    return {'send_receive': send_receive, 'broadcast': fan_out}
+
+def run(sizes=(1_000, 100_000, 1_000_000), messages=50, client_counts=(1, 10, 50, 100), broadcast_params=100_000,
+        port=8770, quick=False, transports=TRANSPORTS):
+    if quick:
+        sizes, messages, client_counts = (1_000, 100_000), 20, (1, 10)
+    return asyncio.run(run_async(sizes, messages, client_counts, broadcast_params, port, transports))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ConnectionServer throughput, latency and broadcast fan-out per transport over loopback")
+    parser.add_argument('--params', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 10, 50, 100])
+    parser.add_argument('--broadcast-params', type=int, default=100_000)
+    parser.add_argument('--port', type=int, default=8770)
+    parser.add_argument('--transports', choices=TRANSPORTS, nargs='+', default=list(TRANSPORTS))
+    args = parser.parse_args(argv)
+
+    results = run(args.params, args.messages, args.clients, args.broadcast_params, args.port,
+                  transports=args.transports)
+    for result in results['send_receive']:
+        print(f"{result['transport']:>9} send/receive params={result['params']}: {result['mb_s']:.1f} MB/s, "
+              f"p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms")
+    for result in results['broadcast']:
+        print(f"{result['transport']:>9} broadcast clients={result['clients']}: p50 {result['p50_ms']:.2f} ms, "
+              f"{result['per_client_ms']:.3f} ms per client")
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,36 @@
-from .active_learning import query_active_learning
-from .central_server import CentralServer
-from .client_device import ClientDevice
-from .connection import ConnectionServer, ConnectionClient
-from .decorators import federated_learning_decorator, encryption_decorator
-from .encryption import create_context, encrypt_weights, decrypt_weights
-from .models.tensorflow_model import TensorFlowModel
-from .models.pytorch_model import PyTorchModel
-from .utils import setup_logging
+# Public names are resolved on first access (PEP 562), so `import
+# federated_learning_framework` only loads the core package: TensorFlow, PyTorch
+# and TenSEAL are imported when a backend model or encryption is actually used.
+import importlib
+
+_EXPORTS = {
+    'query_active_learning': '.active_learning',
+    'CentralServer': '.central_server',
+    'AsyncCentralServer': '.async_server',
+    'RoundScheduler': '.scheduler',
+    'Simulation': '.simulation',
+    'ClientDevice': '.client_device',
+    'ConnectionServer': '.connection',
+    'ConnectionClient': '.connection',
+    'federated_learning_decorator': '.decorators',
+    'encryption_decorator': '.decorators',
+    'create_context': '.encryption',
+    'encrypt_weights': '.encryption',
+    'decrypt_weights': '.encryption',
+    'TensorFlowModel': '.models.tensorflow_model',
+    'PyTorchModel': '.models.pytorch_model',
+    'setup_logging': '.utils',
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,7 +1,120 @@
 import numpy as np
 
-def query_active_learning(model, unlabeled_data, num_samples):
-    predictions = model.predict(unlabeled_data)
-    uncertainty = predictions.max(axis=1)
-    selected_indices = np.argsort(uncertainty)[:num_samples]
-    return selected_indices
+# Uncertainty scores for a batch of class probabilities; higher means more informative.
+def least_confidence(probabilities):
+    return 1.0 - probabilities.max(axis=1)
+
+def margin(probabilities):
+    # One minus the gap between the two most likely classes.
+    if probabilities.shape[1] < 2:
+        return least_confidence(probabilities)
+    top2 = np.partition(probabilities, -2, axis=1)[:, -2:]
+    return 1.0 - (top2[:, 1] - top2[:, 0])
+
+def entropy(probabilities):
+    return -np.sum(probabilities * np.log(np.clip(probabilities, 1e-12, None)), axis=1)
+
+STRATEGIES = {'least_confidence': least_confidence, 'margin': margin, 'entropy': entropy}
+
+def to_probabilities(outputs, from_logits=False):
+    outputs = np.asarray(outputs, dtype=np.float64)
+    if outputs.ndim == 1:
+        outputs = outputs[:, None]
+    if outputs.shape[1] == 1:
+        # A single sigmoid unit: the probability of the positive class.
+        positive = 1.0 / (1.0 + np.exp(-outputs)) if from_logits else outputs
+        return np.hstack([1.0 - positive, positive])
+    if from_logits:
+        outputs = np.exp(outputs - outputs.max(axis=1, keepdims=True))
+        outputs /= outputs.sum(axis=1, keepdims=True)
+    return outputs
+
+class TopK:
+    # Running top-k of (score, index) pairs, optionally with a feature row per
+    # entry. Each push merges the batch into the current k with argpartition, so
+    # a stream of n scores costs O(n + k) per batch and O(k) memory, never a full sort.
+    # With k == 0 nothing is kept.
+    def __init__(self, k):
+        if k < 0:
+            raise ValueError(f"k must be non-negative, got {k}")
+        self.k = k
+        self.scores = np.empty(0, dtype=np.float64)
+        self.indices = np.empty(0, dtype=np.int64)
+        self.features = None
+
+    def push(self, scores, indices, features=None):
+        scores = np.concatenate([self.scores, np.asarray(scores, dtype=np.float64)])
+        indices = np.concatenate([self.indices, np.asarray(indices, dtype=np.int64)])
+        if features is not None:
+            features = np.asarray(features) if self.features is None else np.concatenate([self.features, features])
+        if len(scores) > self.k:
+            keep = np.argpartition(-scores, self.k - 1)[:self.k] if self.k else np.empty(0, dtype=np.int64)
+            scores, indices = scores[keep], indices[keep]
+            if features is not None:
+                features = features[keep]
+        self.scores, self.indices, self.features = scores, indices, features
+
+    def result(self):
+        # (indices, scores[, features]) ordered from the most to the least informative.
+        order = np.argsort(-self.scores, kind='stable')
+        if self.features is None:
+            return self.indices[order], self.scores[order]
+        return self.indices[order], self.scores[order], self.features[order]
+
+def iter_batches(unlabeled_data, batch_size):
+    # Arrays and memory-mapped arrays are sliced in place; any other iterable is
+    # taken to yield batches already. Yields (offset, batch).
+    if hasattr(unlabeled_data, '__getitem__') and hasattr(unlabeled_data, '__len__'):
+        for start in range(0, len(unlabeled_data), batch_size):
+            yield start, unlabeled_data[start:start + batch_size]
+        return
+    offset = 0
+    for batch in unlabeled_data:
+        yield offset, batch
+        offset += len(batch)
+
+def diverse_subset(features, scores, num_samples):
+    # Greedy farthest-first selection over the candidates: start from the most
+    # informative one and repeatedly add the candidate farthest from everything
+    # already chosen, so near-duplicates are not all queried together.
+    if len(features) == 0 or num_samples <= 0:
+        return np.empty(0, dtype=np.int64)
+    features = np.asarray(features, dtype=np.float64).reshape(len(features), -1)
+    chosen = [int(np.argmax(scores))]
+    distances = np.sum((features - features[chosen[0]]) ** 2, axis=1)
+    while len(chosen) < min(num_samples, len(features)):
+        candidate = int(np.argmax(distances))
+        chosen.append(candidate)
+        np.minimum(distances, np.sum((features - features[candidate]) ** 2, axis=1), out=distances)
+    return np.asarray(chosen, dtype=np.int64)
+
+def score_pool(model, unlabeled_data, k, strategy='least_confidence', batch_size=1024, from_logits=False,
+               keep_features=False):
+    # Streams the pool through the model in `batch_size` batches and returns the
+    # TopK of the k highest scores. Only one batch of predictions is held at a time.
+    score = STRATEGIES[strategy] if isinstance(strategy, str) else strategy
+    # Keras models predict a batch without building a dataset or printing progress.
+    predict = getattr(model, 'predict_on_batch', None) or model.predict
+    top = TopK(k)
+    for offset, batch in iter_batches(unlabeled_data, batch_size):
+        probabilities = to_probabilities(predict(batch), from_logits)
+        top.push(score(probabilities), np.arange(offset, offset + len(probabilities)),
+                 probabilities if keep_features else None)
+    return top
+
+def query_active_learning(model, unlabeled_data, num_samples, strategy='least_confidence', batch_size=1024,
+                          diversity=None, from_logits=False):
+    # Indices of the `num_samples` most informative samples, most informative
+    # first. `unlabeled_data` can be an array, a memory-mapped array or an
+    # iterable of batches. `strategy` is one of STRATEGIES or a function of a
+    # (batch, classes) probability array. With `diversity` (a factor >= 1) the
+    # diversity * num_samples top candidates are thinned to num_samples by
+    # farthest-first selection on their predicted class distributions.
+    candidates = num_samples if diversity is None else max(int(num_samples * diversity), num_samples)
+    top = score_pool(model, unlabeled_data, candidates, strategy, batch_size, from_logits,
+                     keep_features=diversity is not None)
+    if diversity is None or top.features is None:
+        # An empty pool never pushed any features: there is nothing to thin.
+        return top.result()[0]
+    indices, scores, features = top.result()
+    return indices[diverse_subset(features, scores, num_samples)]
@@ -0,0 +1,363 @@
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from federated_learning_framework.encryption import load_encrypted, slot_count
+
+# Elements per task when an update is split across worker threads.
+BLOCK_SIZE = 1 << 20
+
+class WeightedAggregator:
+    # Streaming FedAvg: each update is folded into a running sample-weighted sum.
+    # Accumulators are allocated from the first update and reused across rounds,
+    # so memory stays at one model copy no matter how many clients report.
+    # With workers > 1 each update is split into BLOCK_SIZE slices that are
+    # scaled and accumulated on a thread pool, each thread using its own scratch.
+    def __init__(self, dtype=np.float64, workers=1):
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError(f"Unsupported accumulator dtype {self.dtype}")
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='aggregation') if workers > 1 else None
+        self.local = threading.local()
+        self.accumulators = None
+        self.layer_dtypes = None
+        self.scratch = None
+        self.total_samples = 0
+        self.num_updates = 0
+
+    def _allocate(self, weights):
+        self.accumulators = [np.zeros(np.shape(weight), dtype=self.dtype) for weight in weights]
+        self.layer_dtypes = [np.asarray(weight).dtype for weight in weights]
+        largest = max((acc.size for acc in self.accumulators), default=0)
+        self.scratch = np.empty(largest, dtype=self.dtype)
+
+    def add(self, weights, num_samples=1):
+        if num_samples <= 0:
+            raise ValueError(f"num_samples must be positive, got {num_samples}")
+        if self.accumulators is None:
+            self._allocate(weights)
+        elif len(weights) != len(self.accumulators):
+            raise ValueError(f"Expected {len(self.accumulators)} layers, got {len(weights)}")
+        weights = [np.asarray(weight) for weight in weights]
+        for acc, weight in zip(self.accumulators, weights):
+            if weight.shape != acc.shape:
+                raise ValueError(f"Layer shape mismatch: expected {acc.shape}, got {weight.shape}")
+        if self.executor is None or sum(acc.size for acc in self.accumulators) < 2 * BLOCK_SIZE:
+            for acc, weight in zip(self.accumulators, weights):
+                self._scale_add(acc, weight, num_samples, self.scratch)
+        else:
+            blocks = [(acc.reshape(-1)[start:start + BLOCK_SIZE], weight.reshape(-1)[start:start + BLOCK_SIZE])
+                      for acc, weight in zip(self.accumulators, weights) for start in range(0, acc.size, BLOCK_SIZE)]
+            list(self.executor.map(lambda block: self._scale_add(*block, num_samples, self._thread_scratch()), blocks))
+        self.total_samples += num_samples
+        self.num_updates += 1
+
+    def _scale_add(self, acc, weight, num_samples, scratch):
+        scaled = scratch[:acc.size].reshape(acc.shape)
+        np.multiply(weight, num_samples, out=scaled, casting='unsafe')
+        acc += scaled
+
+    def _thread_scratch(self):
+        if getattr(self.local, 'scratch', None) is None:
+            self.local.scratch = np.empty(BLOCK_SIZE, dtype=self.dtype)
+        return self.local.scratch
+
+    def add_partial(self, weighted_sum, num_samples, num_updates=1):
+        # Merges a sum that is already sample-weighted, e.g. another aggregator's partial().
+        if self.accumulators is None:
+            self._allocate(weighted_sum)
+            self.layer_dtypes = [np.dtype(np.float32)] * len(self.accumulators)
+        elif len(weighted_sum) != len(self.accumulators):
+            raise ValueError(f"Expected {len(self.accumulators)} layers, got {len(weighted_sum)}")
+        for acc, partial in zip(self.accumulators, weighted_sum):
+            acc += np.asarray(partial).reshape(acc.shape)
+        self.total_samples += num_samples
+        self.num_updates += num_updates
+
+    def partial(self):
+        # The unnormalized sum and its sample count, for forwarding to a parent aggregator.
+        if not self.total_samples:
+            return None
+        return [acc.copy() for acc in self.accumulators], self.total_samples
+
+    def result(self):
+        if not self.total_samples:
+            return None
+        scale = 1.0 / self.total_samples
+        return [(acc * scale).astype(dtype, copy=False) for acc, dtype in zip(self.accumulators, self.layer_dtypes)]
+
+    def reset(self):
+        if self.accumulators is not None:
+            for acc in self.accumulators:
+                acc.fill(0)
+        self.total_samples = 0
+        self.num_updates = 0
+
+
+# Robust aggregation over a stacked (clients, params) update matrix. Each
+# function is plain vectorized NumPy over the rows it is given, so the same code
+# serves the whole matrix or a block of its columns.
+def coordinate_median(matrix):
+    return np.median(matrix, axis=0)
+
+def trimmed_mean(matrix, trim):
+    # Per coordinate, drops the int(trim * n) largest and smallest values and
+    # averages the rest. One partition instead of a sort.
+    n = len(matrix)
+    k = int(trim * n)
+    if k == 0:
+        return matrix.mean(axis=0, dtype=np.float64)
+    return np.partition(matrix, (k, n - k - 1), axis=0)[k:n - k].mean(axis=0, dtype=np.float64)
+
+def gram(matrix):
+    # Row inner products of a column block, centered first: distances do not
+    # change, but the cancellation in |a|^2 + |b|^2 - 2ab does.
+    block = np.asarray(matrix, dtype=np.float64)
+    block = block - block.mean(axis=0)
+    return block @ block.T
+
+def krum_scores(gram_matrix, byzantine):
+    # Krum: each update's score is the sum of squared distances to its
+    # n - byzantine - 2 nearest other updates; honest updates score lowest.
+    n = len(gram_matrix)
+    if n == 1:
+        return np.zeros(1)
+    squares = np.diag(gram_matrix)
+    distances = np.maximum(squares[:, None] + squares[None, :] - 2 * gram_matrix, 0)
+    np.fill_diagonal(distances, np.inf)
+    neighbours = min(max(n - byzantine - 2, 1), n - 1)
+    return np.partition(distances, neighbours - 1, axis=1)[:, :neighbours].sum(axis=1)
+
+
+class StackedAggregator:
+    # Base for the robust aggregators. Every update is flattened into one row of
+    # a (clients, params) matrix of `dtype` (float32 by default), allocated from
+    # the first update and reused across rounds. The server calls reserve() with
+    # the round's quorum before its first update, so the matrix is allocated once
+    # at that size: clients x params x 4 bytes. Only an update beyond the
+    # reservation grows it, by half, with a copy. result() combines the rows:
+    # with block_size=None in one vectorized call over the whole matrix, which
+    # needs temporaries the size of the matrix, otherwise over column blocks of
+    # about block_size elements, so they stay at one block (per worker thread).
+    # Robust estimates ignore num_samples, which clients report themselves;
+    # total_samples is still counted for the round records and for partial().
+    def __init__(self, dtype=np.float32, workers=1, block_size=BLOCK_SIZE):
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError(f"Unsupported accumulator dtype {self.dtype}")
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='aggregation') if workers > 1 else None
+        self.block_size = block_size
+        self.capacity = 8
+        self.rows = None
+        self.shapes = None
+        self.layer_dtypes = None
+        self.total_samples = 0
+        self.num_updates = 0
+
+    def add(self, weights, num_samples=1):
+        if num_samples <= 0:
+            raise ValueError(f"num_samples must be positive, got {num_samples}")
+        weights = [np.asarray(weight) for weight in weights]
+        if self.shapes is None:
+            self.shapes = [weight.shape for weight in weights]
+            self.layer_dtypes = [weight.dtype for weight in weights]
+        elif len(weights) != len(self.shapes):
+            raise ValueError(f"Expected {len(self.shapes)} layers, got {len(weights)}")
+        for shape, weight in zip(self.shapes, weights):
+            if weight.shape != shape:
+                raise ValueError(f"Layer shape mismatch: expected {shape}, got {weight.shape}")
+        size = sum(weight.size for weight in weights)
+        if self.rows is None or self.rows.shape[1] != size or (self.num_updates == 0 and len(self.rows) < self.capacity):
+            # Dropped before the new matrix is allocated, so both never coexist.
+            self.rows = None
+            self.rows = np.empty((self.capacity, size), dtype=self.dtype)
+        elif self.num_updates == len(self.rows):
+            grown = np.empty((len(self.rows) + max(len(self.rows) // 2, 1), size), dtype=self.dtype)
+            grown[:self.num_updates] = self.rows
+            self.rows = grown
+        row = self.rows[self.num_updates]
+        offset = 0
+        for weight in weights:
+            row[offset:offset + weight.size] = weight.reshape(-1)
+            offset += weight.size
+        self.total_samples += num_samples
+        self.num_updates += 1
+
+    def reserve(self, num_updates):
+        # Rows for the updates expected this round; takes effect at the next first update.
+        self.capacity = max(int(num_updates), 1)
+
+    def add_partial(self, weighted_sum, num_samples, num_updates=1):
+        raise ValueError(f"{type(self).__name__} cannot merge partial sums; "
+                         "edge aggregators forward their robust estimate instead")
+
+    def matrix(self):
+        return self.rows[:self.num_updates]
+
+    def column_blocks(self):
+        size = self.rows.shape[1]
+        if self.block_size is None:
+            return [slice(0, size)]
+        width = max(self.block_size // self.num_updates, 1)
+        return [slice(start, start + width) for start in range(0, size, width)]
+
+    def map_blocks(self, function):
+        matrix = self.matrix()
+        blocks = self.column_blocks()
+        if self.executor is None or len(blocks) < 2:
+            return [function(matrix[:, block]) for block in blocks]
+        return list(self.executor.map(lambda block: function(matrix[:, block]), blocks))
+
+    def combine(self):
+        # The aggregated flat vector. Column-separable rules only define combine_block.
+        flat = np.empty(self.rows.shape[1], dtype=np.float64)
+        for block, values in zip(self.column_blocks(), self.map_blocks(self.combine_block)):
+            flat[block] = values
+        return flat
+
+    def unflatten(self, flat):
+        layers, offset = [], 0
+        for shape in self.shapes:
+            size = int(np.prod(shape, dtype=np.int64))
+            layers.append(flat[offset:offset + size].reshape(shape))
+            offset += size
+        return layers
+
+    def result(self):
+        if not self.num_updates:
+            return None
+        return [layer.astype(dtype) for layer, dtype in zip(self.unflatten(self.combine()), self.layer_dtypes)]
+
+    def partial(self):
+        # An edge aggregator forwards its robust estimate, weighted by the samples
+        # behind it, as if it were the weighted sum of its clients.
+        if not self.num_updates:
+            return None
+        flat = self.combine()
+        flat *= self.total_samples
+        return self.unflatten(flat), self.total_samples
+
+    def reset(self):
+        # Keeps the row matrix for the next round.
+        self.total_samples = 0
+        self.num_updates = 0
+
+
+class MedianAggregator(StackedAggregator):
+    def combine_block(self, block):
+        return coordinate_median(block)
+
+
+class TrimmedMeanAggregator(StackedAggregator):
+    def __init__(self, dtype=np.float32, workers=1, block_size=BLOCK_SIZE, trim=0.1):
+        if not 0 <= trim < 0.5:
+            raise ValueError(f"trim must be in [0, 0.5), got {trim}")
+        super().__init__(dtype, workers, block_size)
+        self.trim = trim
+
+    def combine_block(self, block):
+        return trimmed_mean(block, self.trim)
+
+
+class KrumAggregator(StackedAggregator):
+    # (Multi-)Krum: the `select` updates with the lowest Krum scores, averaged.
+    # Pairwise distances come from the Gram matrix of the rows, summed over
+    # column blocks, so only an n x n matrix and one block are ever allocated.
+    # `selected` keeps the row indices (in arrival order) chosen last round.
+    def __init__(self, dtype=np.float32, workers=1, block_size=BLOCK_SIZE, byzantine=1, select=1):
+        if byzantine < 0 or select < 1:
+            raise ValueError(f"byzantine must be >= 0 and select >= 1, got {byzantine} and {select}")
+        super().__init__(dtype, workers, block_size)
+        self.byzantine = byzantine
+        self.select = select
+        self.selected = None
+
+    def combine(self):
+        scores = krum_scores(sum(self.map_blocks(gram)), self.byzantine)
+        self.selected = np.argsort(scores, kind='stable')[:self.select]
+        return self.matrix()[np.sort(self.selected)].mean(axis=0, dtype=np.float64)
+
+
+class EncryptedAggregator:
+    # Weighted sum computed directly on packed CKKS ciphertexts (see
+    # encryption.encrypt_weights). Only a public context is needed: each incoming
+    # chunk is deserialized, scaled by its sample count and summed with the
+    # round's accumulator in place, so at most one incoming ciphertext is alive
+    # per chunk. The accumulators are replaced only once every chunk of an update
+    # was loaded and added, so an update TenSEAL rejects part way through leaves
+    # the round as it was. Chunks are processed one after another: TenSEAL gives no
+    # guarantee that one context can be used from several threads at once (see
+    # encryption.encrypt_weights), so only plaintext aggregators use threads.
+    def __init__(self, context):
+        self.context = context
+        self.slots = slot_count(context)
+        self.manifest = None
+        self.accumulators = None
+        self.total_samples = 0
+        self.num_updates = 0
+
+    def add(self, encrypted_weights, num_samples=1):
+        if num_samples <= 0:
+            raise ValueError(f"num_samples must be positive, got {num_samples}")
+        # Always multiply, even by 1, so every summand sits at the same CKKS level.
+        self._accumulate(encrypted_weights, num_samples)
+        self.total_samples += num_samples
+        self.num_updates += 1
+
+    def add_partial(self, weighted_sum, num_samples, num_updates=1):
+        # Partial sums were already scaled by their sample counts, which leaves them
+        # at the same CKKS level as scaled client updates, so they are only added.
+        self._accumulate(weighted_sum, None)
+        self.total_samples += num_samples
+        self.num_updates += num_updates
+
+    def _accumulate(self, encrypted, num_samples):
+        manifest, chunks = encrypted['manifest'], encrypted['chunks']
+        if self.manifest is not None and manifest != self.manifest:
+            raise ValueError("Encrypted update does not match the round's weight manifest")
+        total = sum(math.prod(entry['shape']) for entry in manifest)
+        if len(chunks) != -(-total // self.slots):
+            raise ValueError(f"Expected {-(-total // self.slots)} ciphertext chunks for {total} values, got {len(chunks)}")
+        accumulators = self.accumulators or [None] * len(chunks)
+        sums = []
+        for i, (chunk, accumulator) in enumerate(zip(chunks, accumulators)):
+            vector = load_encrypted(self.context, chunk)
+            size = min(self.slots, total - i * self.slots)
+            if vector.size() != size:
+                raise ValueError(f"Ciphertext chunk {i} holds {vector.size()} values, expected {size}")
+            if num_samples is not None:
+                vector.mul_(num_samples)
+            if accumulator is not None:
+                vector.add_(accumulator)
+            sums.append(vector)
+        self.manifest, self.accumulators = manifest, sums
+
+    def partial(self):
+        if not self.total_samples:
+            return None
+        return {'manifest': self.manifest, 'chunks': [acc.serialize() for acc in self.accumulators]}, self.total_samples
+
+    def result(self):
+        if not self.total_samples:
+            return None
+        scale = 1.0 / self.total_samples
+        return {'manifest': self.manifest, 'chunks': [acc.mul_(scale).serialize() for acc in self.accumulators]}
+
+    def reset(self):
+        self.manifest = None
+        self.accumulators = None
+        self.total_samples = 0
+        self.num_updates = 0
+
+
+AGGREGATORS = {
+    'fedavg': WeightedAggregator,
+    'median': MedianAggregator,
+    'trimmed_mean': TrimmedMeanAggregator,
+    'krum': KrumAggregator,
+}
+
+def get_aggregator(name, **options):
+    if name not in AGGREGATORS:
+        raise ValueError(f"Unknown aggregator {name}")
+    return AGGREGATORS[name](**options)
@@ -0,0 +1,111 @@
+import numpy as np
+from federated_learning_framework.central_server import CentralServer
+from federated_learning_framework.encryption import is_encrypted
+
+class AsyncCentralServer(CentralServer):
+    # Asynchronous training without round barriers (FedAsync / FedBuff).
+    # Clients pull the latest model whenever they are ready and report updates
+    # tagged with the model version they trained on. Updates are folded into a
+    # buffer weighted by num_samples * (1 + staleness) ** -staleness_exponent;
+    # every `buffer_size` updates the buffered average is mixed into the global
+    # model with rate mixing_rate * (mean staleness weight) and the version
+    # advances. Pulling clients wait for the model before they train, so the
+    # server needs one from the start: `initial_weights` or a checkpoint. Updates
+    # must name the version they trained on, since staleness is measured from it.
+    # Mixing rescales the global model every version, which CKKS ciphertexts
+    # cannot sustain, so this mode only accepts plaintext updates.
+    def __init__(self, *args, initial_weights=None, buffer_size=10, mixing_rate=0.5, staleness_exponent=0.5,
+                 max_staleness=None, **kwargs):
+        if not 0 < mixing_rate <= 1:
+            raise ValueError(f"mixing_rate must be in (0, 1], got {mixing_rate}")
+        self.buffer_size = buffer_size
+        self.mixing_rate = mixing_rate
+        self.staleness_exponent = staleness_exponent
+        self.max_staleness = max_staleness
+        self.version = 0
+        self.buffered_samples = 0
+        self.global_buffer = None
+        super().__init__(*args, **kwargs)
+        # A restored checkpoint (see CentralServer's `checkpoint`) takes precedence over initial_weights.
+        if self.model_weights is None:
+            self.model_weights = initial_weights
+        if self.model_weights is None:
+            raise ValueError("AsyncCentralServer needs initial_weights or a checkpoint to restore")
+
+    def staleness_weight(self, staleness):
+        return (1.0 + staleness) ** -self.staleness_exponent
+
+    async def receive_update(self, client_id, message):
+        if 'weights' not in message:
+            # Edge partial sums are per round; there are no rounds to merge them into.
+            self.reject_update(client_id, "async mode does not accept partial sums from edge aggregators")
+            return
+        weights = message['weights']
+        if is_encrypted(weights):
+            self.logger.error(f"Central Server: Async mode does not support encrypted updates (client {client_id})")
+            return
+        base_version = message.get('version')
+        if not isinstance(base_version, (int, np.integer)):
+            self.reject_update(client_id, "async updates must carry the model version they trained on")
+            return
+        staleness = self.version - base_version
+        if staleness < 0 or (self.max_staleness is not None and staleness > self.max_staleness):
+            self.logger.info(f"Central Server: Dropping update from client {client_id} trained on version {base_version}")
+            return
+        weights = await self.validate_update(client_id, weights)
+        if weights is None:
+            return
+        num_samples = message.get('num_samples', 1)
+        async with self.lock:
+            reserve = getattr(self.aggregator, 'reserve', None)
+            if self.aggregator.num_updates == 0 and reserve is not None:
+                reserve(self.buffer_size)
+            try:
+                with self.metrics.timer('aggregate_seconds'):
+                    await self.pool.run(self.aggregator.add, weights, num_samples * self.staleness_weight(staleness))
+            except ValueError as e:
+                self.reject_update(client_id, e)
+                return
+            self.metrics.inc('updates_total', kind='plaintext')
+            self.metrics.observe('update_staleness', staleness)
+            self.buffered_samples += num_samples
+            self.logger.info(f"Central Server: Buffered update {self.aggregator.num_updates}/{self.buffer_size} "
+                             f"from client {client_id} (staleness {staleness})")
+            if self.aggregator.num_updates >= self.buffer_size:
+                await self.pool.run(self.apply_buffer)
+                self.save_checkpoint(self.model_weights)
+
+    def apply_buffer(self):
+        average = self.aggregator.result()
+        # aggregator.total_samples holds the staleness-weighted sample count.
+        rate = self.mixing_rate * self.aggregator.total_samples / self.buffered_samples
+        if self.global_buffer is None:
+            self.global_buffer = [np.array(weight, dtype=np.float64) for weight in self.model_weights]
+        for current, update in zip(self.global_buffer, average):
+            current *= 1.0 - rate
+            current += rate * np.asarray(update, dtype=np.float64)
+        self.model_weights = [current.astype(np.asarray(update).dtype) for current, update in zip(self.global_buffer, average)]
+        self.aggregator.reset()
+        self.buffered_samples = 0
+        self.version += 1
+        self.round_id = self.version
+        self.metrics.event('version', version=self.version, mixing_rate=rate)
+        self.logger.info(f"Central Server: Model advanced to version {self.version} (mixing rate {rate:.3f})")
+
+    def restore_checkpoint(self, weights, checkpoint):
+        super().restore_checkpoint(weights, checkpoint)
+        self.version = checkpoint['metadata'].get('version', self.round_id)
+
+    def checkpoint_metadata(self):
+        return {'version': self.version}
+
+    async def resume_session(self, client_id, message):
+        # Clients pull the model themselves, with their version, so nothing is pushed on reconnect.
+        pass
+
+    def model_message(self):
+        return {'weights': self.model_weights, 'round': self.round_id, 'version': self.version}
+
+    async def close_round(self):
+        # There are no rounds to close; a partially filled buffer waits for more updates.
+        pass
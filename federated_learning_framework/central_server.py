@@ -1,56 +1,447 @@
 import asyncio
 import logging
+import math
+import os
+import time
 import numpy as np
+from federated_learning_framework.active_learning import TopK, query_active_learning
+from federated_learning_framework.aggregation import EncryptedAggregator, get_aggregator
+from federated_learning_framework.checkpoint import CheckpointStore
+from federated_learning_framework.compression import COMPRESSORS, get_compressor
 from federated_learning_framework.connection import ConnectionServer
-from websockets.exceptions import ConnectionClosedError
-from federated_learning_framework.encryption import create_context
+from websockets.exceptions import ConnectionClosed
+from federated_learning_framework.encryption import create_context, load_context, public_context, is_encrypted
+from federated_learning_framework.metrics import MetricsRegistry, monitor_event_loop
+from federated_learning_framework.offload import CPUPool
+from federated_learning_framework.validation import UpdateValidator
+
+def query_result(message, k):
+    # (indices, scores) of a client's query reply: equal-length vectors of at most
+    # k non-negative integer indices and finite scores. Raises ValueError otherwise.
+    indices, scores = np.asarray(message.get('indices')), np.asarray(message.get('scores'))
+    if indices.ndim != 1 or scores.shape != indices.shape:
+        raise ValueError(f"indices {indices.shape} and scores {scores.shape} must be matching vectors")
+    if len(indices) > k:
+        raise ValueError(f"{len(indices)} candidates for a top-{k} query")
+    if indices.size and (indices.dtype.kind not in 'iu' or indices.min() < 0):
+        raise ValueError(f"indices must be non-negative integers, got {indices.dtype}")
+    if scores.size and (scores.dtype.kind not in 'fiu' or not np.isfinite(scores).all()):
+        raise ValueError("scores must be finite numbers")
+    return indices.astype(np.int64), scores.astype(np.float64)
 
 class CentralServer:
-    def __init__(self, connection_type='websocket', host='0.0.0.0', port=8089, context=None):
+    def __init__(self, connection_type='websocket', host='0.0.0.0', port=8089, context=None,
+                 quorum=None, round_timeout=None, aggregation_dtype=None, codec='binary',
+                 compression=tuple(COMPRESSORS), send_timeout=None, workers=None, metrics=None,
+                 checkpoint=None, aggregation='fedavg', validator=None):
         self.model_weights = None
         self.lock = asyncio.Lock()
         self.clients = set()
         self.logger = logging.getLogger(__name__)
-        self.connection = ConnectionServer(connection_type, host, port, self.handle_client)
-        self.context = context or create_context()
+        # Counters, timings and per-round events; attach a metrics.JsonlSink or serve it with metrics.PrometheusEndpoint.
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        # Decoding, aggregation and broadcast encoding run on `workers` threads
+        # (one per core by default) so the event loop stays responsive; 0 keeps them inline.
+        self.pool = CPUPool(workers)
+        self.connection = ConnectionServer(connection_type, host, port, self.handle_client, codec, pool=self.pool,
+                                           metrics=self.metrics)
+        # Encrypted updates are aggregated without decryption, so the server never holds the secret key.
+        # `context` may also be the path of a context saved with encryption.save_context.
+        if isinstance(context, (str, os.PathLike)):
+            context = load_context(context)
+        self.context = public_context(context or create_context())
+        # A round closes once `quorum` updates arrived (an int, or a fraction of the
+        # connected clients; all of them by default) or `round_timeout` seconds after
+        # the first update of the round, whichever comes first.
+        self.quorum = quorum
+        self.round_timeout = round_timeout
+        self.round_id = 0
+        # Plaintext updates are aggregated by `aggregation`: a name from aggregation.AGGREGATORS
+        # ('fedavg', or the robust 'median', 'trimmed_mean' and 'krum') or an aggregator instance.
+        # `aggregation_dtype` overrides the aggregator's storage dtype: float64 FedAvg
+        # accumulators and float32 robust update rows by default.
+        if isinstance(aggregation, str):
+            options = {} if aggregation_dtype is None else {'dtype': aggregation_dtype}
+            aggregation = get_aggregator(aggregation, workers=self.pool.workers, **options)
+        self.aggregator = aggregation
+        # Checks every plaintext update against the global model before it is aggregated;
+        # pass validation.UpdateValidator(max_norm=...) to also clip update norms.
+        self.validator = validator if validator is not None else UpdateValidator()
+        self.encrypted_aggregator = EncryptedAggregator(self.context)
+        self.round_aggregator = None
+        self.round_deadline = None
+        self.round_started = None
+        # Update compressors a client may pick in its hello message, and the one each client negotiated.
+        self.supported_compression = set(compression)
+        self.compressors = {}
+        # Per-client limit on a broadcast send, so one slow receiver cannot hold up the rest.
+        self.send_timeout = send_timeout
+        # Set by scheduler.RoundScheduler, which then owns sampling, dispatch and round deadlines.
+        self.scheduler = None
+        # Federated active learning: outstanding query replies by query id and client, and the
+        # last merged selection as (client_id, local index, score), most informative first.
+        self.query_id = 0
+        self.pending_queries = {}
+        self.query_sizes = {}
+        self.selection = []
+        # A checkpoint.CheckpointStore (or its directory). The latest checkpoint is
+        # mapped in lazily here, so a restarted server resumes from it and can accept
+        # clients at once; new checkpoints are written off the event loop.
+        if isinstance(checkpoint, (str, os.PathLike)):
+            checkpoint = CheckpointStore(checkpoint)
+        self.checkpoints = checkpoint
+        self.checkpoint_task = None
+        if checkpoint is not None:
+            weights, saved = checkpoint.load()
+            if saved is not None:
+                self.restore_checkpoint(weights, saved)
 
     async def run_server(self):
         self.logger.info("Central Server is starting...")
-        await self.connection.start()
+        monitor = asyncio.ensure_future(monitor_event_loop(self.metrics, sample=self.sample_metrics))
+        try:
+            await self.connection.start()
+        finally:
+            monitor.cancel()
+
+    def sample_metrics(self):
+        self.metrics.set('connected_clients', len(self.clients))
+        self.metrics.set('inbox_messages', sum(channel.inbox.qsize() for channel in self.connection.clients.values()))
 
     async def handle_client(self, websocket, client_id):
         self.clients.add(client_id)
+        self.metrics.set('connected_clients', len(self.clients))
         self.logger.info(f"Central Server: Client {client_id} connected")
         try:
             while True:
                 message = await self.connection.receive(client_id)
                 if isinstance(message, dict):
-                    if 'weights' in message:
-                        await self.transmit_weights(message['weights'])
+                    if 'weights' in message or 'partial' in message:
+                        await self.receive_update(client_id, message)
+                    elif 'update' in message:
+                        await self.receive_compressed_update(client_id, message)
+                    elif 'client_id' in message:
+                        await self.negotiate_session(client_id, message)
+                        await self.resume_session(client_id, message)
+                    elif 'pull' in message:
+                        await self.send_model(client_id, message.get('version'))
+                    elif 'query_result' in message:
+                        self.receive_query_result(client_id, message)
                     elif 'data_request' in message:
                         data = await self.get_data_from_client(client_id)
                         await self.send_data_to_client(client_id, {'data': data})
-        except ConnectionClosedError:
+        except ConnectionClosed:
             self.logger.info(f"Central Server: Client {client_id} disconnected")
         finally:
-            self.clients.remove(client_id)
+            if self.connection.is_current(client_id, websocket):
+                self.end_session(client_id)
+
+    def end_session(self, client_id):
+        # Not called when the client already reconnected on a new connection, which keeps its session.
+        self.clients.discard(client_id)
+        for replies in self.pending_queries.values():
+            reply = replies.get(client_id)
+            if reply is not None and not reply.done():
+                reply.cancel()
+        self.compressors.pop(client_id, None)
+        self.metrics.set('connected_clients', len(self.clients))
+        # The quorum shrinks with the client, which may leave it met already.
+        if self.scheduler is not None:
+            ready = self.scheduler.client_left(client_id)
+        else:
+            aggregator = self.round_aggregator
+            ready = aggregator is not None and aggregator.num_updates > 0 and aggregator.num_updates >= self.quorum_size()
+        if ready:
+            asyncio.ensure_future(self.close_round())
+
+    async def negotiate_session(self, client_id, message):
+        requested = message.get('compression', 'none')
+        if requested == 'none':
+            return
+        accepted = requested if requested in self.supported_compression else 'none'
+        try:
+            self.compressors[client_id] = get_compressor(accepted, **(message.get('compression_options') or {}))
+        except (TypeError, ValueError) as e:
+            self.logger.warning(f"Central Server: Rejecting compression options from client {client_id}: {e}")
+            accepted = 'none'
+            self.compressors[client_id] = get_compressor(accepted)
+        self.logger.info(f"Central Server: Client {client_id} uses {accepted} compression")
+        await self.connection.send(client_id, {'compression': accepted})
+
+    async def resume_session(self, client_id, message):
+        # A reconnecting client says which round's model it holds. If that is the
+        # current one it carries on without downloading it again; otherwise it gets
+        # the current model, unless a scheduler left it out of this round.
+        if message.get('round') is None or self.model_weights is None:
+            return
+        if message['round'] == self.round_id:
+            self.metrics.inc('session_resumes_total')
+            self.logger.info(f"Central Server: Client {client_id} resumed round {self.round_id}")
+            return
+        if self.scheduler is not None and (client_id not in self.scheduler.participants
+                                           or client_id in self.scheduler.reported):
+            return
+        await self.send_model(client_id)
+
+    def quorum_size(self):
+        if self.scheduler is not None:
+            return self.scheduler.quorum_size()
+        if self.quorum is None:
+            return max(len(self.clients), 1)
+        if isinstance(self.quorum, float):
+            return max(math.ceil(self.quorum * len(self.clients)), 1)
+        return self.quorum
+
+    async def receive_update(self, client_id, message):
+        # A 'partial' is an edge aggregator's sample-weighted sum over its own clients
+        # (see edge_aggregator.EdgeAggregator); it counts as a single update here.
+        partial = 'partial' in message
+        weights = message['partial'] if partial else message['weights']
+        aggregator = self.encrypted_aggregator if is_encrypted(weights) else self.aggregator
+        weights = await self.validate_update(client_id, weights, partial)
+        if weights is None:
+            return
+        async with self.lock:
+            if self.round_aggregator is not None and aggregator is not self.round_aggregator:
+                self.logger.error(f"Central Server: Client {client_id} mixed encrypted and plaintext updates in round {self.round_id}")
+                return
+            num_samples = message.get('num_samples', 1)
+            if self.scheduler is not None:
+                factor = self.scheduler.update_weight(client_id, message.get('round'))
+                if factor is None or (partial and factor != 1 and aggregator is self.encrypted_aggregator):
+                    # Rescaling an encrypted partial sum would cost it a CKKS level.
+                    self.logger.info(f"Central Server: Dropping update from client {client_id} for round {message.get('round')}")
+                    return
+                if partial and factor != 1:
+                    weights = [np.multiply(layer, factor) for layer in weights]
+                num_samples *= factor
+            if aggregator.num_updates == 0:
+                self.round_started = time.perf_counter()
+                reserve = getattr(aggregator, 'reserve', None)
+                if reserve is not None:
+                    reserve(self.quorum_size())
+            # The lock keeps updates in order, but the loop keeps serving other clients meanwhile.
+            # TenSEAL raises ValueError, TypeError or RuntimeError for ciphertexts it cannot load
+            # or combine. The round only takes an aggregator once an update was added to it.
+            try:
+                with self.metrics.timer('aggregate_seconds'):
+                    await self.pool.run(aggregator.add_partial if partial else aggregator.add, weights, num_samples)
+            except (ValueError, KeyError, TypeError, RuntimeError) as e:
+                if self.scheduler is not None:
+                    self.scheduler.update_rejected(client_id, message.get('round'))
+                self.reject_update(client_id, e)
+                return
+            self.round_aggregator = aggregator
+            self.metrics.inc('updates_total', kind='partial' if partial else 'encrypted' if is_encrypted(weights) else 'plaintext')
+            self.logger.info(f"Central Server: Round {self.round_id} update {aggregator.num_updates} from client {client_id}")
+            if self.scheduler is not None:
+                ready = len(self.scheduler.reported) >= self.quorum_size()
+            else:
+                if aggregator.num_updates == 1 and self.round_timeout is not None:
+                    self.round_deadline = asyncio.create_task(self.close_round_after(self.round_id, self.round_timeout))
+                ready = aggregator.num_updates >= self.quorum_size()
+        if ready:
+            await self.close_round()
+
+    async def validate_update(self, client_id, weights, partial=False):
+        # Runs on the CPU pool outside the lock, so updates are validated while
+        # others are aggregated. Returns the weights to aggregate (clipped if
+        # needed), or None if the update was rejected.
+        try:
+            weights, norm = await self.pool.run(self.validator.validate, weights, self.model_weights, partial)
+        except ValueError as e:
+            self.reject_update(client_id, e)
+            return None
+        if norm is not None:
+            self.metrics.observe('update_norm', norm)
+            if norm > self.validator.max_norm:
+                self.metrics.inc('clipped_updates_total')
+                self.logger.info(f"Central Server: Clipped update from client {client_id} (norm {norm:.3g})")
+        return weights
+
+    def reject_update(self, client_id, error):
+        self.metrics.inc('rejected_updates_total')
+        self.logger.warning(f"Central Server: Rejecting update from client {client_id} in round {self.round_id}: {error}")
+
+    async def receive_compressed_update(self, client_id, message):
+        compressor = self.compressors.get(client_id)
+        if compressor is None or compressor.name != message.get('compression'):
+            self.logger.error(f"Central Server: Client {client_id} sent an update with unnegotiated compression {message.get('compression')}")
+            return
+        # Updates are encoded against the global model the client last received,
+        # and are sized and checked against it, so none are taken before it exists.
+        if message.get('round') is not None and message['round'] != self.round_id:
+            self.logger.warning(f"Central Server: Dropping compressed update from client {client_id} for round {message['round']}")
+            return
+        if self.model_weights is None:
+            self.reject_update(client_id, "compressed updates need a global model")
+            return
+        try:
+            weights = await self.pool.run(compressor.decompress, message.get('update'), self.model_weights)
+        except ValueError as e:
+            self.reject_update(client_id, e)
+            return
+        await self.receive_update(client_id, {'weights': weights, 'num_samples': message.get('num_samples', 1)})
+
+    async def close_round_after(self, round_id, timeout):
+        await asyncio.sleep(timeout)
+        if self.round_id == round_id:
+            self.logger.info(f"Central Server: Round {round_id} deadline reached")
+            await self.close_round()
+
+    async def close_round(self):
+        async with self.lock:
+            aggregator = self.round_aggregator
+            if aggregator is None or aggregator.num_updates == 0:
+                return
+            started = time.perf_counter()
+            weights = await self.pool.run(aggregator.result)
+            aggregation_time = time.perf_counter() - started
+            self.metrics.observe('round_aggregation_seconds', aggregation_time)
+            self.logger.info(f"Central Server: Round {self.round_id} closed with {aggregator.num_updates} updates "
+                             f"({aggregator.total_samples} samples)")
+            record = {'round': self.round_id, 'updates': aggregator.num_updates, 'samples': aggregator.total_samples,
+                      'collect': started - self.round_started, 'aggregation': aggregation_time}
+            aggregator.reset()
+            self.round_aggregator = None
+            self.round_id += 1
+            if self.round_deadline is not None and self.round_deadline is not asyncio.current_task():
+                self.round_deadline.cancel()
+            self.round_deadline = None
+            self.save_checkpoint(weights)
+            if self.scheduler is not None:
+                # The scheduler dispatches the new model to the next round's sample.
+                self.model_weights = weights
+                self.scheduler.round_closed(aggregation_time)
+                return
+        started = time.perf_counter()
+        await self.transmit_weights(weights)
+        record['broadcast'] = time.perf_counter() - started
+        record['total'] = record['collect'] + record['aggregation'] + record['broadcast']
+        self.metrics.observe('round_seconds', record['total'])
+        self.metrics.event('round', **record)
+
+    def restore_checkpoint(self, weights, checkpoint):
+        self.model_weights = weights
+        self.round_id = checkpoint['round']
+        self.logger.info(f"Central Server: Resuming from the checkpoint of round {self.round_id}")
+
+    def checkpoint_metadata(self):
+        return {}
+
+    def save_checkpoint(self, weights):
+        # Writes run one after another on the CPU pool, in round order; the
+        # caller never waits for them. Returns the write task, if one was started.
+        if self.checkpoints is None or not self.checkpoints.due(self.round_id):
+            return None
+        previous = self.checkpoint_task
+        round_id = self.round_id
+        metadata = self.checkpoint_metadata()
+
+        async def write():
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            started = time.perf_counter()
+            try:
+                await self.pool.run(self.checkpoints.save, round_id, weights, **metadata)
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Central Server: Failed to checkpoint round {round_id}: {e}")
+                return
+            self.metrics.observe('checkpoint_seconds', time.perf_counter() - started)
+
+        self.checkpoint_task = asyncio.ensure_future(write())
+        return self.checkpoint_task
+
+    def model_message(self):
+        return {'weights': self.model_weights, 'round': self.round_id}
+
+    async def send_model(self, client_id, version=None):
+        # A client that pulls with the version it already holds gets only the version back.
+        async with self.lock:
+            message = self.model_message()
+        if message['weights'] is None:
+            self.logger.warning(f"Central Server: Client {client_id} pulled the model before one exists")
+            return
+        if version is not None and version == message.get('version'):
+            message = {'round': message['round'], 'version': version, 'unchanged': True}
+        await self.connection.send(client_id, message)
 
     async def transmit_weights(self, weights):
         async with self.lock:
             self.model_weights = weights
-            await asyncio.gather(*[self.connection.send(client_id, {'weights': self.model_weights}) for client_id in self.clients])
-            self.logger.info("Central Server: Transmitted weights to clients")
+            message = self.model_message()
+            client_ids = list(self.clients)
+        delivered = await self.connection.broadcast(client_ids, message, self.send_timeout)
+        self.logger.info(f"Central Server: Transmitted weights to {len(delivered)}/{len(client_ids)} clients")
 
     async def send_data_to_client(self, client_id, data):
         self.logger.info(f"Central Server: Sending data to client {client_id}")
         await self.connection.send(client_id, data)
 
     async def get_data_from_client(self, client_id):
-        self.logger.info(f"Central Server: Requesting data from client {client_id}. Simulating response.")
-        await asyncio.sleep(1)
-        return np.random.rand(10, 3072)
-
-    def query_active_learning(self, unlabeled_data, model):
-        uncertainty = model.predict(unlabeled_data)
-        selected_indices = np.argsort(uncertainty.max(axis=1))[:5]
-        return selected_indices
+        # A client's share of the last federated query: the local indices it should label.
+        return np.array([index for owner, index, _ in self.selection if owner == client_id], dtype=np.int64)
+
+    async def query_clients(self, num_samples, strategy='least_confidence', timeout=None, client_ids=None,
+                            batch_size=1024, from_logits=False):
+        # Federated active learning. Every client scores its local unlabeled pool
+        # with its current model and replies with only the (index, score) pairs
+        # of its local top `num_samples`; these merge into the global top
+        # `num_samples` without any samples leaving the clients. Clients that do
+        # not reply within `timeout` seconds are left out of this selection.
+        # Returns (and keeps in self.selection) a list of (client_id, local index, score).
+        self.query_id += 1
+        query_id = self.query_id
+        client_ids = sorted(self.clients if client_ids is None else client_ids)
+        loop = asyncio.get_running_loop()
+        replies = self.pending_queries[query_id] = {client_id: loop.create_future() for client_id in client_ids}
+        message = {'query': query_id, 'k': num_samples, 'strategy': strategy, 'batch_size': batch_size,
+                   'from_logits': from_logits}
+        self.query_sizes[query_id] = num_samples
+        try:
+            started = time.perf_counter()
+            delivered = await self.connection.broadcast(client_ids, message, self.send_timeout)
+            waiting = [replies[client_id] for client_id in delivered]
+            if waiting:
+                await asyncio.wait(waiting, timeout=timeout)
+        finally:
+            del self.pending_queries[query_id]
+            del self.query_sizes[query_id]
+        owners = []
+        top = TopK(num_samples)
+        for client_id, reply in replies.items():
+            if not reply.done() or reply.cancelled():
+                continue
+            indices, scores = reply.result()
+            top.push(scores, np.arange(len(owners), len(owners) + len(indices)))
+            owners.extend((client_id, int(index)) for index in indices)
+        positions, scores = top.result()
+        self.selection = [(*owners[position], float(score)) for position, score in zip(positions, scores)]
+        answered = sum(reply.done() and not reply.cancelled() for reply in replies.values())
+        seconds = time.perf_counter() - started
+        self.metrics.observe('query_seconds', seconds)
+        self.metrics.event('query', query=query_id, clients=len(client_ids), answered=answered,
+                           selected=len(self.selection), seconds=seconds)
+        self.logger.info(f"Central Server: Query {query_id} selected {len(self.selection)} samples "
+                         f"from {answered}/{len(client_ids)} clients")
+        return self.selection
+
+    def receive_query_result(self, client_id, message):
+        query_id = message['query_result']
+        reply = self.pending_queries.get(query_id, {}).get(client_id) if isinstance(query_id, int) else None
+        if reply is None or reply.done():
+            self.logger.info(f"Central Server: Ignoring late query result from client {client_id}")
+            return
+        try:
+            result = query_result(message, self.query_sizes[query_id])
+        except ValueError as e:
+            # A malformed reply would break the merge for every client, so only this one is dropped.
+            self.logger.warning(f"Central Server: Dropping query result from client {client_id}: {e}")
+            self.metrics.inc('rejected_query_results_total')
+            reply.cancel()
+            return
+        reply.set_result(result)
+
+    def query_active_learning(self, unlabeled_data, model, num_samples=5, **options):
+        # See active_learning.query_active_learning for the strategies and options.
+        return query_active_learning(model, unlabeled_data, num_samples, **options)
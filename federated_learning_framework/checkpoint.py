@@ -0,0 +1,130 @@
+import json
+import logging
+import mmap
+import os
+import re
+import time
+import numpy as np
+from federated_learning_framework.codec import HEADER, BinaryCodec
+from federated_learning_framework.encryption import is_encrypted
+
+# Global-model checkpoints, one file per saved round, in the binary wire format
+# (codec.BinaryCodec): a JSON header indexes every layer by offset, and the layer
+# bytes follow aligned, so a checkpoint is loaded by memory-mapping the file and
+# taking np.frombuffer views. Nothing is read until a layer is touched, so a
+# restarted server can accept clients before the model is paged in.
+#
+# Every `full_every`-th saved checkpoint stores all layers. The ones in between
+# store only the layers that changed since the previous checkpoint (the others
+# are null and resolve through the checkpoint before), so rounds that leave
+# layers untouched (frozen layers, partial training) cost only what changed.
+# Encrypted models are always stored in full. Chains older than the newest
+# `keep` full checkpoints are deleted.
+FILE_PATTERN = re.compile(r'round-(\d+)\.ckpt$')
+
+class CheckpointStore:
+    def __init__(self, directory, every=1, full_every=10, keep=2):
+        if every < 1 or full_every < 1 or keep < 1:
+            raise ValueError("every, full_every and keep must be >= 1")
+        self.directory = directory
+        self.every = every
+        self.full_every = full_every
+        self.keep = keep
+        self.codec = BinaryCodec()
+        self.last_weights = None
+        self.since_full = 0
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, round_id):
+        return os.path.join(self.directory, f"round-{round_id:08d}.ckpt")
+
+    def rounds(self):
+        rounds = [int(match.group(1)) for match in map(FILE_PATTERN.match, os.listdir(self.directory)) if match]
+        return sorted(rounds)
+
+    def latest(self):
+        rounds = self.rounds()
+        return rounds[-1] if rounds else None
+
+    def due(self, round_id):
+        return round_id % self.every == 0
+
+    def save(self, round_id, weights, **metadata):
+        # Blocking; CentralServer runs it on its CPU pool. Returns the file written.
+        encrypted = is_encrypted(weights)
+        full = (encrypted or self.last_weights is None or len(weights) != len(self.last_weights)
+                or self.since_full + 1 >= self.full_every)
+        if full:
+            layers = weights
+        else:
+            layers = [None if current is previous or np.array_equal(current, previous) else current
+                      for current, previous in zip(weights, self.last_weights)]
+        message = {'round': round_id, 'time': time.time(), 'full': full, 'encrypted': encrypted,
+                   'num_layers': None if encrypted else len(weights), 'layers': layers, 'metadata': metadata}
+        path = self.path(round_id)
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.writelines(self.codec.encode(message))
+            f.flush()
+            os.fsync(f.fileno())
+        # Readers only ever see complete checkpoints.
+        os.replace(temporary, path)
+        self.last_weights = None if encrypted else list(weights)
+        self.since_full = 0 if full else self.since_full + 1
+        if full:
+            self.prune()
+        changed = 'all' if full else sum(layer is not None for layer in layers)
+        self.logger.info(f"Checkpoint: Saved round {round_id} ({changed} layers) to {path}")
+        return path
+
+    def info(self, round_id):
+        # The checkpoint's JSON header alone (round, flags, metadata), without mapping the layers.
+        with open(self.path(round_id), 'rb') as f:
+            header = self.codec.decode_header(f.read(HEADER.size))
+            return json.loads(f.read(header['metadata_length']))['message']
+
+    def read(self, round_id):
+        with open(self.path(round_id), 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # The arrays hold the only references to the mapping, which closes once they are gone.
+        return self.codec.decode(mapped)
+
+    def load(self, round_id=None):
+        # Returns (weights, checkpoint) for `round_id` (the latest by default), or
+        # (None, None) when there is none. Layers are read-only mmap views.
+        rounds = self.rounds()
+        if round_id is None:
+            round_id = rounds[-1] if rounds else None
+        if round_id is None:
+            return None, None
+        checkpoint = self.read(round_id)
+        weights = checkpoint['layers']
+        if not checkpoint['full']:
+            weights = list(weights)
+            earlier = [r for r in rounds if r < round_id]
+            while any(layer is None for layer in weights):
+                if not earlier:
+                    raise ValueError(f"Checkpoint for round {round_id} has no full checkpoint to resolve against")
+                previous = self.read(earlier.pop())
+                weights = [layer if layer is not None else base for layer, base in zip(weights, previous['layers'])]
+                if previous['full']:
+                    break
+        # Deltas continue from what was loaded, so a restarted server keeps the chain going.
+        self.last_weights = None if checkpoint['encrypted'] else list(weights)
+        self.since_full = 0
+        for r in reversed([r for r in rounds if r <= round_id]):
+            if self.info(r)['full']:
+                break
+            self.since_full += 1
+        return weights, checkpoint
+
+    def prune(self):
+        rounds = self.rounds()
+        fulls = [round_id for round_id in rounds if self.info(round_id)['full']]
+        if len(fulls) <= self.keep:
+            return
+        oldest = fulls[-self.keep]
+        for round_id in rounds:
+            if round_id < oldest:
+                os.remove(self.path(round_id))
@@ -21,7 +21,7 @@
 #         except Exception as e:
 #             self.logger.error(f"Client {self.client_id}: Error connecting to central server: {e}")
 
-#     async def federated_learning(self, x_train, y_train):
+#     async def federated_learning(self, x_train, y_train=None):
 #         try:
 #             while True:
 #                 weights = await self.receive_weights()
@@ -61,62 +61,188 @@
 
 import asyncio
 import logging
-import tensorflow as tf
+import numpy as np
+from federated_learning_framework.active_learning import score_pool
 from federated_learning_framework.encryption import encrypt_weights, decrypt_weights
-from federated_learning_framework.models.tensorflow_model import TensorFlowModel
-import websockets
-import pickle
+from federated_learning_framework.connection import ConnectionClient
+from federated_learning_framework.compression import get_compressor
+from federated_learning_framework.metrics import MetricsRegistry
 
 class ClientDevice:
-    def __init__(self, client_id, model: TensorFlowModel, context):
+    # `model` can be any models.AbstractModel (or object with get_weights/set_weights/train);
+    # the client never touches a framework directly, so it loads no backend itself.
+    def __init__(self, client_id, model, context, connection_type='websocket', codec='binary',
+                 compression='none', compression_options=None, mode='sync', metrics=None,
+                 unlabeled_data=None, reconnect_attempts=10, max_reconnect_delay=30.0):
         self.client_id = client_id
         self.model = model
+        # With context=None updates are sent in plaintext, which is what allows them to be compressed.
         self.context = context
+        self.connection_type = connection_type
+        self.codec = codec
         self.connection = None
+        self.compression = compression
+        self.compression_options = compression_options or {}
+        self.compressor = get_compressor('none')
+        self.global_weights = None
+        self.upload_bytes = []
+        # In 'async' mode the client pulls the latest model itself instead of waiting for a round to start.
+        self.mode = mode
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        # Local pool scored when the server runs a federated active-learning query (an array,
+        # memory-mapped array or iterable of batches); only indices and scores are ever sent.
+        self.unlabeled_data = unlabeled_data
+        # A lost connection is retried with exponential backoff (0 disables, None retries forever).
+        # The client keeps its id, so the server resumes its session: the model is not sent
+        # again if the client still holds the current round (or version), and an update
+        # that could not be sent goes out once the client is back.
+        self.reconnect_attempts = reconnect_attempts
+        self.max_reconnect_delay = max_reconnect_delay
+        self.round_id = None
+        self.version = None
+        self.unsent = None
+        # Messages that arrived while the client waited for the compression reply
+        # (a round dispatch or a query); the main loop receives them first.
+        self.deferred = []
         self.logger = logging.getLogger(__name__)
 
     async def connect_to_central_server(self, uri):
         try:
-            self.connection = await websockets.connect(uri)
-            await self.send_message({'client_id': self.client_id})
+            self.connection = ConnectionClient(self.connection_type, uri, self.codec, metrics=self.metrics,
+                                               client_id=self.client_id)
+            await self.connection.connect()
+            await self.start_session()
             self.logger.info(f"Client {self.client_id}: Connected to central server at {uri}")
         except Exception as e:
             self.logger.error(f"Client {self.client_id}: Error connecting to central server: {e}")
 
+    async def start_session(self):
+        await self.send_message({'client_id': self.client_id, 'compression': self.compression,
+                                 'compression_options': self.compression_options,
+                                 'round': self.round_id, 'version': self.version})
+        if self.compression != 'none':
+            await self.negotiate_compression()
+
+    async def reconnect(self):
+        if self.reconnect_attempts == 0:
+            return False
+        self.logger.info(f"Client {self.client_id}: Connection lost, reconnecting")
+        if not await self.connection.reconnect(self.reconnect_attempts, max_delay=self.max_reconnect_delay):
+            self.logger.error(f"Client {self.client_id}: Could not reconnect to the central server")
+            return False
+        await self.start_session()
+        if self.unsent is not None:
+            message, self.unsent = self.unsent, None
+            await self.send_message(message)
+        return True
+
+    async def negotiate_compression(self):
+        if self.context is not None:
+            self.logger.warning(f"Client {self.client_id}: Compression is not applied to encrypted updates")
+        while True:
+            message = await self.receive_from_server()
+            if message is None or (isinstance(message, dict) and 'compression' in message):
+                break
+            self.deferred.append(message)
+        accepted = message.get('compression', 'none') if message is not None else 'none'
+        if accepted != self.compression:
+            self.logger.warning(f"Client {self.client_id}: Server declined {self.compression} compression, sending full updates")
+        self.compressor = get_compressor(accepted, **(self.compression_options if accepted == self.compression else {}))
+
     async def send_message(self, message):
         try:
-            serialized_message = pickle.dumps(message)
-            await self.connection.send(serialized_message)
+            await self.connection.send(message)
         except Exception as e:
             self.logger.error(f"Client {self.client_id}: Error sending message: {e}")
 
     async def receive_message(self):
+        if self.deferred:
+            return self.deferred.pop(0)
+        return await self.receive_from_server()
+
+    async def receive_from_server(self):
         try:
-            message = await self.connection.recv()
-            deserialized_message = pickle.loads(message)
-            return deserialized_message
+            return await self.connection.receive()
         except Exception as e:
             self.logger.error(f"Client {self.client_id}: Error receiving message: {e}")
             return None
 
-    async def federated_learning(self, x_train, y_train):
+    async def federated_learning(self, x_train, y_train=None):
         try:
+            pull = True
             while True:
+                if self.mode == 'async' and pull:
+                    await self.send_message({'pull': True, 'version': self.version})
                 message = await self.receive_message()
                 if message is None:
-                    break
-                weights = message.get('weights', None)
-                if weights is None:
-                    break
-
-                self.model.set_weights(decrypt_weights(self.context, weights))
-                self.model.train(x_train, y_train, epochs=1)
-                new_weights = self.model.get_weights()
-                await self.send_message({'weights': encrypt_weights(self.context, new_weights)})
+                    # None also means a message failed to decode, which a reconnect would not fix.
+                    if self.connection.connected or not await self.reconnect():
+                        break
+                    continue
+                # A query can arrive between rounds (or while a pull is outstanding).
+                pull = 'query' not in message
+                if not pull:
+                    await self.answer_query(message)
+                    continue
+                if message.get('unchanged') and self.global_weights is not None:
+                    # The server still has the model this client last received.
+                    weights = self.global_weights
+                else:
+                    weights = message.get('weights', None)
+                    if weights is None:
+                        break
+                    if self.context is not None:
+                        with self.metrics.timer('decrypt_seconds'):
+                            weights = decrypt_weights(self.context, weights)
+                self.model.set_weights(weights)
+                self.global_weights = weights
+                self.round_id = message.get('round')
+                self.version = message.get('version')
+                with self.metrics.timer('train_seconds'):
+                    stats = self.model.train(x_train, y_train, epochs=1)
+                # Models report their local dataset size; fall back to len() for ones that return nothing.
+                if isinstance(stats, dict):
+                    num_samples = stats['num_samples']
+                    self.metrics.set('train_samples_per_second', stats['samples_per_sec'])
+                else:
+                    num_samples = len(x_train)
+                await self.send_weights(self.model.get_weights(), num_samples, message.get('round'), message.get('version'))
         except Exception as e:
             self.logger.error(f"Client {self.client_id}: Error in federated learning loop: {e}")
 
+    async def send_weights(self, weights, num_samples, round_id=None, version=None):
+        message = {'num_samples': num_samples, 'round': round_id}
+        if version is not None:
+            message['version'] = version
+        if self.context is not None:
+            with self.metrics.timer('encrypt_seconds'):
+                message['weights'] = encrypt_weights(self.context, weights)
+        elif self.compressor.name == 'none':
+            message['weights'] = weights
+        else:
+            message['update'] = self.compressor.compress(weights, self.global_weights)
+            message['compression'] = self.compressor.name
+        sent_before = self.connection.bytes_sent
+        await self.send_message(message)
+        if not self.connection.connected and self.connection.interrupted is None:
+            # Sent again after reconnecting; a half-sent chunked transfer resumes by itself instead.
+            self.unsent = message
+        self.upload_bytes.append(self.connection.bytes_sent - sent_before)
+        self.logger.info(f"Client {self.client_id}: Sent weights to central server ({self.upload_bytes[-1]} bytes)")
+
+    async def answer_query(self, message):
+        # Scores the local pool with the model as last set by the server and replies with the local top-k.
+        indices, scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        if self.unlabeled_data is not None:
+            with self.metrics.timer('query_seconds'):
+                top = score_pool(self.model, self.unlabeled_data, message['k'], message.get('strategy', 'least_confidence'),
+                                 message.get('batch_size', 1024), message.get('from_logits', False))
+            indices, scores = top.result()
+        await self.send_message({'query_result': message['query'], 'indices': indices, 'scores': scores})
+        self.logger.info(f"Client {self.client_id}: Answered query {message['query']} with {len(indices)} candidates")
+
     async def request_data(self):
+        # Returns this client's share of the server's last query: the local indices to label.
         try:
             await self.send_message({'data_request': True})
             message = await self.receive_message()
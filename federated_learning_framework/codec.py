@@ -0,0 +1,136 @@
+import json
+import pickle
+import struct
+import numpy as np
+
+# Wire format (version 1):
+#
+#   fixed header   magic, version, message type, round id, metadata length
+#   metadata       UTF-8 JSON: the message with every ndarray/bytes value replaced
+#                  by a reference into the manifest, plus the manifest itself
+#                  (dtype, shape, offset, nbytes of each segment)
+#   payload        raw contiguous segment bytes, each aligned to ALIGNMENT
+#
+# Segments are written straight from the arrays' memory and decoded with
+# np.frombuffer, so neither side copies tensor data.
+MAGIC = b'FLF'
+VERSION = 1
+HEADER = struct.Struct('!3sBBxxxqI')
+ALIGNMENT = 64
+
+MESSAGE_TYPES = {'message': 0, 'weights': 1, 'data': 2, 'data_request': 3, 'client_id': 4}
+MESSAGE_TYPE_NAMES = {value: key for key, value in MESSAGE_TYPES.items()}
+
+class CodecError(ValueError):
+    pass
+
+def message_type(message):
+    if isinstance(message, dict):
+        for key in ('weights', 'data', 'data_request', 'client_id'):
+            if key in message:
+                return MESSAGE_TYPES[key]
+    return MESSAGE_TYPES['message']
+
+def _padding(offset):
+    return -offset % ALIGNMENT
+
+class BinaryCodec:
+    name = 'binary'
+
+    def encode(self, message):
+        manifest = []
+        segments = []
+
+        def flatten(value):
+            if isinstance(value, np.ndarray):
+                if value.dtype.hasobject:
+                    raise CodecError(f"Cannot encode arrays of dtype {value.dtype}")
+                array = np.ascontiguousarray(value)
+                manifest.append({'dtype': array.dtype.str, 'shape': list(array.shape), 'nbytes': array.nbytes})
+                segments.append(memoryview(array.reshape(-1).view(np.uint8)))
+                return {'__tensor__': len(manifest) - 1}
+            if isinstance(value, (bytes, bytearray, memoryview)):
+                view = memoryview(value).cast('B')
+                manifest.append({'nbytes': view.nbytes})
+                segments.append(view)
+                return {'__bytes__': len(manifest) - 1}
+            if isinstance(value, dict):
+                return {str(key): flatten(item) for key, item in value.items()}
+            if isinstance(value, (list, tuple)):
+                return [flatten(item) for item in value]
+            if isinstance(value, np.generic):
+                return value.item()
+            return value
+
+        tree = flatten(message)
+        offset = 0
+        for entry in manifest:
+            entry['offset'] = offset
+            offset += entry['nbytes'] + _padding(entry['nbytes'])
+        metadata = json.dumps({'message': tree, 'manifest': manifest}, separators=(',', ':')).encode('utf-8')
+        round_id = message.get('round') if isinstance(message, dict) else None
+        # The header carries -1 when the message has no round (or round=None).
+        round_id = round_id if isinstance(round_id, int) else -1
+        header = HEADER.pack(MAGIC, VERSION, message_type(message), round_id, len(metadata))
+        prefix = header + metadata
+        buffers = [prefix + bytes(_padding(len(prefix)))]
+        for segment in segments:
+            buffers.append(segment)
+            if _padding(segment.nbytes):
+                buffers.append(bytes(_padding(segment.nbytes)))
+        return buffers
+
+    def decode(self, data):
+        view = memoryview(data).cast('B')
+        header = self.decode_header(view)
+        start = HEADER.size
+        metadata = json.loads(bytes(view[start:start + header['metadata_length']]))
+        base = start + header['metadata_length']
+        base += _padding(base)
+        manifest = metadata['manifest']
+
+        def restore(value):
+            if isinstance(value, dict):
+                if len(value) == 1 and '__tensor__' in value:
+                    entry = manifest[value['__tensor__']]
+                    dtype = np.dtype(entry['dtype'])
+                    count = entry['nbytes'] // dtype.itemsize
+                    return np.frombuffer(view, dtype=dtype, count=count, offset=base + entry['offset']).reshape(entry['shape'])
+                if len(value) == 1 and '__bytes__' in value:
+                    entry = manifest[value['__bytes__']]
+                    return bytes(view[base + entry['offset']:base + entry['offset'] + entry['nbytes']])
+                return {key: restore(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [restore(item) for item in value]
+            return value
+
+        return restore(metadata['message'])
+
+    def decode_header(self, data):
+        if len(data) < HEADER.size:
+            raise CodecError("Message is shorter than the protocol header")
+        magic, version, msg_type, round_id, metadata_length = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise CodecError("Not a binary protocol message")
+        if version != VERSION:
+            raise CodecError(f"Unsupported protocol version {version}")
+        return {'type': MESSAGE_TYPE_NAMES.get(msg_type, 'message'), 'round': round_id, 'metadata_length': metadata_length}
+
+class PickleCodec:
+    # Legacy codec. Unpickling executes arbitrary code, so only use it with trusted peers.
+    name = 'pickle'
+
+    def encode(self, message):
+        return [pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)]
+
+    def decode(self, data):
+        return pickle.loads(data)
+
+CODECS = {'binary': BinaryCodec, 'pickle': PickleCodec}
+
+def get_codec(codec):
+    if isinstance(codec, str):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec}")
+        return CODECS[codec]()
+    return codec
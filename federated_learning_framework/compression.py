@@ -0,0 +1,209 @@
+from abc import ABC, abstractmethod
+import numpy as np
+
+# Update compressors for the client -> server path. Every compressor encodes the
+# difference between the locally trained weights and the global model the client
+# last received (`reference`), and the matching decompress on the server adds it
+# back onto the same global model before the update reaches aggregation.
+
+def flatten(weights, out=None):
+    total = sum(np.size(weight) for weight in weights)
+    if out is None or out.size != total:
+        out = np.empty(total, dtype=np.float32)
+    offset = 0
+    for weight in weights:
+        size = np.size(weight)
+        out[offset:offset + size] = np.ravel(weight)
+        offset += size
+    return out
+
+def unflatten(flat, shapes, dtypes=None):
+    weights = []
+    offset = 0
+    for i, shape in enumerate(shapes):
+        size = int(np.prod(shape, dtype=np.int64))
+        layer = flat[offset:offset + size].reshape(shape)
+        weights.append(layer.astype(dtypes[i], copy=False) if dtypes else layer)
+        offset += size
+    return weights
+
+# Payloads come from clients, so decompress checks them against the reference
+# model and raises ValueError for anything malformed, before allocating from it.
+def require(payload, *keys):
+    if not isinstance(payload, dict) or any(key not in payload for key in keys):
+        raise ValueError(f"Compressed update must have {', '.join(keys)}")
+    return [payload[key] for key in keys]
+
+def layer_list(layers, name, count=None):
+    if not isinstance(layers, (list, tuple)):
+        raise ValueError(f"'{name}' must be a list of layers")
+    if count is not None and len(layers) != count:
+        raise ValueError(f"'{name}' has {len(layers)} layers, expected {count}")
+    return layers
+
+def numeric(array, name, kinds='fiu'):
+    array = np.asarray(array)
+    if array.dtype.kind not in kinds:
+        raise ValueError(f"'{name}' has dtype {array.dtype}")
+    return array
+
+def payload_nbytes(payload):
+    if isinstance(payload, np.ndarray):
+        return payload.nbytes
+    if isinstance(payload, dict):
+        return sum(payload_nbytes(value) for value in payload.values())
+    if isinstance(payload, (list, tuple)):
+        return sum(payload_nbytes(value) for value in payload)
+    return 0
+
+class UpdateCompressor(ABC):
+    name = None
+
+    def delta(self, weights, reference):
+        if reference is None:
+            return [np.asarray(weight, dtype=np.float32) for weight in weights]
+        return [np.subtract(weight, ref, dtype=np.float32) for weight, ref in zip(weights, reference)]
+
+    def apply(self, deltas, reference):
+        deltas = [numeric(delta, 'delta') for delta in layer_list(deltas, 'delta')]
+        if reference is None:
+            return deltas
+        layer_list(deltas, 'delta', len(reference))
+        for i, (delta, ref) in enumerate(zip(deltas, reference)):
+            if delta.shape != np.shape(ref):
+                raise ValueError(f"Layer {i} shape {delta.shape} does not match the model's {np.shape(ref)}")
+        return [np.add(ref, delta, dtype=np.float32).astype(np.asarray(ref).dtype, copy=False)
+                for ref, delta in zip(reference, deltas)]
+
+    @abstractmethod
+    def compress(self, weights, reference):
+        pass
+
+    @abstractmethod
+    def decompress(self, payload, reference):
+        pass
+
+class NoCompression(UpdateCompressor):
+    name = 'none'
+
+    def compress(self, weights, reference):
+        return {'weights': list(weights)}
+
+    def decompress(self, payload, reference):
+        weights, = require(payload, 'weights')
+        return layer_list(weights, 'weights')
+
+class DeltaCompressor(UpdateCompressor):
+    name = 'delta'
+
+    def compress(self, weights, reference):
+        return {'delta': self.delta(weights, reference)}
+
+    def decompress(self, payload, reference):
+        deltas, = require(payload, 'delta')
+        return self.apply(deltas, reference)
+
+class TopKCompressor(UpdateCompressor):
+    # Sends the `ratio` largest-magnitude delta entries across the whole model.
+    # What is not sent is kept as a residual and added to the next round's delta
+    # (error feedback), so small but persistent changes are not lost.
+    name = 'topk'
+
+    def __init__(self, ratio=0.01):
+        if not 0 < ratio <= 1:
+            raise ValueError(f"ratio must be in (0, 1], got {ratio}")
+        self.ratio = ratio
+        self.residual = None
+        self.buffer = None
+
+    def compress(self, weights, reference):
+        deltas = self.delta(weights, reference)
+        self.buffer = flatten(deltas, self.buffer)
+        if self.residual is None or self.residual.size != self.buffer.size:
+            self.residual = np.zeros_like(self.buffer)
+        self.buffer += self.residual
+        k = max(int(self.buffer.size * self.ratio), 1)
+        indices = np.argpartition(np.abs(self.buffer), -k)[-k:]
+        indices.sort()
+        values = self.buffer[indices]
+        np.copyto(self.residual, self.buffer)
+        self.residual[indices] = 0
+        index_dtype = np.uint32 if self.buffer.size < 2**32 else np.uint64
+        return {'indices': indices.astype(index_dtype), 'values': values, 'shapes': [list(np.shape(d)) for d in deltas]}
+
+    def decompress(self, payload, reference):
+        # The dense update is sized from the reference model, never from the
+        # client's 'shapes' alone, so there is nothing to decode before one exists.
+        if reference is None:
+            raise ValueError("Top-k updates need a global model to decompress against")
+        indices, values, shapes = require(payload, 'indices', 'values', 'shapes')
+        shapes = [self.shape(shape) for shape in layer_list(shapes, 'shapes')]
+        if shapes != [np.shape(ref) for ref in reference]:
+            raise ValueError("'shapes' do not match the model")
+        total = sum(int(np.prod(shape, dtype=np.int64)) for shape in shapes)
+        indices = numeric(indices, 'indices', 'iu')
+        values = numeric(values, 'values')
+        if indices.ndim != 1 or indices.shape != values.shape:
+            raise ValueError(f"'indices' {indices.shape} and 'values' {values.shape} must be matching vectors")
+        if indices.size and (int(indices.min()) < 0 or int(indices.max()) >= total):
+            raise ValueError(f"'indices' out of range for {total} parameters")
+        flat = np.zeros(total, dtype=np.float32)
+        flat[indices] = values
+        return self.apply(unflatten(flat, shapes), reference)
+
+    @staticmethod
+    def shape(shape):
+        if (not isinstance(shape, (list, tuple))
+                or not all(isinstance(dim, (int, np.integer)) and dim >= 0 for dim in shape)):
+            raise ValueError(f"Invalid layer shape {shape!r}")
+        return tuple(int(dim) for dim in shape)
+
+class QuantizationCompressor(UpdateCompressor):
+    # Stochastic uniform quantization of each layer's delta to 8 or 16 bits.
+    # Rounding up with probability equal to the fractional part keeps the
+    # dequantized update unbiased.
+    def __init__(self, bits=8, seed=None):
+        if bits not in (8, 16):
+            raise ValueError(f"bits must be 8 or 16, got {bits}")
+        self.bits = bits
+        self.name = f'quant{bits}'
+        self.dtype = np.uint8 if bits == 8 else np.uint16
+        self.rng = np.random.default_rng(seed)
+
+    def compress(self, weights, reference):
+        levels = 2**self.bits - 1
+        quantized, minimums, scales = [], [], []
+        for delta in self.delta(weights, reference):
+            low = float(delta.min()) if delta.size else 0.0
+            high = float(delta.max()) if delta.size else 0.0
+            scale = (high - low) / levels or 1.0
+            scaled = (delta - low) / scale
+            scaled += self.rng.random(scaled.shape, dtype=np.float32)
+            np.floor(scaled, out=scaled)
+            np.clip(scaled, 0, levels, out=scaled)
+            quantized.append(scaled.astype(self.dtype))
+            minimums.append(low)
+            scales.append(scale)
+        return {'quantized': quantized, 'min': minimums, 'scale': scales}
+
+    def decompress(self, payload, reference):
+        quantized, minimums, scales = require(payload, 'quantized', 'min', 'scale')
+        count = len(layer_list(quantized, 'quantized', None if reference is None else len(reference)))
+        minimums = numeric(layer_list(minimums, 'min', count), 'min', 'fiu').astype(np.float32)
+        scales = numeric(layer_list(scales, 'scale', count), 'scale', 'fiu').astype(np.float32)
+        deltas = [numeric(q, 'quantized', 'u').astype(np.float32) * scale + low
+                  for q, low, scale in zip(quantized, minimums, scales)]
+        return self.apply(deltas, reference)
+
+COMPRESSORS = {
+    'none': NoCompression,
+    'delta': DeltaCompressor,
+    'topk': TopKCompressor,
+    'quant8': lambda **options: QuantizationCompressor(bits=8, **options),
+    'quant16': lambda **options: QuantizationCompressor(bits=16, **options),
+}
+
+def get_compressor(name, **options):
+    if name not in COMPRESSORS:
+        raise ValueError(f"Unknown compressor {name}")
+    return COMPRESSORS[name](**options)
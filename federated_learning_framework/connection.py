@@ -54,96 +54,553 @@
 #         return pickle.loads(message)
 
 import asyncio
-import websockets
-import pickle
-from websockets.exceptions import ConnectionClosedError
+import contextvars
+import itertools
+import json
+import logging
+import os
+import random
+import struct
+import sys
+import time
+from websockets.exceptions import ConnectionClosed, ConnectionClosedError, ConnectionClosedOK
+from federated_learning_framework.codec import CodecError, get_codec
+from federated_learning_framework.metrics import MetricsRegistry
+# MemorySocket and MEMORY_SERVERS moved to transports.py and stay importable from here.
+from federated_learning_framework.transports import CLIENT_ID_HEADER, MEMORY_SERVERS, MemorySocket, get_transport
+
+# Payloads are only formatted when DEBUG logging is enabled for this logger.
+logger = logging.getLogger(__name__)
+
+# Messages larger than `chunk_size` are sent as a chunked transfer: each chunk is
+# its own websocket message carrying a small header (transfer id, byte offset,
+# total size). The receiver writes chunks into a preallocated buffer and acks
+# its progress; the sender keeps at most `window` chunks unacknowledged. If the
+# connection drops, the sender resumes from the last acknowledged offset.
+CHUNK_MAGIC = b'FLFC'
+CHUNK_HEADER = struct.Struct('!4sBBxxQQQ')
+# PING and PONG use the same control header; a channel answers every PING with a PONG.
+CHUNK, ACK, PING, PONG = 0, 1, 2, 3
+ACK_REQUESTED = 1
+DEFAULT_CHUNK_SIZE = 512 * 1024
+DEFAULT_WINDOW = 8
+TRANSFER_TTL = 600
+# The chunk header comes from the peer, so a transfer's size is bounded before its
+# buffer is allocated, and each peer may only have a few transfers in flight.
+DEFAULT_MAX_MESSAGE_SIZE = 1 << 30
+DEFAULT_MAX_TRANSFERS = 4
+# Messages at least this large are decoded on the CPU pool (see offload.CPUPool)
+# when one is given; smaller ones are cheaper to decode inline than to hand off.
+OFFLOAD_THRESHOLD = 64 * 1024
+# Clients identify themselves in the connection handshake (see transports.py;
+# a JSON value, so integer ids stay integers). A client that reconnects under the
+# same id takes over its session: the old channel is closed and half-sent
+# transfers resume. Clients without an id get the next unused integer.
+# A client silent for ping_interval seconds is pinged, and evicted once it has
+# been silent for ping_interval + ping_timeout.
+DEFAULT_PING_INTERVAL = 20.0
+DEFAULT_PING_TIMEOUT = 20.0
+# (client_id, Channel) of the connection a client handler was started for. Tasks
+# inherit it, so a handler keeps receiving from its own connection: once the
+# client has reconnected elsewhere, its receive() raises instead of reading the
+# new connection's messages alongside the new handler.
+handler_channel = contextvars.ContextVar('handler_channel', default=None)
+
+def requested_client_id(websocket):
+    # Transport sockets carry the id from their handshake; websockets carry the header.
+    if hasattr(websocket, 'client_id'):
+        return websocket.client_id
+    request = getattr(websocket, 'request', None)
+    headers = request.headers if request is not None else getattr(websocket, 'request_headers', {})
+    value = headers.get(CLIENT_ID_HEADER)
+    if value is None:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def frame(buffers):
+    # A multi-buffer message goes out as one fragmented websocket message, so
+    # tensor segments are written from their own memory without joining.
+    return buffers[0] if len(buffers) == 1 else buffers
+
+def message_nbytes(buffers):
+    return sum(memoryview(buffer).nbytes for buffer in buffers)
+
+def iter_chunks(buffers, chunk_size, start=0):
+    # Yields (offset, pieces) over the concatenation of `buffers` without copying.
+    views = [memoryview(buffer).cast('B') for buffer in buffers]
+    total = sum(view.nbytes for view in views)
+    for offset in range(start, total, chunk_size):
+        end = min(offset + chunk_size, total)
+        pieces = []
+        position = 0
+        for view in views:
+            view_end = position + view.nbytes
+            if view_end > offset and position < end:
+                pieces.append(view[max(offset - position, 0):min(end, view_end) - position])
+            position = view_end
+            if position >= end:
+                break
+        yield offset, pieces
+
+class Transfer:
+    def __init__(self, buffers, transfer_id=None):
+        self.transfer_id = transfer_id if transfer_id is not None else int.from_bytes(os.urandom(8), 'big')
+        self.buffers = buffers
+        self.total = message_nbytes(buffers)
+        self.acked = 0
+
+class Assembly:
+    def __init__(self, total):
+        self.buffer = bytearray(total)
+        self.received = 0
+        self.updated = time.monotonic()
+
+def prune_assemblies(assemblies, now):
+    for transfer_id, assembly in list(assemblies.items()):
+        if now - assembly.updated > TRANSFER_TTL:
+            del assemblies[transfer_id]
+
+class Channel:
+    # Owns one websocket. A reader task demultiplexes incoming data: chunk acks
+    # update pending transfers, chunks are assembled, and complete messages are
+    # queued in `inbox` and decoded by receive(). Bytes and codec timings are
+    # recorded in `metrics`, labelled with `peer`. `assemblies` holds this peer's
+    # half-received transfers only; it outlives the channel so they can resume.
+    # A chunk that breaks the limits closes the channel.
+    def __init__(self, websocket, codec, assemblies, chunk_size=DEFAULT_CHUNK_SIZE, window=DEFAULT_WINDOW, pool=None,
+                 metrics=None, peer='server', max_message_size=DEFAULT_MAX_MESSAGE_SIZE,
+                 max_transfers=DEFAULT_MAX_TRANSFERS):
+        self.websocket = websocket
+        self.codec = codec
+        self.pool = pool
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.peer = str(peer)
+        self.assemblies = assemblies
+        self.chunk_size = chunk_size
+        self.window = window
+        self.max_message_size = max_message_size
+        self.max_transfers = max_transfers
+        self.inbox = asyncio.Queue()
+        self.transfers = {}
+        self.interrupted = []
+        self.progress = asyncio.Event()
+        self.closed = None
+        self.last_seen = time.monotonic()
+        self.reader = asyncio.ensure_future(self.read_loop())
+
+    async def read_loop(self):
+        try:
+            while True:
+                data = await self.websocket.recv()
+                self.last_seen = time.monotonic()
+                if data[:4] == CHUNK_MAGIC:
+                    await self.handle_chunk(data)
+                else:
+                    self.inbox.put_nowait(data)
+        except ConnectionClosed as e:
+            self.closed = e
+        except Exception as e:
+            logger.warning(f"Closing connection with {self.peer}: {e}")
+            self.closed = ConnectionClosedError(None, None)
+            self.closed.__cause__ = e
+            asyncio.ensure_future(self.websocket.close())
+        finally:
+            self.inbox.put_nowait(None)
+            self.progress.set()
+
+    async def handle_chunk(self, data):
+        _, kind, flags, transfer_id, offset, total = CHUNK_HEADER.unpack_from(data)
+        if kind == PING:
+            asyncio.ensure_future(self.send_control(PONG))
+            return
+        if kind == PONG:
+            return
+        if kind == ACK:
+            transfer = self.transfers.get(transfer_id)
+            if transfer is not None:
+                transfer.acked = max(transfer.acked, offset)
+                self.progress.set()
+            return
+        payload = memoryview(data)[CHUNK_HEADER.size:]
+        if total > self.max_message_size:
+            raise ValueError(f"transfer of {total} bytes exceeds max_message_size ({self.max_message_size})")
+        if offset + payload.nbytes > total:
+            raise ValueError(f"chunk at {offset}+{payload.nbytes} overruns its {total}-byte transfer")
+        assembly = self.assemblies.get(transfer_id)
+        if assembly is None or len(assembly.buffer) != total:
+            self.prune_assemblies()
+            if assembly is None and len(self.assemblies) >= self.max_transfers:
+                raise ValueError(f"more than {self.max_transfers} transfers in flight")
+            assembly = self.assemblies[transfer_id] = Assembly(total)
+        assembly.buffer[offset:offset + payload.nbytes] = payload
+        assembly.received = max(assembly.received, offset + payload.nbytes)
+        assembly.updated = time.monotonic()
+        complete = assembly.received >= total
+        if complete or flags & ACK_REQUESTED:
+            # Acks are sent from a separate task so the reader never blocks on
+            # outgoing traffic; otherwise two peers sending large transfers to
+            # each other could stall waiting on each other's acks.
+            asyncio.ensure_future(self.send_ack(transfer_id, assembly.received, total))
+        if complete:
+            del self.assemblies[transfer_id]
+            self.inbox.put_nowait(assembly.buffer)
+
+    async def send_ack(self, transfer_id, received, total):
+        await self.send_control(ACK, transfer_id, received, total)
+
+    async def send_control(self, kind, transfer_id=0, offset=0, total=0):
+        try:
+            await self.websocket.send(CHUNK_HEADER.pack(CHUNK_MAGIC, kind, 0, transfer_id, offset, total))
+        except ConnectionClosed:
+            pass
+
+    async def ping(self):
+        await self.send_control(PING)
+
+    def prune_assemblies(self):
+        prune_assemblies(self.assemblies, time.monotonic())
+
+    async def encode(self, message):
+        # The binary codec only builds metadata and memoryviews over the arrays;
+        # other codecs copy the whole message, so they run on the pool.
+        start = time.perf_counter()
+        if self.pool is None or self.codec.name == 'binary':
+            buffers = self.codec.encode(message)
+        else:
+            buffers = await self.pool.run(self.codec.encode, message)
+        self.metrics.observe('serialize_seconds', time.perf_counter() - start)
+        return buffers
+
+    async def send(self, message):
+        return await self.send_buffers(await self.encode(message))
+
+    async def send_buffers(self, buffers):
+        nbytes = message_nbytes(buffers)
+        if nbytes <= self.chunk_size:
+            await self.websocket.send(frame(buffers))
+        else:
+            await self.send_transfer(Transfer(buffers))
+        self.metrics.inc('bytes_sent_total', nbytes, peer=self.peer)
+        return nbytes
+
+    async def send_transfer(self, transfer):
+        self.transfers[transfer.transfer_id] = transfer
+        # The sender asks for an ack every half window, so the receiver's settings don't matter.
+        ack_every = max(self.window // 2, 1)
+        try:
+            for index, (offset, pieces) in enumerate(iter_chunks(transfer.buffers, self.chunk_size, transfer.acked)):
+                await self.wait_for_ack(transfer, offset - self.window * self.chunk_size)
+                flags = ACK_REQUESTED if index % ack_every == 0 else 0
+                header = CHUNK_HEADER.pack(CHUNK_MAGIC, CHUNK, flags, transfer.transfer_id, offset, transfer.total)
+                await self.websocket.send([header, *pieces])
+            await self.wait_for_ack(transfer, transfer.total)
+        except ConnectionClosed:
+            self.interrupted.append(transfer)
+            raise
+        finally:
+            del self.transfers[transfer.transfer_id]
+
+    async def wait_for_ack(self, transfer, offset):
+        while transfer.acked < offset:
+            if self.closed is not None:
+                raise self.closed
+            self.progress.clear()
+            await self.progress.wait()
+
+    async def receive(self):
+        data = await self.inbox.get()
+        if data is None:
+            self.inbox.put_nowait(None)
+            raise self.closed
+        self.metrics.inc('bytes_received_total', len(data), peer=self.peer)
+        start = time.perf_counter()
+        if self.pool is None or len(data) < OFFLOAD_THRESHOLD:
+            message = self.codec.decode(data)
+        else:
+            message = await self.pool.run(self.codec.decode, data)
+        self.metrics.observe('deserialize_seconds', time.perf_counter() - start)
+        return message
+
+    async def close(self):
+        if self.closed is None:
+            self.closed = ConnectionClosedOK(None, None)
+        self.reader.cancel()
+        await self.websocket.close()
 
 class ConnectionServer:
-    def __init__(self, connection_type, host, port, client_handler):
+    def __init__(self, connection_type, host, port, client_handler, codec='binary',
+                 chunk_size=DEFAULT_CHUNK_SIZE, window=DEFAULT_WINDOW, pool=None, metrics=None,
+                 ping_interval=DEFAULT_PING_INTERVAL, ping_timeout=DEFAULT_PING_TIMEOUT,
+                 max_message_size=DEFAULT_MAX_MESSAGE_SIZE, max_transfers=DEFAULT_MAX_TRANSFERS):
+        # One of transports.TRANSPORTS ('websocket', 'tcp', 'shm', 'memory') or a transport instance.
         self.connection_type = connection_type
+        self.transport = get_transport(connection_type)
         self.host = host
         self.port = port
         self.client_handler = client_handler
+        self.codec = get_codec(codec)
+        # Only websocket messages are size-limited; other transports send whole messages.
+        self.chunk_size = chunk_size if self.transport.chunked else sys.maxsize
+        self.window = window
+        self.pool = pool
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
         self.clients = {}
+        # Half-received transfers by client id, then transfer id (see Channel).
+        self.assemblies = {}
+        self.max_message_size = max_message_size
+        self.max_transfers = max_transfers
+        self.interrupted = {}
+        self.bytes_sent = 0
+        # None disables liveness checks.
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.next_ids = itertools.count(1)
 
     async def start(self):
-        if self.connection_type == 'websocket':
-            async with websockets.serve(self.handle_client, self.host, self.port):
-                await asyncio.Future()  # Run forever
-        else:
-            raise NotImplementedError(f"Connection type {self.connection_type} not supported")
+        liveness = asyncio.ensure_future(self.check_liveness()) if self.ping_interval else None
+        try:
+            await self.transport.serve(self)
+        finally:
+            if liveness is not None:
+                liveness.cancel()
+
+    async def check_liveness(self):
+        while True:
+            await asyncio.sleep(min(self.ping_interval, self.ping_timeout or self.ping_interval))
+            now = time.monotonic()
+            for client_id, channel in list(self.clients.items()):
+                idle = now - channel.last_seen
+                if self.ping_timeout is not None and idle > self.ping_interval + self.ping_timeout:
+                    logger.info(f"Evicting client {client_id} after {idle:.1f}s without traffic")
+                    self.metrics.inc('evicted_clients_total')
+                    # Closing a dead websocket waits out its close handshake, so it runs on its own.
+                    asyncio.ensure_future(channel.close())
+                elif idle >= self.ping_interval:
+                    asyncio.ensure_future(channel.ping())
+            for client_id, transfer in list(self.interrupted.items()):
+                if now - transfer.interrupted_at > TRANSFER_TTL:
+                    del self.interrupted[client_id]
+            for client_id, assemblies in list(self.assemblies.items()):
+                prune_assemblies(assemblies, now)
+                if not assemblies and client_id not in self.clients:
+                    del self.assemblies[client_id]
+
+    def accept(self, socket, client_id=None):
+        # Serves one end of a MemorySocket pair, closing it when the handler returns like websockets.serve does.
+        socket.client_id = client_id
 
-    async def handle_client(self, websocket, path):
-        client_id = len(self.clients) + 1
-        self.clients[client_id] = websocket
-        await self.client_handler(websocket, client_id)
+        async def serve():
+            try:
+                await self.handle_client(socket)
+            finally:
+                await socket.close()
+
+        asyncio.ensure_future(serve())
+
+    def new_client_id(self):
+        client_id = next(self.next_ids)
+        while client_id in self.clients:
+            client_id = next(self.next_ids)
+        return client_id
+
+    async def handle_client(self, websocket, path=None):
+        client_id = requested_client_id(websocket)
+        if client_id is None:
+            client_id = self.new_client_id()
+        previous = self.clients.get(client_id)
+        if previous is not None:
+            logger.info(f"Client {client_id} reconnected; closing its previous connection")
+            self.stash_interrupted(client_id, previous)
+            asyncio.ensure_future(previous.close())
+        channel = Channel(websocket, self.codec, self.assemblies.setdefault(client_id, {}), self.chunk_size,
+                          self.window, self.pool, self.metrics, client_id, self.max_message_size, self.max_transfers)
+        self.clients[client_id] = channel
+        if client_id in self.interrupted:
+            asyncio.ensure_future(self.resume(client_id))
+        handler_channel.set((client_id, channel))
+        try:
+            await self.client_handler(websocket, client_id)
+        finally:
+            channel.reader.cancel()
+            if self.is_current(client_id, websocket):
+                del self.clients[client_id]
+
+    def is_current(self, client_id, websocket):
+        # False once the client reconnected on another connection.
+        channel = self.clients.get(client_id)
+        return channel is not None and channel.websocket is websocket
 
     async def send(self, client_id, message):
         client = self.clients.get(client_id)
         if client:
             try:
-                serialized_message = pickle.dumps(message)
-                await client.send(serialized_message)
-                print(f"Sent to client {client_id}: {message}")  # Debug log
+                self.bytes_sent += await client.send(message)
+                logger.debug("Sent to client %s: %s", client_id, message)
+            except ConnectionClosed as e:
+                self.stash_interrupted(client_id, client)
+                logger.warning(f"Error sending message to client {client_id}: {e}")
             except Exception as e:
-                print(f"Error sending message to client {client_id}: {e}")
+                logger.error(f"Error sending message to client {client_id}: {e}")
+        else:
+            logger.warning(f"Client {client_id} not found")
+
+    async def broadcast(self, client_ids, message, timeout=None):
+        # The message is encoded once into an immutable buffer that every client
+        # send shares, so fan-out costs one serialization whatever the client
+        # count, and the caller may replace its weights as soon as this returns.
+        start = time.perf_counter()
+        if self.pool is None:
+            payload = [b''.join(self.codec.encode(message))]
         else:
-            print(f"Client {client_id} not found")
+            payload = [await self.pool.run(lambda: b''.join(self.codec.encode(message)))]
+        self.metrics.observe('serialize_seconds', time.perf_counter() - start)
+        clients = [(client_id, self.clients[client_id]) for client_id in client_ids if client_id in self.clients]
+
+        async def send_one(client_id, client):
+            try:
+                await asyncio.wait_for(client.send_buffers(payload), timeout)
+                self.bytes_sent += len(payload[0])
+                return client_id
+            except asyncio.TimeoutError:
+                logger.warning(f"Timed out sending to client {client_id}")
+            except ConnectionClosed as e:
+                self.stash_interrupted(client_id, client)
+                logger.warning(f"Error sending message to client {client_id}: {e}")
+            except Exception as e:
+                logger.error(f"Error sending message to client {client_id}: {e}")
+
+        delivered = await asyncio.gather(*[send_one(client_id, client) for client_id, client in clients])
+        delivered = [client_id for client_id in delivered if client_id is not None]
+        logger.debug("Broadcast %d bytes to %d/%d clients", len(payload[0]), len(delivered), len(clients))
+        return delivered
+
+    async def resume(self, client_id):
+        transfer = self.interrupted.pop(client_id)
+        logger.info(f"Resuming transfer to client {client_id} at byte {transfer.acked}")
+        await self.clients[client_id].send_transfer(transfer)
 
     async def receive(self, client_id):
         client = self.clients.get(client_id)
+        owner = handler_channel.get()
+        if owner is not None and owner[0] == client_id and owner[1] is not client:
+            logger.info(f"Client {client_id} reconnected; its previous handler stops receiving")
+            raise ConnectionClosedOK(None, None)
         if client:
             try:
-                message = await client.recv()
-                deserialized_message = pickle.loads(message)
-                print(f"Received from client {client_id}: {deserialized_message}")  # Debug log
-                return deserialized_message
-            except ConnectionClosedError:
-                print(f"Connection with client {client_id} closed unexpectedly")
-            except pickle.PickleError as e:
-                print(f"Pickle error: {e}")
+                message = await client.receive()
+                logger.debug("Received from client %s: %s", client_id, message)
+                return message
+            except ConnectionClosed:
+                logger.info(f"Connection with client {client_id} closed")
+                raise
+            except CodecError as e:
+                logger.error(f"Decode error from client {client_id}: {e}")
             except Exception as e:
-                print(f"Error receiving message from client {client_id}: {e}")
+                logger.error(f"Error receiving message from client {client_id}: {e}")
         else:
-            print(f"Client {client_id} not found")
+            logger.warning(f"Client {client_id} not found")
+
+    def stash_interrupted(self, client_id, channel):
+        # Keep a half-sent transfer so it can resume if the client reconnects under the same id.
+        if channel.interrupted:
+            transfer = self.interrupted[client_id] = channel.interrupted.pop()
+            transfer.interrupted_at = time.monotonic()
 
 class ConnectionClient:
-    def __init__(self, connection_type, uri):
+    # `client_id` is sent in the connection handshake, so the server knows the
+    # client under the same id across reconnects.
+    def __init__(self, connection_type, uri, codec='binary', chunk_size=DEFAULT_CHUNK_SIZE, window=DEFAULT_WINDOW,
+                 pool=None, metrics=None, client_id=None, max_message_size=DEFAULT_MAX_MESSAGE_SIZE,
+                 max_transfers=DEFAULT_MAX_TRANSFERS):
+        self.client_id = client_id
         self.connection_type = connection_type
+        self.transport = get_transport(connection_type)
         self.uri = uri
+        self.codec = get_codec(codec)
+        self.chunk_size = chunk_size if self.transport.chunked else sys.maxsize
+        self.window = window
+        self.pool = pool
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
         self.connection = None
+        self.channel = None
+        self.assemblies = {}
+        self.max_message_size = max_message_size
+        self.max_transfers = max_transfers
+        self.interrupted = None
+        self.bytes_sent = 0
+
+    @property
+    def connected(self):
+        return self.channel is not None and self.channel.closed is None
 
     async def connect(self):
-        if self.connection_type == 'websocket':
+        if self.channel is not None:
+            self.channel.reader.cancel()
+            self.channel = None
+        try:
+            self.connection = await self.transport.connect(self.uri, self.client_id, self.max_message_size)
+        except Exception as e:
+            logger.error(f"Error connecting to server: {e}")
+            return
+        self.channel = Channel(self.connection, self.codec, self.assemblies, self.chunk_size, self.window, self.pool,
+                               self.metrics, max_message_size=self.max_message_size, max_transfers=self.max_transfers)
+        logger.info(f"Connected to server at {self.uri}")
+        if self.channel and self.interrupted:
+            await self.resume()
+
+    async def reconnect(self, attempts=None, base_delay=0.5, max_delay=30.0):
+        # Exponential backoff with full jitter, so clients dropped together do not
+        # all come back at once. Returns whether a connection was made.
+        attempt = 0
+        while attempts is None or attempt < attempts:
+            await asyncio.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+            attempt += 1
             try:
-                self.connection = await websockets.connect(self.uri)
-                print(f"Connected to server at {self.uri}")  # Debug log
-            except Exception as e:
-                print(f"Error connecting to server: {e}")
-        else:
-            raise NotImplementedError(f"Connection type {self.connection_type} not supported")
+                await self.connect()
+            except ConnectionClosed as e:
+                logger.warning(f"Connection lost again while resuming: {e}")
+                continue
+            if self.connected:
+                self.metrics.inc('reconnects_total')
+                logger.info(f"Reconnected to server at {self.uri} after {attempt} attempts")
+                return True
+        return False
+
+    async def resume(self):
+        transfer, self.interrupted = self.interrupted, None
+        logger.info(f"Resuming transfer to server at byte {transfer.acked}")
+        try:
+            await self.channel.send_transfer(transfer)
+        except ConnectionClosed:
+            self.interrupted = transfer
+            raise
 
     async def send(self, message):
-        if self.connection:
+        if self.channel:
             try:
-                serialized_message = pickle.dumps(message)
-                await self.connection.send(serialized_message)
-                print(f"Sent to server: {message}")  # Debug log
+                self.bytes_sent += await self.channel.send(message)
+                logger.debug("Sent to server: %s", message)
+            except ConnectionClosed as e:
+                if self.channel.interrupted:
+                    self.interrupted = self.channel.interrupted.pop()
+                logger.warning(f"Error sending message: {e}")
             except Exception as e:
-                print(f"Error sending message: {e}")
+                logger.error(f"Error sending message: {e}")
         else:
-            print("Not connected to server")
+            logger.warning("Not connected to server")
 
     async def receive(self):
-        if self.connection:
+        if self.channel:
             try:
-                message = await self.connection.recv()
-                deserialized_message = pickle.loads(message)
-                print(f"Received from server: {deserialized_message}")  # Debug log
-                return deserialized_message
-            except pickle.PickleError as e:
-                print(f"Pickle error: {e}")
+                message = await self.channel.receive()
+                logger.debug("Received from server: %s", message)
+                return message
+            except CodecError as e:
+                logger.error(f"Decode error: {e}")
             except Exception as e:
-                print(f"Error receiving message: {e}")
+                logger.error(f"Error receiving message: {e}")
         else:
-            print("Not connected to server")
+            logger.warning("Not connected to server")
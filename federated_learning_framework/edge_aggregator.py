@@ -0,0 +1,69 @@
+import asyncio
+import time
+from federated_learning_framework.central_server import CentralServer
+from federated_learning_framework.connection import ConnectionClient
+
+class EdgeAggregator(CentralServer):
+    # A middle tier between clients and the CentralServer. Local clients connect
+    # to the edge exactly as they would to the root; the edge collects their
+    # updates with the usual quorum / round_timeout rules and forwards one
+    # sample-weighted partial sum plus its sample count to the root, which merges
+    # partials with add_partial. The root therefore receives one update per edge
+    # per round, however many clients sit behind it. Global models from the root
+    # are relayed to the local clients under the root's round id.
+    #
+    # Encrypted partial sums stay at the same CKKS level as scaled client updates,
+    # so the edge only needs the public context, like the root.
+    #
+    # The link to the root uses `root_connection_type`, by default the transport
+    # the edge serves its own clients on (e.g. 'shm' for an edge co-located with
+    # the root, 'tcp' between hosts).
+    def __init__(self, root_uri, *args, edge_id=None, root_connection_type=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.root_uri = root_uri
+        self.edge_id = edge_id or f"edge-{self.connection.port}"
+        self.root = ConnectionClient(root_connection_type or self.connection.connection_type, root_uri,
+                                     kwargs.get('codec', 'binary'), pool=self.pool, metrics=self.metrics,
+                                     client_id=self.edge_id)
+
+    async def connect_root(self):
+        await self.root.connect()
+        await self.root.send({'client_id': self.edge_id})
+
+    async def run(self):
+        await self.connect_root()
+        await asyncio.gather(self.run_server(), self.relay_from_root())
+
+    async def relay_from_root(self):
+        while True:
+            message = await self.root.receive()
+            if message is None:
+                self.logger.info(f"Edge {self.edge_id}: Connection to the root closed")
+                return
+            if isinstance(message, dict) and 'weights' in message:
+                async with self.lock:
+                    self.round_id = message.get('round', self.round_id)
+                await self.transmit_weights(message['weights'])
+
+    async def close_round(self):
+        async with self.lock:
+            aggregator = self.round_aggregator
+            if aggregator is None or aggregator.num_updates == 0:
+                return
+            started = time.perf_counter()
+            weighted_sum, num_samples = await self.pool.run(aggregator.partial)
+            aggregation_time = time.perf_counter() - started
+            self.metrics.observe('round_aggregation_seconds', aggregation_time)
+            num_updates = aggregator.num_updates
+            self.logger.info(f"Edge {self.edge_id}: Round {self.round_id} closed with {num_updates} updates "
+                             f"({num_samples} samples)")
+            aggregator.reset()
+            self.round_aggregator = None
+            if self.round_deadline is not None and self.round_deadline is not asyncio.current_task():
+                self.round_deadline.cancel()
+            self.round_deadline = None
+            if self.scheduler is not None:
+                self.scheduler.round_closed(aggregation_time)
+            message = {'partial': weighted_sum, 'num_samples': num_samples, 'num_updates': num_updates,
+                       'round': self.round_id}
+        await self.root.send(message)
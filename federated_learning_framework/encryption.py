@@ -1,22 +1,119 @@
-import tenseal as ts
+import numpy as np
 
-def create_context():
-    context = ts.context(ts.SCHEME_TYPE.CKKS, poly_modulus_degree=32768, coeff_mod_bit_sizes=[60, 40, 40, 60])
-    context.generate_galois_keys()
-    context.global_scale = 2**40
+# TenSEAL is imported inside the functions that need it, so that importing this
+# module (e.g. for is_encrypted or pack_weights) does not load the native library.
+
+# CKKS parameter sets. Larger rings hold more slots per ciphertext and more
+# multiplicative depth, at the cost of slower key generation and bigger keys.
+PROFILES = {
+    'fast': {'poly_modulus_degree': 8192, 'coeff_mod_bit_sizes': [60, 40, 40, 60], 'global_scale': 2**40},
+    'balanced': {'poly_modulus_degree': 16384, 'coeff_mod_bit_sizes': [60, 40, 40, 40, 40, 60], 'global_scale': 2**40},
+    'secure': {'poly_modulus_degree': 32768, 'coeff_mod_bit_sizes': [60, 40, 40, 60], 'global_scale': 2**40},
+}
+DEFAULT_PROFILE = 'secure'
+
+_context_cache = {}
+
+def create_context(profile=DEFAULT_PROFILE, galois_keys=False, cache=True):
+    # Galois keys are only needed for rotations (none of the aggregation path
+    # uses them) and dominate key generation time, so they are opt-in.
+    import tenseal as ts
+    params = PROFILES[profile] if isinstance(profile, str) else profile
+    key = (params['poly_modulus_degree'], tuple(params['coeff_mod_bit_sizes']), params['global_scale'])
+    context = _context_cache.get(key) if cache else None
+    if context is None:
+        context = ts.context(ts.SCHEME_TYPE.CKKS, poly_modulus_degree=params['poly_modulus_degree'],
+                             coeff_mod_bit_sizes=params['coeff_mod_bit_sizes'])
+        context.global_scale = params['global_scale']
+        if cache:
+            _context_cache[key] = context
+    if galois_keys:
+        ensure_galois_keys(context)
     return context
 
-def encrypt_weights(context, model_weights):
-    encrypted_weights = []
+def clear_context_cache():
+    _context_cache.clear()
+
+def ensure_galois_keys(context):
+    if not context.has_galois_keys():
+        context.generate_galois_keys()
+    return context
+
+def save_context(context, path, secret_key=False):
+    # Without the secret key the file is safe to ship to servers; clients need secret_key=True.
+    with open(path, 'wb') as f:
+        f.write(context.serialize(save_secret_key=secret_key and context.is_private()))
+
+def load_context(path):
+    import tenseal as ts
+    with open(path, 'rb') as f:
+        return ts.context_from(f.read())
+
+def public_context(context):
+    # The server only needs to add and scale ciphertexts, so it gets a copy without the secret key.
+    if context.is_public():
+        return context
+    context = context.copy()
+    context.make_context_public()
+    return context
+
+def slot_count(context):
+    return context.seal_context().data.key_context_data().parms().poly_modulus_degree() // 2
+
+def is_encrypted(weights):
+    return isinstance(weights, dict) and 'chunks' in weights
+
+def pack_weights(model_weights):
+    # All layers go into one flat float64 buffer; the manifest records how to cut it back up.
+    manifest = []
+    total = 0
+    for weight in model_weights:
+        weight = np.asarray(weight)
+        manifest.append({'shape': list(weight.shape), 'dtype': weight.dtype.str})
+        total += weight.size
+    flat = np.empty(total, dtype=np.float64)
+    offset = 0
     for weight in model_weights:
-        weight_array = weight.flatten().tolist()
-        encrypted_vector = ts.ckks_vector(context, weight_array)
-        encrypted_weights.append(encrypted_vector.serialize())
-    return encrypted_weights
+        size = np.size(weight)
+        flat[offset:offset + size] = np.ravel(weight)
+        offset += size
+    return flat, manifest
+
+def unpack_weights(flat, manifest):
+    weights = []
+    offset = 0
+    for entry in manifest:
+        shape = tuple(entry['shape'])
+        size = int(np.prod(shape, dtype=np.int64))
+        weights.append(flat[offset:offset + size].reshape(shape).astype(np.dtype(entry['dtype'])))
+        offset += size
+    return weights
+
+def encrypt_weights(context, model_weights):
+    # Layers are packed back to back so every ciphertext is filled to its slot
+    # count, instead of one mostly-empty ciphertext per (bias) layer. Each chunk
+    # reaches TenSEAL as a PlainTensor built from the array, not a Python list.
+    # Chunks are encrypted one after another: TenSEAL gives no guarantee that one
+    # context can encode and encrypt from several threads at once.
+    import tenseal as ts
+    flat, manifest = pack_weights(model_weights)
+    slots = slot_count(context)
+    chunks = [ts.ckks_vector(context, ts.plain_tensor(flat[start:start + slots])).serialize()
+              for start in range(0, flat.size, slots)]
+    return {'manifest': manifest, 'chunks': chunks}
+
+def load_encrypted(context, enc_weight):
+    import tenseal as ts
+    return ts.ckks_vector_from(context, enc_weight)
 
 def decrypt_weights(context, encrypted_weights):
-    decrypted_weights = []
-    for enc_weight in encrypted_weights:
-        enc_vector = ts.ckks_vector_from(context, enc_weight)
-        decrypted_weights.append(enc_vector.decrypt())
-    return decrypted_weights
+    import tenseal as ts
+    manifest = encrypted_weights['manifest']
+    total = sum(int(np.prod(entry['shape'], dtype=np.int64)) for entry in manifest)
+    slots = slot_count(context)
+    flat = np.empty(total, dtype=np.float64)
+    for index, enc_chunk in enumerate(encrypted_weights['chunks']):
+        values = ts.ckks_vector_from(context, enc_chunk).decrypt()
+        start = index * slots
+        flat[start:start + len(values)] = values
+    return unpack_weights(flat, manifest)
@@ -0,0 +1,194 @@
+import asyncio
+import bisect
+import json
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Counters, gauges and histograms keyed by name and labels, plus structured
+# events (e.g. one record per round). The registry is the in-process sink; a
+# JsonlSink receives every event as a line of JSON, and PrometheusEndpoint
+# serves the current values in the Prometheus text format over HTTP. Updating
+# a metric is a dict lookup and an add, so it is cheap enough for hot paths.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+NAMESPACE = 'federated_learning'
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+def escape_label(value):
+    # Label values can come from peers (a client picks its own id), so the
+    # characters the text format reserves are escaped: backslash, quote, newline.
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return {'count': self.count, 'sum': self.sum, 'buckets': dict(zip(map(str, self.buckets), self.counts))}
+
+class MetricsRegistry:
+    def __init__(self, max_events=1000):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.events = deque(maxlen=max_events)
+        self.sinks = []
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def event(self, name, **fields):
+        record = {'event': name, 'time': time.time(), **fields}
+        self.events.append(record)
+        for sink in self.sinks:
+            sink.emit(record)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def get(self, name, **labels):
+        key = _key(name, labels)
+        if key in self.counters:
+            return self.counters[key]
+        if key in self.gauges:
+            return self.gauges[key]
+        return self.histograms.get(key)
+
+    def snapshot(self):
+        def flat(key):
+            name, labels = key
+            return name + ''.join(f'[{label}={value}]' for label, value in labels)
+
+        return {
+            'counters': {flat(key): value for key, value in self.counters.items()},
+            'gauges': {flat(key): value for key, value in self.gauges.items()},
+            'histograms': {flat(key): histogram.snapshot() for key, histogram in self.histograms.items()},
+        }
+
+    def prometheus_text(self):
+        lines = []
+
+        def series(name, labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return name
+            return name + '{' + ','.join(f'{label}="{escape_label(value)}"' for label, value in pairs) + '}'
+
+        def grouped(metrics):
+            names = {}
+            for (name, labels), value in metrics.items():
+                names.setdefault(f'{NAMESPACE}_{name}', []).append((labels, value))
+            return names.items()
+
+        for kind, metrics in (('counter', self.counters), ('gauge', self.gauges)):
+            for name, values in grouped(metrics):
+                lines.append(f'# TYPE {name} {kind}')
+                lines.extend(f'{series(name, labels)} {value}' for labels, value in values)
+        for name, values in grouped(self.histograms):
+            lines.append(f'# TYPE {name} histogram')
+            for labels, histogram in values:
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{series(name + "_bucket", labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{series(name + "_sum", labels)} {histogram.sum}')
+                lines.append(f'{series(name + "_count", labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+class JsonlSink:
+    # Appends every event, and a full snapshot on flush(), to a JSON-lines file.
+    def __init__(self, path, registry=None):
+        self.path = path
+        self.registry = registry
+        self.file = open(path, 'a', buffering=1)
+
+    def emit(self, record):
+        self.file.write(json.dumps(record, default=str) + '\n')
+
+    def flush(self):
+        if self.registry is not None:
+            self.emit({'event': 'snapshot', 'time': time.time(), **self.registry.snapshot()})
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+class PrometheusEndpoint:
+    # Minimal HTTP server answering every GET with the registry in the Prometheus text format.
+    def __init__(self, registry, host='0.0.0.0', port=9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def emit(self, record):
+        pass
+
+    async def handle(self, reader, writer):
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            body = self.registry.prometheus_text().encode('utf-8')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                         b'Content-Length: ' + str(len(body)).encode() + b'\r\nConnection: close\r\n\r\n' + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        return self.server
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+async def monitor_event_loop(registry, interval=0.5, sample=None):
+    # Records how late the loop wakes up from a sleep (event-loop lag) and, via
+    # `sample`, any gauges that are cheaper to poll than to update on every change.
+    logger = logging.getLogger(__name__)
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(time.perf_counter() - start - interval, 0.0)
+        registry.observe('event_loop_lag_seconds', lag)
+        registry.set('event_loop_lag_seconds_last', lag)
+        if sample is not None:
+            try:
+                sample()
+            except Exception as e:
+                logger.warning(f"Metrics sampling failed: {e}")
@@ -1,6 +1,38 @@
 from abc import ABC, abstractmethod
+import numpy as np
+
+def batch_indices(num_samples, batch_size, shuffle=False, rng=None):
+    order = (rng or np.random.default_rng()).permutation(num_samples) if shuffle else np.arange(num_samples)
+    for start in range(0, num_samples, batch_size):
+        yield order[start:start + batch_size]
+
+def dataset_size(x_train, y_train=None):
+    # Number of local examples, used as the update's weight in aggregation.
+    if y_train is not None:
+        return len(x_train)
+    dataset = getattr(x_train, 'dataset', None)
+    try:
+        return len(dataset)
+    except TypeError:
+        return None
 
 class AbstractModel(ABC):
+    # Besides per-layer get/set, a model exposes its parameters as one contiguous,
+    # reusable buffer (flat_weights) laid out by layer_index(). The buffer is
+    # float32 unless a layer needs a wider type (`flat_dtype` overrides this), so
+    # converting back to each layer's dtype is lossless. Models that keep their
+    # parameters in that buffer return views into it from get_weights; those
+    # views stay valid until the next get_weights/set_weights.
+    #
+    # train() returns (and keeps in last_train_stats) a dict with the samples and
+    # optimizer steps processed, samples/sec, and `num_samples`, the local
+    # dataset size clients report as their aggregation weight.
+    flat_dtype = None
+    flat = None
+    index = None
+    views = None
+    last_train_stats = None
+
     @abstractmethod
     def get_weights(self):
         pass
@@ -16,3 +48,54 @@ class AbstractModel(ABC):
     @abstractmethod
     def predict(self, data):
         pass
+
+    def record_training(self, samples, steps, seconds, num_samples=None):
+        self.last_train_stats = {
+            'samples': samples,
+            'steps': steps,
+            'seconds': seconds,
+            'samples_per_sec': samples / seconds if seconds else 0.0,
+            'num_samples': num_samples if num_samples is not None else samples,
+        }
+        return self.last_train_stats
+
+    def layer_index(self):
+        # [{'shape', 'dtype', 'offset', 'size'}] for every layer, in get_weights order.
+        if self.index is None:
+            self.flat_weights()
+        return self.index
+
+    def flat_weights(self):
+        weights = self.get_weights()
+        views = self.flat_views([np.shape(weight) for weight in weights], [np.asarray(weight).dtype for weight in weights])
+        for view, weight in zip(views, weights):
+            if view is not weight:
+                np.copyto(view, weight, casting='unsafe')
+        return self.flat
+
+    def set_flat_weights(self, flat):
+        index = self.layer_index()
+        if np.size(flat) != self.flat.size:
+            raise ValueError(f"Expected {self.flat.size} parameters, got {np.size(flat)}")
+        self.set_weights([np.reshape(flat[entry['offset']:entry['offset'] + entry['size']], entry['shape'])
+                          for entry in index])
+
+    def flat_views(self, shapes, dtypes):
+        # Per-layer views of the flat buffer, (re)allocated only when the layer shapes change.
+        shapes = [tuple(shape) for shape in shapes]
+        if self.index is None or [entry['shape'] for entry in self.index] != shapes:
+            index, offset = [], 0
+            for shape, dtype in zip(shapes, dtypes):
+                size = int(np.prod(shape, dtype=np.int64))
+                index.append({'shape': shape, 'dtype': np.dtype(dtype), 'offset': offset, 'size': size})
+                offset += size
+            self.index = index
+            self.flat = np.empty(offset, dtype=self.flat_dtype or np.result_type(np.float32, *dtypes))
+            self.views = [self.flat[entry['offset']:entry['offset'] + entry['size']].reshape(entry['shape'])
+                          for entry in index]
+        return self.views
+
+    def layer_weights(self):
+        # The flat buffer's views, converted only for layers whose own dtype differs from the buffer's.
+        return [view if view.dtype == entry['dtype'] else view.astype(entry['dtype'])
+                for view, entry in zip(self.views, self.index)]
@@ -1,28 +1,117 @@
+import sys
+import time
+import numpy as np
 import torch
 import torch.nn as nn
-from federated_learning_framework.models.abstract_model import AbstractModel
+from federated_learning_framework.models.abstract_model import AbstractModel, batch_indices, dataset_size
+
+def numpy_dtype(dtype):
+    try:
+        return torch.empty(0, dtype=dtype).numpy().dtype
+    except TypeError:
+        # e.g. bfloat16, which NumPy cannot represent; it is carried as float32.
+        return np.dtype(np.float32)
 
 class PyTorchModel(AbstractModel):
-    def __init__(self, model):
+    # Parameters are exchanged through the flat buffer with in-place copy_, so
+    # parameter tensors (and the optimizer's references to them) are never
+    # replaced, and CUDA-resident or non-contiguous parameters work as-is.
+    #
+    # train() runs mini-batch updates with one optimizer (SGD with `lr` unless
+    # given) and loss kept across rounds. Data is either arrays/tensors, split into
+    # `batch_size` batches, or any iterable of (inputs, targets) batches such as a
+    # DataLoader or a generator. `local_steps` fixes the optimizer steps per round
+    # instead of the epoch count, and gradients are accumulated over
+    # `accumulation_steps` batches per step.
+    def __init__(self, model, optimizer=None, loss=None, batch_size=32, lr=0.01, local_steps=None,
+                 accumulation_steps=1, shuffle=True, seed=None):
+        if accumulation_steps < 1:
+            raise ValueError(f"accumulation_steps must be >= 1, got {accumulation_steps}")
         self.model = model
+        self.tensor_views = None
+        self.optimizer = optimizer
+        self.loss = loss or nn.CrossEntropyLoss()
+        self.batch_size = batch_size
+        self.lr = lr
+        self.local_steps = local_steps
+        self.accumulation_steps = accumulation_steps
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+
+    def parameter_views(self):
+        params = list(self.model.parameters())
+        views = self.flat_views([param.shape for param in params], [numpy_dtype(param.dtype) for param in params])
+        if self.tensor_views is None or self.tensor_views[0] is not views:
+            self.tensor_views = (views, [torch.from_numpy(view) for view in views])
+        return params, self.tensor_views[1]
 
     def get_weights(self):
-        return [param.data.numpy() for param in self.model.parameters()]
+        params, tensors = self.parameter_views()
+        with torch.no_grad():
+            for param, tensor in zip(params, tensors):
+                tensor.copy_(param.detach())
+        return self.layer_weights()
 
     def set_weights(self, weights):
-        for param, weight in zip(self.model.parameters(), weights):
-            param.data = torch.tensor(weight, dtype=param.data.dtype)
-
-    def train(self, x_train, y_train, epochs=1):
-        criterion = nn.CrossEntropyLoss()
-        optimizer = torch.optim.SGD(self.model.parameters(), lr=0.01)
-        for _ in range(epochs):
-            optimizer.zero_grad()
-            outputs = self.model(x_train)
-            loss = criterion(outputs, y_train)
-            loss.backward()
-            optimizer.step()
+        params, tensors = self.parameter_views()
+        with torch.no_grad():
+            for param, tensor, view, weight in zip(params, tensors, self.views, weights):
+                # Staging through the (writable) flat buffer also keeps it in sync with the parameters.
+                if weight is not view:
+                    np.copyto(view, weight, casting='unsafe')
+                param.copy_(tensor)
+
+    def batches(self, x_train, y_train):
+        if y_train is None:
+            yield from x_train
+            return
+        for indices in batch_indices(len(x_train), self.batch_size, self.shuffle, self.rng):
+            if isinstance(x_train, torch.Tensor):
+                indices = torch.from_numpy(indices)
+            yield x_train[indices], y_train[indices]
+
+    def train(self, x_train, y_train=None, epochs=1):
+        if self.optimizer is None:
+            self.optimizer = torch.optim.SGD(self.model.parameters(), lr=self.lr)
+        device = next(self.model.parameters()).device
+        self.model.train()
+        self.optimizer.zero_grad()
+        started = time.perf_counter()
+        samples = steps = pending = first_pass = 0
+        # With local_steps, passes over the data repeat until that many steps ran.
+        for epoch in range(epochs if self.local_steps is None else sys.maxsize):
+            batches = 0
+            for inputs, targets in self.batches(x_train, y_train):
+                inputs = torch.as_tensor(inputs).to(device)
+                targets = torch.as_tensor(targets).to(device)
+                loss = self.loss(self.model(inputs), targets) / self.accumulation_steps
+                loss.backward()
+                batches += 1
+                pending += 1
+                samples += len(inputs)
+                if epoch == 0:
+                    first_pass += len(inputs)
+                if pending == self.accumulation_steps:
+                    self.optimizer.step()
+                    self.optimizer.zero_grad()
+                    steps += 1
+                    pending = 0
+                    if self.local_steps is not None and steps >= self.local_steps:
+                        break
+            if batches == 0 or (self.local_steps is not None and steps >= self.local_steps):
+                break
+        if pending:
+            self.optimizer.step()
+            self.optimizer.zero_grad()
+            steps += 1
+        # The update's weight is the local dataset size, not rows times epochs;
+        # an iterable without a sized .dataset reports the rows of one pass.
+        num_samples = dataset_size(x_train, y_train)
+        return self.record_training(samples, steps, time.perf_counter() - started,
+                                    first_pass if num_samples is None else num_samples)
 
     def predict(self, data):
+        self.model.eval()
+        device = next(self.model.parameters()).device
         with torch.no_grad():
-            return self.model(data).numpy()
+            return self.model(torch.as_tensor(data).to(device)).cpu().numpy()
@@ -1,18 +1,109 @@
+import math
+import time
+import numpy as np
 import tensorflow as tf
-from federated_learning_framework.models.abstract_model import AbstractModel
+from federated_learning_framework.models.abstract_model import AbstractModel, batch_indices, dataset_size
+
+class StepCounter(tf.keras.callbacks.Callback):
+    def __init__(self):
+        super().__init__()
+        self.steps = 0
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.steps += 1
+
+def record_batch_sizes(dataset, sizes):
+    # Takes an enumerated dataset and appends (position in its pass, row count)
+    # for every batch to `sizes` as the batch is handed out, dropping the
+    # position. Keras reads one batch past the last step it trains on, so only
+    # the first `steps` entries were trained on.
+    def record(position, batch):
+        size = tf.py_function(lambda position, rows: sizes.append((int(position), int(rows))) or rows,
+                              [position, tf.shape(tf.nest.flatten(batch)[0])[0]], tf.int32)
+        with tf.control_dependencies([size]):
+            return tf.nest.map_structure(tf.identity, batch)
+    return dataset.map(record)
+
+def first_pass_rows(sizes):
+    # Rows in the first pass over the data: positions restart at 0 with every pass.
+    rows = 0
+    for i, (position, size) in enumerate(sizes):
+        if i and position == 0:
+            break
+        rows += size
+    return rows
 
 class TensorFlowModel(AbstractModel):
-    def __init__(self, model):
+    # Weights are read into the flat buffer and written back with Variable.assign,
+    # so variables are updated in place instead of being rebuilt every round.
+    #
+    # train() feeds the compiled model from a tf.data pipeline: arrays (including
+    # memory-mapped ones) are read batch by batch through a generator, so they are
+    # never copied into the graph whole, and batches are prefetched while the
+    # previous step runs. A tf.data.Dataset of batches can be passed instead of
+    # arrays. The compiled optimizer persists across rounds; for gradient
+    # accumulation give the Keras optimizer gradient_accumulation_steps.
+    def __init__(self, model, batch_size=32, local_steps=None, shuffle=True, prefetch=tf.data.AUTOTUNE, seed=None):
         self.model = model
+        self.batch_size = batch_size
+        self.local_steps = local_steps
+        self.shuffle = shuffle
+        self.prefetch = prefetch
+        self.rng = np.random.default_rng(seed)
+
+    def variable_views(self):
+        variables = self.model.weights
+        dtypes = [np.dtype(getattr(variable.dtype, 'as_numpy_dtype', variable.dtype)) for variable in variables]
+        return variables, self.flat_views([tuple(variable.shape) for variable in variables], dtypes)
 
     def get_weights(self):
-        return self.model.get_weights()
+        variables, views = self.variable_views()
+        for variable, view in zip(variables, views):
+            np.copyto(view, variable.numpy(), casting='unsafe')
+        return self.layer_weights()
 
     def set_weights(self, weights):
-        self.model.set_weights(weights)
+        variables, views = self.variable_views()
+        for variable, view, weight, entry in zip(variables, views, weights, self.index):
+            if weight is not view:
+                np.copyto(view, weight, casting='unsafe')
+            variable.assign(view if view.dtype == entry['dtype'] else view.astype(entry['dtype']))
+
+    def dataset(self, x_train, y_train):
+        if y_train is None:
+            return x_train
+
+        def batches():
+            for indices in batch_indices(len(x_train), self.batch_size, self.shuffle, self.rng):
+                indices.sort()
+                yield x_train[indices], y_train[indices]
+
+        signature = tuple(tf.TensorSpec((None,) + tuple(array.shape[1:]), tf.as_dtype(array.dtype))
+                          for array in (x_train, y_train))
+        dataset = tf.data.Dataset.from_generator(batches, output_signature=signature)
+        return dataset.apply(tf.data.experimental.assert_cardinality(math.ceil(len(x_train) / self.batch_size)))
 
-    def train(self, x_train, y_train, epochs=1):
-        self.model.fit(x_train, y_train, epochs=epochs, verbose=0)
+    def train(self, x_train, y_train=None, epochs=1):
+        dataset = self.dataset(x_train, y_train).enumerate()
+        if self.local_steps is not None:
+            # A fixed number of steps per round, cycling through the data as needed.
+            dataset, epochs = dataset.repeat(), 1
+        counter, sizes = StepCounter(), []
+        started = time.perf_counter()
+        # Rows are counted after the prefetch, so batches read ahead but never
+        # trained on are not counted, and short or unevenly sized batches from a
+        # prebuilt dataset are counted as they are.
+        self.model.fit(record_batch_sizes(dataset.prefetch(self.prefetch), sizes), epochs=epochs,
+                       steps_per_epoch=self.local_steps, shuffle=False, callbacks=[counter], verbose=0)
+        elapsed = time.perf_counter() - started
+        trained = sizes[:counter.steps]
+        samples = sum(size for _, size in trained)
+        # The update's weight is the local dataset size, not rows times epochs;
+        # a prebuilt dataset reports the rows of one pass.
+        num_samples = dataset_size(x_train, y_train)
+        if num_samples is None:
+            num_samples = first_pass_rows(trained)
+        return self.record_training(samples, counter.steps, elapsed, num_samples)
 
     def predict(self, data):
         return self.model.predict(data)
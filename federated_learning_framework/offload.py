@@ -0,0 +1,27 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# CPU-bound work (decoding large messages, aggregating updates, encoding
+# broadcasts) runs on a thread pool instead of the event loop, so sockets and
+# small control messages keep being serviced while a big update is processed.
+# Workers share the server's memory: decoded arrays and aggregation results are
+# handed back by reference instead of being pickled across a process boundary.
+# NumPy releases the GIL for large array operations, which is where the
+# aggregation time goes. workers=0 runs everything inline on the event loop.
+class CPUPool:
+    def __init__(self, workers=None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        if self.workers < 0:
+            raise ValueError(f"workers must be >= 0, got {workers}")
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='federated-cpu') if self.workers else None
+
+    async def run(self, fn, *args, **kwargs):
+        if self.executor is None:
+            return fn(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
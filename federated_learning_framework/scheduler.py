@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import math
+import random
+import time
+
+class RoundScheduler:
+    # Drives synchronous training rounds on a CentralServer. Each round samples
+    # `fraction` of the connected clients, sends them the global model with the
+    # round id, and collects updates until `quorum` of the sampled clients
+    # reported (an int, or a fraction of them; all by default) or `round_timeout`
+    # seconds passed. Updates for an earlier round are dropped when
+    # `staleness_decay` is 0, otherwise their sample count is scaled by
+    # staleness_decay ** rounds_behind; each client gets at most one stale
+    # update into a round.
+    def __init__(self, server, fraction=1.0, min_clients=1, quorum=None, round_timeout=None,
+                 staleness_decay=0.0, seed=None):
+        if not 0 < fraction <= 1:
+            raise ValueError(f"fraction must be in (0, 1], got {fraction}")
+        self.server = server
+        self.fraction = fraction
+        self.min_clients = min_clients
+        self.quorum = quorum
+        self.round_timeout = round_timeout
+        self.staleness_decay = staleness_decay
+        self.random = random.Random(seed)
+        self.participants = set()
+        self.reported = set()
+        self.reported_stale = set()
+        self.closed = asyncio.Event()
+        self.stats = []
+        self.current = None
+        self.logger = logging.getLogger(__name__)
+        server.scheduler = self
+
+    def sample_clients(self):
+        clients = sorted(self.server.clients)
+        count = max(math.ceil(self.fraction * len(clients)), min(self.min_clients, len(clients)))
+        return self.random.sample(clients, count)
+
+    def quorum_size(self):
+        if self.quorum is None:
+            return max(len(self.participants), 1)
+        if isinstance(self.quorum, float):
+            return max(math.ceil(self.quorum * len(self.participants)), 1)
+        return min(self.quorum, max(len(self.participants), 1))
+
+    def update_weight(self, client_id, round_id):
+        # Sample-count multiplier for an update, or None to drop it.
+        if round_id is None or round_id == self.server.round_id:
+            if client_id not in self.participants or client_id in self.reported:
+                return None
+            self.reported.add(client_id)
+            self.current['slowest_client'] = time.perf_counter() - self.current['dispatched_at']
+            return 1.0
+        behind = self.server.round_id - round_id
+        self.current['stale'] += 1
+        if behind < 0 or not self.staleness_decay or client_id in self.reported_stale:
+            return None
+        self.reported_stale.add(client_id)
+        return self.staleness_decay ** behind
+
+    def update_rejected(self, client_id, round_id):
+        # An update update_weight counted that the aggregator then refused: the
+        # participant has not reported yet and may still send a valid one.
+        if round_id is None or round_id == self.server.round_id:
+            self.reported.discard(client_id)
+        else:
+            self.reported_stale.discard(client_id)
+
+    def round_closed(self, aggregation_time):
+        if self.current is not None:
+            self.current['aggregation'] = aggregation_time
+        self.closed.set()
+
+    def client_left(self, client_id):
+        # A participant whose session ended (disconnected or evicted) will not
+        # report, so it leaves the quorum. Returns whether the round can close
+        # with the updates it already has.
+        if client_id not in self.participants or client_id in self.reported:
+            return False
+        self.participants.discard(client_id)
+        if not self.participants:
+            # Nobody is left to report; the round ends without an update.
+            self.closed.set()
+            return False
+        return bool(self.reported) and len(self.reported) >= self.quorum_size()
+
+    async def wait_for_clients(self):
+        while len(self.server.clients) < self.min_clients:
+            await asyncio.sleep(0.1)
+
+    async def run_round(self):
+        await self.wait_for_clients()
+        server = self.server
+        round_id = server.round_id
+        self.participants = set(self.sample_clients())
+        self.reported = set()
+        self.reported_stale = set()
+        self.closed.clear()
+        self.current = {'round': round_id, 'participants': len(self.participants), 'stale': 0,
+                        'dispatch': None, 'slowest_client': None, 'aggregation': None}
+        started = time.perf_counter()
+        self.current['dispatched_at'] = started
+        message = {'weights': server.model_weights, 'round': round_id}
+        delivered = await server.connection.broadcast(sorted(self.participants), message, server.send_timeout)
+        self.participants &= set(delivered)
+        self.current['dispatch'] = time.perf_counter() - started
+        self.logger.info(f"Round {round_id}: dispatched to {len(self.participants)} clients in {self.current['dispatch']:.3f}s")
+        if not self.participants:
+            # No sampled client got the model, so no update can arrive; without a
+            # deadline the round would wait forever. It ends without an update.
+            self.closed.set()
+
+        try:
+            await asyncio.wait_for(self.closed.wait(), self.round_timeout)
+        except asyncio.TimeoutError:
+            self.logger.info(f"Round {round_id}: deadline reached with {len(self.reported)}/{len(self.participants)} updates")
+            await server.close_round()
+        if server.round_id == round_id:
+            # Nobody reported before the deadline; the global model stays as it was.
+            server.round_id += 1
+        stats = self.current
+        stats.pop('dispatched_at')
+        stats['updates'] = len(self.reported)
+        stats['total'] = time.perf_counter() - started
+        self.stats.append(stats)
+        server.metrics.observe('round_seconds', stats['total'])
+        server.metrics.observe('round_dispatch_seconds', stats['dispatch'])
+        server.metrics.event('round', **stats)
+        return stats
+
+    async def run(self, num_rounds=None, initial_weights=None):
+        if initial_weights is not None:
+            self.server.model_weights = initial_weights
+        if self.server.model_weights is None:
+            raise ValueError("RoundScheduler needs initial model weights to dispatch")
+        completed = 0
+        while num_rounds is None or completed < num_rounds:
+            stats = await self.run_round()
+            self.logger.info(f"Round {stats['round']}: {stats['updates']} updates, total {stats['total']:.3f}s")
+            completed += 1
+        return self.stats
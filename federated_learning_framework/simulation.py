@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import os
+import tempfile
+import numpy as np
+from federated_learning_framework.central_server import CentralServer
+from federated_learning_framework.client_device import ClientDevice
+from federated_learning_framework.encryption import encrypt_weights
+from federated_learning_framework.scheduler import RoundScheduler
+
+# Rows copied per block when a dataset is rewritten in partition order.
+COPY_BLOCK = 65536
+
+def iid_partition(num_samples, num_clients, seed=None):
+    rng = np.random.default_rng(seed)
+    return np.array_split(rng.permutation(num_samples), num_clients)
+
+def dirichlet_partition(labels, num_clients, alpha=0.5, seed=None):
+    # Non-IID split: every class is divided among the clients in Dirichlet(alpha)
+    # proportions, so a smaller alpha gives each client fewer dominant classes.
+    rng = np.random.default_rng(seed)
+    labels = np.asarray(labels)
+    if labels.ndim > 1:
+        labels = labels.argmax(axis=1)
+    parts = [[] for _ in range(num_clients)]
+    for label in np.unique(labels):
+        indices = rng.permutation(np.flatnonzero(labels == label))
+        cuts = (np.cumsum(rng.dirichlet(np.full(num_clients, alpha)))[:-1] * len(indices)).astype(np.int64)
+        for part, split in zip(parts, np.split(indices, cuts)):
+            part.append(split)
+    return [np.sort(np.concatenate(part)) for part in parts]
+
+def partition_views(x, y, partitions, path):
+    # Writes x and y once, in partition order, to memory-mapped .npy files so that
+    # every partition is a contiguous slice: clients get views that are paged in
+    # on demand instead of copies of their data.
+    order = np.concatenate(partitions)
+    views = []
+    for name, source in (('x', x), ('y', y)):
+        source = np.asarray(source) if not isinstance(source, np.memmap) else source
+        target = np.lib.format.open_memmap(f"{path}.{name}.npy", mode='w+', dtype=source.dtype,
+                                           shape=(len(order),) + source.shape[1:])
+        for start in range(0, len(order), COPY_BLOCK):
+            target[start:start + COPY_BLOCK] = source[order[start:start + COPY_BLOCK]]
+        target.flush()
+        del target
+        views.append(np.load(f"{path}.{name}.npy", mmap_mode='r'))
+    offsets = np.cumsum([0] + [len(partition) for partition in partitions])
+    return [(views[0][start:end], views[1][start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+
+class Simulation:
+    # Runs a CentralServer, a RoundScheduler and `num_clients` virtual
+    # ClientDevices in one process over the in-memory transport. All clients
+    # share one model: a client sets the global weights, trains on its partition
+    # and reads its weights back without yielding to the event loop, so clients
+    # never interleave on the model. Clients whose partition is empty are left out.
+    def __init__(self, model, x, y, num_clients, partition='iid', alpha=0.5, workdir=None, port=9000, context=None,
+                 fraction=1.0, quorum=None, round_timeout=None, seed=None, **server_options):
+        if partition == 'iid':
+            partitions = iid_partition(len(x), num_clients, seed)
+        elif partition == 'dirichlet':
+            partitions = dirichlet_partition(y, num_clients, alpha, seed)
+        else:
+            raise ValueError(f"Unknown partition {partition}")
+        self.workdir = workdir or tempfile.mkdtemp(prefix='federated-simulation-')
+        self.partitions = partition_views(x, y, partitions, os.path.join(self.workdir, 'dataset'))
+        self.model = model
+        self.context = context
+        self.uri = f"memory://localhost:{port}"
+        self.server = CentralServer(connection_type='memory', port=port, context=context, **server_options)
+        self.clients = [ClientDevice(client_id, model, context, connection_type='memory')
+                        for client_id, (x_part, _) in enumerate(self.partitions) if len(x_part)]
+        self.scheduler = RoundScheduler(self.server, fraction=fraction, min_clients=len(self.clients), quorum=quorum,
+                                        round_timeout=round_timeout, seed=seed)
+        self.logger = logging.getLogger(__name__)
+
+    async def run(self, num_rounds, initial_weights=None):
+        # Returns the scheduler's per-round stats (dispatch, slowest client, aggregation, total).
+        if initial_weights is None:
+            initial_weights = [np.array(weight) for weight in self.model.get_weights()]
+        if self.context is not None:
+            initial_weights = encrypt_weights(self.context, initial_weights)
+        server = asyncio.ensure_future(self.server.run_server())
+        await asyncio.sleep(0)
+        training = []
+        try:
+            for client in self.clients:
+                await client.connect_to_central_server(self.uri)
+                x_part, y_part = self.partitions[client.client_id]
+                training.append(asyncio.ensure_future(client.federated_learning(x_part, y_part)))
+            self.logger.info(f"Simulation: {len(self.clients)} clients connected")
+            return await self.scheduler.run(num_rounds, initial_weights)
+        finally:
+            for client in self.clients:
+                if client.connection is not None and client.connection.channel is not None:
+                    await client.connection.channel.close()
+            for task in training + [server]:
+                task.cancel()
+            await asyncio.gather(*training, server, return_exceptions=True)
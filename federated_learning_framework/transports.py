@@ -0,0 +1,420 @@
+import asyncio
+import json
+import mmap
+import os
+import socket
+import stat
+import struct
+import tempfile
+from urllib.parse import urlparse
+import websockets
+from websockets.exceptions import ConnectionClosed, ConnectionClosedError, ConnectionClosedOK
+
+# A transport opens connections for ConnectionServer / ConnectionClient and
+# hands Channel a socket with websocket-style methods: send(bytes or list of
+# buffers) delivers one message, recv() returns one, close() ends the
+# connection, and both raise websockets' ConnectionClosed once it is gone.
+#
+#   websocket  the websockets library; messages are capped in size, so large
+#              ones are chunked (and can resume after a reconnect)
+#   tcp        asyncio streams with 9-byte length-prefixed frames, large socket
+#              buffers and writelines; frames are received straight into the
+#              message buffer, and nothing is chunked
+#   shm        same-host only: frames over a Unix socket, with payloads of
+#              SHM_THRESHOLD bytes or more written once into a shared-memory
+#              segment that the receiver copies out of
+#   memory     in-process, for tests and simulations
+#
+# The client id travels in the handshake: an X-Client-Id header for websockets
+# and a HELLO frame for the stream transports.
+#
+# Frame headers and segment descriptors come from the peer. A frame longer than
+# the connection's max_message_size (MAX_FRAME_SIZE by default), or a control
+# frame longer than MAX_CONTROL_SIZE, closes the connection before anything is
+# allocated, and a segment is only read from a file this module could have
+# created (see SharedMemorySocket.read_segment).
+CLIENT_ID_HEADER = 'X-Client-Id'
+FRAME_HEADER = struct.Struct('!BQ')
+DATA, SEGMENT, RELEASE, HELLO = 0, 1, 2, 3
+SOCKET_BUFFER = 4 * 1024 * 1024
+SHM_THRESHOLD = 64 * 1024
+MAX_FRAME_SIZE = 1 << 30
+MAX_CONTROL_SIZE = 64 * 1024
+SEGMENT_PREFIX = 'federated-'
+# tmpfs where available, so segments live in memory.
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+# ConnectionServers started with connection_type='memory', by port.
+MEMORY_SERVERS = {}
+
+def unix_socket_path(port):
+    return os.path.join(tempfile.gettempdir(), f"federated-shm-{port}.sock")
+
+def as_buffers(data):
+    return [data] if isinstance(data, (bytes, bytearray, memoryview)) else list(data)
+
+class MemorySocket:
+    # One end of an in-process connection (connection_type='memory'). It has the
+    # websocket methods Channel uses and hands each message to the peer's queue
+    # as a single bytes object, so a broadcast payload is shared by every receiver.
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.peer = None
+        self.closed = False
+        self.client_id = None
+
+    @classmethod
+    def pair(cls):
+        first, second = cls(), cls()
+        first.peer, second.peer = second, first
+        return first, second
+
+    async def send(self, data):
+        if self.closed:
+            raise ConnectionClosedOK(None, None)
+        if not isinstance(data, (bytes, bytearray)):
+            data = b''.join(data)
+        self.peer.queue.put_nowait(data)
+
+    async def recv(self):
+        data = await self.queue.get()
+        if data is None:
+            self.queue.put_nowait(None)
+            raise ConnectionClosedOK(None, None)
+        return data
+
+    async def close(self):
+        if not self.closed:
+            self.closed = self.peer.closed = True
+            self.queue.put_nowait(None)
+            self.peer.queue.put_nowait(None)
+
+class FrameProtocol(asyncio.BufferedProtocol):
+    # Reads (kind, length) headers and then the body directly into a buffer of
+    # that length, so a message is never copied between receive buffers.
+    def __init__(self, on_connect=None, max_frame_size=MAX_FRAME_SIZE):
+        self.on_connect = on_connect
+        self.max_frame_size = max_frame_size
+        self.transport = None
+        self.frames = asyncio.Queue()
+        self.header = bytearray(FRAME_HEADER.size)
+        self.target = self.header
+        self.filled = 0
+        self.kind = None
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.closed = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+            if sock.family in (socket.AF_INET, socket.AF_INET6):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        transport.set_write_buffer_limits(high=SOCKET_BUFFER)
+        if self.on_connect is not None:
+            asyncio.ensure_future(self.on_connect(self))
+
+    def get_buffer(self, sizehint):
+        return memoryview(self.target)[self.filled:]
+
+    def buffer_updated(self, nbytes):
+        self.filled += nbytes
+        if self.filled < len(self.target):
+            return
+        if self.target is self.header:
+            self.kind, length = FRAME_HEADER.unpack(self.header)
+            limit = self.max_frame_size if self.kind == DATA else MAX_CONTROL_SIZE
+            if length > limit:
+                self.abort(ValueError(f"frame of {length} bytes exceeds the {limit}-byte limit"))
+                return
+            self.target, self.filled = bytearray(length), 0
+            if length:
+                return
+        self.frames.put_nowait((self.kind, self.target))
+        self.target, self.filled = self.header, 0
+
+    def abort(self, error):
+        self.filled = 0
+        self.closed = ConnectionClosedError(None, None)
+        self.closed.__cause__ = error
+        self.transport.close()
+
+    def pause_writing(self):
+        self.writable.clear()
+
+    def resume_writing(self):
+        self.writable.set()
+
+    def connection_lost(self, exc):
+        if self.closed is None:
+            self.closed = ConnectionClosedOK(None, None) if exc is None else ConnectionClosedError(None, None)
+            if exc is not None:
+                self.closed.__cause__ = exc
+        self.frames.put_nowait(None)
+        self.writable.set()
+
+class StreamSocket:
+    def __init__(self, protocol, max_message_size=MAX_FRAME_SIZE):
+        self.protocol = protocol
+        self.max_message_size = max_message_size
+        self.client_id = None
+
+    async def send(self, data, kind=DATA):
+        if self.protocol.closed is not None:
+            raise self.protocol.closed
+        buffers = as_buffers(data)
+        nbytes = sum(memoryview(buffer).nbytes for buffer in buffers)
+        self.protocol.transport.writelines([FRAME_HEADER.pack(kind, nbytes), *buffers])
+        await self.protocol.writable.wait()
+        if self.protocol.closed is not None:
+            raise self.protocol.closed
+
+    async def next_frame(self):
+        frame = await self.protocol.frames.get()
+        if frame is None:
+            self.protocol.frames.put_nowait(None)
+            raise self.protocol.closed
+        return frame
+
+    async def recv(self):
+        return (await self.next_frame())[1]
+
+    async def close(self):
+        if self.protocol.transport is not None:
+            self.protocol.transport.close()
+
+class SharedMemorySocket(StreamSocket):
+    # Large payloads go through a shared-memory segment owned by the sender: it
+    # writes the message in (one copy), sends the segment's path and size, and
+    # waits for the receiver to RELEASE it after copying it out. The segment is
+    # reused for later messages and only grows; its file is unlinked once the
+    # receiver has opened it, so nothing is left behind in SHM_DIR.
+    def __init__(self, protocol, max_message_size=MAX_FRAME_SIZE):
+        super().__init__(protocol, max_message_size)
+        self.lock = asyncio.Lock()
+        self.released = asyncio.Event()
+        self.segment = None
+        self.segment_path = None
+        self.segment_fd = None
+
+    def ensure_segment(self, nbytes):
+        if self.segment is not None and self.segment['size'] >= nbytes:
+            return self.segment
+        size = max(nbytes, 2 * self.segment['size'] if self.segment else nbytes)
+        self.close_segment()
+        path = os.path.join(SHM_DIR, f"{SEGMENT_PREFIX}{os.getpid()}-{os.urandom(6).hex()}")
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o600)
+        try:
+            os.ftruncate(fd, size)
+            mapped = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.segment = {'path': path, 'size': size, 'mmap': mapped, 'linked': True}
+        return self.segment
+
+    def close_segment(self):
+        if self.segment is not None:
+            if self.segment['linked']:
+                os.unlink(self.segment['path'])
+            self.segment['mmap'].close()
+            self.segment = None
+
+    async def send(self, data, kind=DATA):
+        buffers = as_buffers(data)
+        nbytes = sum(memoryview(buffer).nbytes for buffer in buffers)
+        if kind != DATA or nbytes < SHM_THRESHOLD:
+            return await super().send(buffers, kind)
+        async with self.lock:
+            segment = self.ensure_segment(nbytes)
+            offset = 0
+            for buffer in buffers:
+                view = memoryview(buffer).cast('B')
+                segment['mmap'][offset:offset + view.nbytes] = view
+                offset += view.nbytes
+            self.released.clear()
+            await super().send(json.dumps({'path': segment['path'], 'nbytes': nbytes}).encode(), SEGMENT)
+            await self.released.wait()
+            if self.protocol.closed is not None:
+                raise self.protocol.closed
+            if segment['linked']:
+                os.unlink(segment['path'])
+                segment['linked'] = False
+
+    async def recv(self):
+        while True:
+            kind, body = await self.next_frame()
+            if kind == RELEASE:
+                self.released.set()
+            elif kind == SEGMENT:
+                descriptor = json.loads(body)
+                data = self.read_segment(descriptor['path'], descriptor['nbytes'])
+                self.protocol.transport.write(FRAME_HEADER.pack(RELEASE, 0))
+                return data
+            else:
+                return body
+
+    def open_segment(self, path):
+        # Only segment files in SHM_DIR, opened without following links, so a
+        # peer cannot point the receiver at any other file it can read.
+        if not isinstance(path, str):
+            raise ValueError("segment path must be a string")
+        resolved = os.path.realpath(path)
+        if (os.path.dirname(resolved) != os.path.realpath(SHM_DIR)
+                or not os.path.basename(resolved).startswith(SEGMENT_PREFIX)):
+            raise ValueError(f"segment {path!r} is not a shared-memory segment")
+        fd = os.open(resolved, os.O_RDONLY | os.O_NOFOLLOW)
+        if not stat.S_ISREG(os.fstat(fd).st_mode):
+            os.close(fd)
+            raise ValueError(f"segment {path!r} is not a regular file")
+        return fd
+
+    def read_segment(self, path, nbytes):
+        # The segment is read through its descriptor rather than mapped, so a
+        # sender that truncates it causes a short read, not a SIGBUS.
+        if not isinstance(nbytes, int) or not 0 <= nbytes <= self.max_message_size:
+            raise ValueError(f"segment size {nbytes!r} exceeds the {self.max_message_size}-byte limit")
+        if path != self.segment_path:
+            fd = self.open_segment(path)
+            self.close_segment_file()
+            self.segment_path, self.segment_fd = path, fd
+        if nbytes > os.fstat(self.segment_fd).st_size:
+            raise ValueError(f"segment {path!r} is smaller than {nbytes} bytes")
+        data = bytearray(nbytes)
+        if os.preadv(self.segment_fd, [data], 0) != nbytes:
+            raise ValueError(f"segment {path!r} was truncated while reading")
+        return data
+
+    def close_segment_file(self):
+        if self.segment_fd is not None:
+            os.close(self.segment_fd)
+            self.segment_path = self.segment_fd = None
+
+    async def close(self):
+        await super().close()
+        # Unblocks a sender waiting for a release that will not come.
+        self.released.set()
+        self.close_segment()
+        self.close_segment_file()
+
+class WebsocketTransport:
+    name = 'websocket'
+    chunked = True
+
+    async def serve(self, server):
+        async with websockets.serve(server.handle_client, server.host, server.port):
+            await asyncio.Future()  # Run forever
+
+    async def connect(self, uri, client_id=None, max_message_size=MAX_FRAME_SIZE):
+        # websockets caps each message itself; Channel bounds chunked transfers.
+        headers = {} if client_id is None else {CLIENT_ID_HEADER: json.dumps(client_id)}
+        return await websockets.connect(uri, additional_headers=headers)
+
+class MemoryTransport:
+    name = 'memory'
+    # In-process connections hand over whole messages, so nothing is chunked.
+    chunked = False
+
+    async def serve(self, server):
+        MEMORY_SERVERS[server.port] = server
+        try:
+            await asyncio.Future()
+        finally:
+            MEMORY_SERVERS.pop(server.port, None)
+
+    async def connect(self, uri, client_id=None, max_message_size=MAX_FRAME_SIZE):
+        server = MEMORY_SERVERS.get(urlparse(uri).port)
+        if server is None:
+            raise ConnectionRefusedError(f"no in-memory server at {uri}")
+        client_end, server_end = MemorySocket.pair()
+        server.accept(server_end, client_id)
+        return client_end
+
+class TcpTransport:
+    name = 'tcp'
+    chunked = False
+    socket_class = StreamSocket
+
+    def protocol_factory(self, server):
+        async def on_connect(protocol):
+            sock = self.socket_class(protocol, server.max_message_size)
+            try:
+                kind, body = await sock.next_frame()
+                if kind != HELLO:
+                    raise ConnectionClosedError(None, None)
+                sock.client_id = json.loads(body)
+                await server.handle_client(sock)
+            except ConnectionClosed:
+                pass
+            finally:
+                await sock.close()
+
+        return lambda: FrameProtocol(on_connect, server.max_message_size)
+
+    async def create_server(self, server):
+        return await asyncio.get_running_loop().create_server(self.protocol_factory(server), server.host, server.port,
+                                                              reuse_address=True)
+
+    async def serve(self, server):
+        listener = await self.create_server(server)
+        try:
+            await asyncio.Future()
+        finally:
+            listener.close()
+
+    async def open_connection(self, uri, max_message_size=MAX_FRAME_SIZE):
+        parsed = urlparse(uri)
+        _, protocol = await asyncio.get_running_loop().create_connection(
+            lambda: FrameProtocol(max_frame_size=max_message_size), parsed.hostname, parsed.port)
+        return protocol
+
+    async def connect(self, uri, client_id=None, max_message_size=MAX_FRAME_SIZE):
+        sock = self.socket_class(await self.open_connection(uri, max_message_size), max_message_size)
+        await sock.send(json.dumps(client_id).encode(), HELLO)
+        return sock
+
+class SharedMemoryTransport(TcpTransport):
+    # `host` is ignored: the Unix socket is named after the port (see unix_socket_path).
+    name = 'shm'
+    socket_class = SharedMemorySocket
+
+    async def create_server(self, server):
+        path = unix_socket_path(server.port)
+        if os.path.lexists(path):
+            os.unlink(path)
+        # Only this user may connect: on Linux the socket file takes the mode of
+        # the socket it is bound from, so there is no window with looser permissions.
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            os.fchmod(listener.fileno(), 0o600)
+            listener.bind(path)
+            os.chmod(path, 0o600)
+        except OSError:
+            listener.close()
+            raise
+        return await asyncio.get_running_loop().create_unix_server(self.protocol_factory(server), sock=listener)
+
+    async def serve(self, server):
+        try:
+            await super().serve(server)
+        finally:
+            path = unix_socket_path(server.port)
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def open_connection(self, uri, max_message_size=MAX_FRAME_SIZE):
+        path = unix_socket_path(urlparse(uri).port)
+        _, protocol = await asyncio.get_running_loop().create_unix_connection(
+            lambda: FrameProtocol(max_frame_size=max_message_size), path)
+        return protocol
+
+TRANSPORTS = {'websocket': WebsocketTransport, 'tcp': TcpTransport, 'shm': SharedMemoryTransport,
+              'memory': MemoryTransport}
+
+def get_transport(transport):
+    if isinstance(transport, str):
+        if transport not in TRANSPORTS:
+            raise NotImplementedError(f"Connection type {transport} not supported")
+        return TRANSPORTS[transport]()
+    return transport
@@ -0,0 +1,124 @@
+import numpy as np
+from federated_learning_framework.aggregation import BLOCK_SIZE
+from federated_learning_framework.encryption import is_encrypted
+
+def manifest(weights):
+    # The (shape, dtype) of every layer, as checked against the global model.
+    return [(np.shape(layer), np.asarray(layer).dtype) for layer in weights]
+
+def enumerate_blocks(flat, block_size):
+    for start in range(0, flat.size, block_size):
+        yield start, flat[start:start + block_size]
+
+class UpdateValidator:
+    # Checks a plaintext client update before it reaches the aggregator:
+    # - its layers match the global model's manifest: layer count, shapes, and
+    #   dtypes that cast to the model's without changing kind (float64 into a
+    #   float32 model is fine, floats into an integer layer are not),
+    # - every value is finite,
+    # - with `max_norm`, the L2 norm of the update (weights minus the global
+    #   model) is at most max_norm; larger updates are scaled down to it.
+    # Layers are scanned in `block_size` slices, so the only temporaries are one
+    # float64 block, whatever the model size. Raises ValueError for an update
+    # that must be rejected; otherwise returns the weights to aggregate and the
+    # update's norm (None when it was not measured). Holds no per-update state,
+    # so updates can be validated concurrently on the CPU pool.
+    #
+    # Encrypted updates (see encryption.encrypt_weights) cannot be scanned, so
+    # only their structure is checked: a manifest of layer shapes and numeric
+    # dtypes matching the global model, and a list of serialized ciphertexts.
+    def __init__(self, max_norm=None, check_finite=True, block_size=BLOCK_SIZE):
+        if max_norm is not None and max_norm <= 0:
+            raise ValueError(f"max_norm must be positive, got {max_norm}")
+        self.max_norm = max_norm
+        self.check_finite = check_finite
+        self.block_size = block_size
+
+    def check_manifest(self, weights, reference):
+        if not isinstance(weights, (list, tuple)):
+            raise ValueError(f"Expected a list of layers, got {type(weights).__name__}")
+        layers = [np.asarray(layer) for layer in weights]
+        for i, layer in enumerate(layers):
+            if layer.dtype.kind not in 'fiu':
+                raise ValueError(f"Layer {i} has non-numeric dtype {layer.dtype}")
+        if reference is None:
+            return layers
+        if len(layers) != len(reference):
+            raise ValueError(f"Expected {len(reference)} layers, got {len(layers)}")
+        for i, (layer, (shape, dtype)) in enumerate(zip(layers, manifest(reference))):
+            if layer.shape != shape:
+                raise ValueError(f"Layer {i} shape mismatch: expected {shape}, got {layer.shape}")
+            if not np.can_cast(layer.dtype, dtype, 'same_kind'):
+                raise ValueError(f"Layer {i} dtype mismatch: expected {dtype}, got {layer.dtype}")
+        return layers
+
+    def check_encrypted(self, weights, reference):
+        manifest, chunks = weights.get('manifest'), weights.get('chunks')
+        if not isinstance(manifest, list) or not manifest:
+            raise ValueError("Encrypted update has no layer manifest")
+        for i, entry in enumerate(manifest):
+            shape = entry.get('shape') if isinstance(entry, dict) else None
+            if not isinstance(shape, list) or not all(isinstance(n, int) and n >= 0 for n in shape):
+                raise ValueError(f"Encrypted layer {i} has an invalid shape {shape!r}")
+            try:
+                dtype = np.dtype(entry['dtype']) if isinstance(entry.get('dtype'), str) else None
+            except TypeError:
+                dtype = None
+            if dtype is None or dtype.kind not in 'fiu':
+                raise ValueError(f"Encrypted layer {i} has an invalid dtype {entry.get('dtype')!r}")
+        if not isinstance(chunks, list) or not chunks or \
+                not all(isinstance(chunk, (bytes, bytearray, memoryview)) and len(chunk) for chunk in chunks):
+            raise ValueError("Encrypted update chunks must be a non-empty list of serialized ciphertexts")
+        if reference is not None:
+            expected = ([entry['shape'] for entry in reference['manifest']] if is_encrypted(reference)
+                        else [list(np.shape(layer)) for layer in reference])
+            shapes = [entry['shape'] for entry in manifest]
+            if shapes != expected:
+                raise ValueError(f"Encrypted layer shapes {shapes} do not match the model's {expected}")
+        return weights
+
+    def scan(self, layers, reference):
+        # One pass over every layer: the finite check and the squared L2 distance
+        # to the reference, both accumulated block by block.
+        squared = 0.0
+        measure = self.max_norm is not None and reference is not None
+        for i, layer in enumerate(layers):
+            flat = layer.reshape(-1)
+            base = np.asarray(reference[i]).reshape(-1) if measure else None
+            for start, block in enumerate_blocks(flat, self.block_size):
+                if self.check_finite and block.dtype.kind == 'f' and not np.isfinite(block).all():
+                    raise ValueError(f"Layer {i} contains NaN or infinite values")
+                if measure:
+                    delta = np.subtract(block, base[start:start + len(block)], dtype=np.float64)
+                    squared += float(np.dot(delta, delta))
+        return np.sqrt(squared) if measure else None
+
+    def validate(self, weights, reference=None, partial=False):
+        # `reference` is the current global model (None before the first round,
+        # when only the values are checked). Partial sums from edge aggregators
+        # are not client updates, so their norms are not limited.
+        if is_encrypted(weights):
+            return self.check_encrypted(weights, reference), None
+        if is_encrypted(reference):
+            raise ValueError("Expected an encrypted update for the encrypted global model")
+        layers = self.check_manifest(weights, reference)
+        norm = self.scan(layers, None if partial else reference)
+        if norm is None or norm <= self.max_norm:
+            return weights, norm
+        return self.clip(layers, reference, self.max_norm / norm), norm
+
+    def clip(self, layers, reference, scale):
+        # reference + scale * (layer - reference), into new arrays: incoming
+        # layers are usually read-only views of the received message.
+        clipped = []
+        for layer, base in zip(layers, reference):
+            out = np.empty(layer.shape, dtype=layer.dtype)
+            flat, base = out.reshape(-1), np.asarray(base).reshape(-1)
+            for start, block in enumerate_blocks(layer.reshape(-1), self.block_size):
+                stop = start + len(block)
+                delta = np.subtract(block, base[start:stop], dtype=np.float64)
+                delta *= scale
+                delta += base[start:stop]
+                flat[start:stop] = delta
+            clipped.append(out)
+        return clipped
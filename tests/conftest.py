@@ -0,0 +1,11 @@
+import importlib
+
+# TensorFlow, TenSEAL and PyTorch bundle native libraries that crash the
+# process when TensorFlow is loaded first (TenSEAL serialization, and torch's
+# lazy import of its compiler stack on the first optimizer). Test modules are
+# collected in alphabetical order, so these are loaded before any of them.
+for name in ('tenseal', 'torch', 'torch._dynamo'):
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        pass
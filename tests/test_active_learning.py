@@ -1,6 +1,6 @@
 import numpy as np
 import tensorflow as tf
-from federated_learning_framework.active_learning import query_active_learning
+from federated_learning_framework.active_learning import STRATEGIES, TopK, diverse_subset, query_active_learning
 
 def test_active_learning():
     model = tf.keras.Sequential([
@@ -10,3 +10,70 @@ def test_active_learning():
     unlabeled_data = np.random.rand(100, 3072)
     selected_indices = query_active_learning(model, unlabeled_data, 5)
     assert len(selected_indices) == 5
+
+class TableModel:
+    # "Predicts" row i of a fixed probability table for sample i, counting calls.
+    def __init__(self, probabilities):
+        self.probabilities = probabilities
+        self.batch_sizes = []
+
+    def predict(self, data):
+        self.batch_sizes.append(len(data))
+        return self.probabilities[np.asarray(data, dtype=np.int64).ravel()]
+
+def test_streaming_matches_full_sort():
+    rng = np.random.default_rng(0)
+    probabilities = rng.dirichlet(np.ones(4), size=1000)
+    pool = np.arange(1000)[:, None]
+    for strategy in STRATEGIES:
+        model = TableModel(probabilities)
+        selected = query_active_learning(model, pool, 7, strategy=strategy, batch_size=64)
+        expected = np.argsort(-STRATEGIES[strategy](probabilities), kind='stable')[:7]
+        assert list(selected) == list(expected)
+        assert max(model.batch_sizes) == 64
+
+def test_least_confidence_matches_original_selection():
+    probabilities = np.random.default_rng(1).dirichlet(np.ones(3), size=200)
+    selected = query_active_learning(TableModel(probabilities), np.arange(200)[:, None], 5)
+    assert set(selected) == set(np.argsort(probabilities.max(axis=1))[:5])
+
+def test_memmap_and_batch_iterable(tmp_path):
+    probabilities = np.random.default_rng(2).dirichlet(np.ones(5), size=500)
+    pool = np.lib.format.open_memmap(str(tmp_path / 'pool.npy'), mode='w+', dtype=np.int64, shape=(500, 1))
+    pool[:, 0] = np.arange(500)
+    from_memmap = query_active_learning(TableModel(probabilities), pool, 10, strategy='entropy', batch_size=100)
+    batches = (np.arange(start, start + 50)[:, None] for start in range(0, 500, 50))
+    from_iterable = query_active_learning(TableModel(probabilities), batches, 10, strategy='entropy')
+    assert list(from_memmap) == list(from_iterable)
+
+def test_diversity_skips_duplicates():
+    # Two groups of identical, equally uncertain predictions: a diverse query takes one of each.
+    probabilities = np.array([[0.5, 0.5]] * 5 + [[0.45, 0.55]] * 5 + [[0.99, 0.01]] * 10)
+    pool = np.arange(20)[:, None]
+    assert set(query_active_learning(TableModel(probabilities), pool, 2)) <= set(range(5))
+    diverse = query_active_learning(TableModel(probabilities), pool, 2, diversity=5)
+    assert len(set(diverse) & set(range(5))) == 1 and len(set(diverse) & set(range(5, 10))) == 1
+
+def test_topk_merge():
+    top = TopK(3)
+    top.push([0.1, 0.9, 0.5], [0, 1, 2])
+    top.push([0.7, 0.2], [10, 11])
+    indices, scores = top.result()
+    assert list(indices) == [1, 10, 2]
+    assert np.allclose(scores, [0.9, 0.7, 0.5])
+
+def test_topk_with_k_zero_keeps_nothing():
+    top = TopK(0)
+    top.push([0.1, 0.9], [0, 1], np.eye(2))
+    indices, scores, features = top.result()
+    assert len(indices) == 0 and len(scores) == 0 and features.shape == (0, 2)
+
+def test_empty_pool_and_zero_samples():
+    probabilities = np.random.default_rng(3).dirichlet(np.ones(3), size=20)
+    empty = np.empty((0, 1), dtype=np.int64)
+    for diversity in (None, 3):
+        assert len(query_active_learning(TableModel(probabilities), empty, 5, diversity=diversity)) == 0
+        assert len(query_active_learning(TableModel(probabilities), iter([]), 5, diversity=diversity)) == 0
+        pool = np.arange(20)[:, None]
+        assert len(query_active_learning(TableModel(probabilities), pool, 0, diversity=diversity)) == 0
+    assert len(diverse_subset(np.empty((0, 3)), np.empty(0), 4)) == 0
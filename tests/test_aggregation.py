@@ -0,0 +1,150 @@
+import numpy as np
+import pytest
+from federated_learning_framework.aggregation import (WeightedAggregator, EncryptedAggregator, MedianAggregator,
+                                                      TrimmedMeanAggregator, get_aggregator)
+from federated_learning_framework.central_server import CentralServer
+from federated_learning_framework.encryption import create_context, encrypt_weights, decrypt_weights, public_context
+from federated_learning_framework.validation import UpdateValidator
+
+def test_weighted_aggregator():
+    aggregator = WeightedAggregator()
+    first = [np.ones((3, 2), dtype=np.float32), np.zeros(2, dtype=np.float32)]
+    second = [np.full((3, 2), 4, dtype=np.float32), np.full(2, 2, dtype=np.float32)]
+    aggregator.add(first, num_samples=1)
+    aggregator.add(second, num_samples=3)
+    result = aggregator.result()
+    assert np.allclose(result[0], 3.25)
+    assert np.allclose(result[1], 1.5)
+    assert result[0].dtype == np.float32
+
+    accumulators = aggregator.accumulators
+    aggregator.reset()
+    assert aggregator.result() is None
+    aggregator.add(first, num_samples=2)
+    assert aggregator.accumulators is accumulators
+    assert np.allclose(aggregator.result()[0], 1.0)
+
+def test_weighted_aggregator_shape_mismatch():
+    aggregator = WeightedAggregator(np.float32)
+    aggregator.add([np.ones(3)])
+    with pytest.raises(ValueError):
+        aggregator.add([np.ones(4)])
+
+@pytest.mark.asyncio
+async def test_round_closes_at_quorum():
+    server = CentralServer(context=create_context('fast'), quorum=2)
+    server.clients.update({1, 2, 3})
+    await server.receive_update(1, {'weights': [np.zeros(4)], 'num_samples': 1})
+    assert server.round_id == 0
+    await server.receive_update(2, {'weights': [np.ones(4)], 'num_samples': 3})
+    assert server.round_id == 1
+    assert np.allclose(server.model_weights[0], 0.75)
+
+def test_encrypted_aggregator():
+    context = create_context('fast')
+    server_context = public_context(context)
+    assert not server_context.has_secret_key()
+    aggregator = EncryptedAggregator(server_context)
+    aggregator.add(encrypt_weights(context, [np.full(4, 1.0), np.full(2, -1.0)]), num_samples=1)
+    aggregator.add(encrypt_weights(context, [np.full(4, 5.0), np.full(2, 3.0)]), num_samples=3)
+    result = decrypt_weights(context, aggregator.result())
+    assert np.allclose(result[0], 4.0, atol=1e-3)
+    assert np.allclose(result[1], 2.0, atol=1e-3)
+
+def test_encrypted_update_rejected_part_way_leaves_the_round_unchanged():
+    context = create_context('fast')
+    aggregator = EncryptedAggregator(public_context(context))
+    # 5000 values span two ciphertext chunks at this profile's 4096 slots.
+    aggregator.add(encrypt_weights(context, [np.full(5000, 1.0)]), 1)
+    update = encrypt_weights(context, [np.full(5000, 9.0)])
+    with pytest.raises(ValueError):
+        aggregator.add({'manifest': update['manifest'], 'chunks': update['chunks'][:1] + [b'garbage']}, 1)
+    with pytest.raises(ValueError, match='chunks'):
+        aggregator.add({'manifest': update['manifest'], 'chunks': update['chunks'][:1]}, 1)
+    short = encrypt_weights(context, [np.full(5000 - 4096, 9.0)])['chunks']
+    with pytest.raises(ValueError, match='holds'):
+        aggregator.add({'manifest': update['manifest'], 'chunks': short + short}, 1)
+    assert aggregator.num_updates == 1
+    aggregator.add(encrypt_weights(context, [np.full(5000, 3.0)]), 1)
+    assert np.allclose(decrypt_weights(context, aggregator.result())[0], 2.0, atol=1e-3)
+
+def make_updates(num_clients, byzantine, seed=0):
+    rng = np.random.default_rng(seed)
+    honest = [[rng.normal(1.0, 0.1, (20, 5)).astype(np.float32), rng.normal(-1.0, 0.1, 3).astype(np.float32)]
+              for _ in range(num_clients - byzantine)]
+    attack = [[np.full((20, 5), 1e4, dtype=np.float32), np.full(3, -1e4, dtype=np.float32)] for _ in range(byzantine)]
+    return attack + honest
+
+@pytest.mark.parametrize('name, options', [('median', {}), ('trimmed_mean', {'trim': 0.25}),
+                                           ('krum', {'byzantine': 2, 'select': 3})])
+def test_robust_aggregators_resist_outliers(name, options):
+    updates = make_updates(10, 2)
+    vectorized = get_aggregator(name, block_size=None, **options)
+    # 7 columns per block with 10 rows, and blocks spread over threads.
+    chunked = get_aggregator(name, block_size=70, workers=3, **options)
+    for update in updates:
+        vectorized.add(update, num_samples=5)
+        chunked.add(update, num_samples=5)
+    result = vectorized.result()
+    assert all(np.allclose(a, b) for a, b in zip(result, chunked.result()))
+    assert np.allclose(result[0], 1.0, atol=0.2) and np.allclose(result[1], -1.0, atol=0.2)
+    assert result[0].dtype == np.float32 and result[0].shape == (20, 5)
+    assert vectorized.total_samples == 50
+    if name == 'krum':
+        assert not set(vectorized.selected) & {0, 1}
+
+def test_robust_aggregator_matches_numpy_and_reuses_rows():
+    updates = [[np.random.rand(4, 3)] for _ in range(11)]
+    matrix = np.stack([update[0] for update in updates])
+    aggregator = TrimmedMeanAggregator(trim=0.2)
+    for update in updates:
+        aggregator.add(update)
+    expected = np.sort(matrix, axis=0)[2:9].mean(axis=0)
+    assert np.allclose(aggregator.result()[0], expected)
+    rows = aggregator.rows
+    aggregator.reset()
+    for update in updates[:3]:
+        aggregator.add(update)
+    assert aggregator.rows is rows
+    assert MedianAggregator().result() is None
+    with pytest.raises(ValueError):
+        aggregator.add([np.ones(5)])
+    with pytest.raises(ValueError):
+        aggregator.add_partial([np.ones((4, 3))], 1)
+
+def test_robust_rows_are_reserved_once_as_float32():
+    aggregator = MedianAggregator()
+    aggregator.reserve(5)
+    aggregator.add([np.random.rand(4, 3)])
+    rows = aggregator.rows
+    assert rows.shape == (5, 12) and rows.dtype == np.float32
+    for _ in range(4):
+        aggregator.add([np.random.rand(4, 3)])
+    assert aggregator.rows is rows
+    # An update beyond the reservation grows the matrix by half.
+    aggregator.add([np.random.rand(4, 3)])
+    assert aggregator.rows.shape == (7, 12)
+    assert MedianAggregator(dtype=np.float64).dtype == np.float64
+
+@pytest.mark.asyncio
+async def test_server_reserves_robust_rows_for_the_quorum():
+    server = CentralServer(context=create_context('fast'), quorum=3, aggregation='krum')
+    server.clients.update({1, 2, 3})
+    await server.receive_update(1, {'weights': [np.ones(4, dtype=np.float32)]})
+    assert server.aggregator.rows.shape == (3, 4)
+
+@pytest.mark.asyncio
+async def test_server_rejects_invalid_updates_and_aggregates_robustly():
+    server = CentralServer(context=create_context('fast'), quorum=4, aggregation='median',
+                           validator=UpdateValidator(max_norm=10.0))
+    server.clients.update({1, 2, 3, 4, 5, 6})
+    server.model_weights = [np.zeros(4, dtype=np.float32)]
+    await server.receive_update(1, {'weights': [np.full(4, np.nan, dtype=np.float32)]})
+    await server.receive_update(2, {'weights': [np.zeros(5, dtype=np.float32)]})
+    assert server.metrics.get('rejected_updates_total') == 2
+    await server.receive_update(3, {'weights': [np.full(4, 1e6, dtype=np.float32)]})
+    assert server.metrics.get('clipped_updates_total') == 1
+    for client_id in (4, 5, 6):
+        await server.receive_update(client_id, {'weights': [np.full(4, 0.5, dtype=np.float32)]})
+    assert server.round_id == 1
+    assert np.allclose(server.model_weights[0], 0.5)
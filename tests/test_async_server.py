@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from federated_learning_framework.async_server import AsyncCentralServer
+from federated_learning_framework.encryption import create_context
+
+def make_server(**kwargs):
+    return AsyncCentralServer(context=create_context('fast'), initial_weights=[np.zeros(3, dtype=np.float32)], **kwargs)
+
+@pytest.mark.asyncio
+async def test_buffered_updates_are_mixed_into_new_version():
+    server = make_server(buffer_size=2, mixing_rate=0.5)
+    await server.receive_update(1, {'weights': [np.ones(3, dtype=np.float32)], 'num_samples': 1, 'version': 0})
+    assert server.version == 0
+    await server.receive_update(2, {'weights': [np.ones(3, dtype=np.float32)], 'num_samples': 3, 'version': 0})
+    assert server.version == 1
+    assert server.model_weights[0].dtype == np.float32
+    assert np.allclose(server.model_weights[0], 0.5)
+
+@pytest.mark.asyncio
+async def test_stale_updates_are_down_weighted_or_dropped():
+    server = make_server(buffer_size=1, mixing_rate=1.0, staleness_exponent=1.0, max_staleness=2)
+    server.version = 3
+    await server.receive_update(1, {'weights': [np.ones(3)], 'num_samples': 1, 'version': 0})
+    assert server.version == 3
+    # Staleness 1 halves the mixing rate: 0.5 * 1 + 0.5 * 0.
+    await server.receive_update(1, {'weights': [np.ones(3)], 'num_samples': 1, 'version': 2})
+    assert server.version == 4
+    assert np.allclose(server.model_weights[0], 0.5)
+
+@pytest.mark.asyncio
+async def test_pull_returns_latest_version():
+    server = make_server()
+    sent = []
+
+    async def send(client_id, message):
+        sent.append((client_id, message))
+
+    server.connection.send = send
+    await server.send_model(7)
+    assert sent[0][0] == 7 and sent[0][1]['version'] == 0
+
+@pytest.mark.asyncio
+async def test_partial_sums_are_rejected():
+    server = make_server(buffer_size=1)
+    await server.receive_update('edge', {'partial': [np.ones(3)], 'num_samples': 4, 'num_updates': 2})
+    assert server.metrics.get('rejected_updates_total') == 1
+    assert server.version == 0 and server.aggregator.num_updates == 0
+
+@pytest.mark.asyncio
+async def test_model_and_versions_are_required():
+    with pytest.raises(ValueError, match='initial_weights'):
+        AsyncCentralServer(context=create_context('fast'))
+    server = make_server(buffer_size=1)
+    server.version = 5
+    # Leaving the version out must not pass the update off as fresh.
+    await server.receive_update(1, {'weights': [np.ones(3)], 'num_samples': 1})
+    assert server.metrics.get('rejected_updates_total') == 1
+    assert server.version == 5 and server.aggregator.num_updates == 0
@@ -1,7 +1,11 @@
 import asyncio
+import numpy as np
 import pytest
+from federated_learning_framework.active_learning import margin
 from federated_learning_framework.central_server import CentralServer
-from federated_learning_framework.encryption import create_context
+from federated_learning_framework.client_device import ClientDevice
+from federated_learning_framework.connection import ConnectionClient
+from federated_learning_framework.encryption import create_context, decrypt_weights, encrypt_weights
 
 @pytest.mark.asyncio
 async def test_central_server():
@@ -16,3 +20,123 @@ async def test_central_server():
     server_task.cancel()
     with pytest.raises(asyncio.CancelledError):
         await server_task
+
+class TableModel:
+    def __init__(self, probabilities):
+        self.probabilities = probabilities
+
+    def predict(self, data):
+        return self.probabilities[np.asarray(data, dtype=np.int64).ravel()]
+
+@pytest.mark.asyncio
+async def test_federated_query_merges_client_top_k():
+    rng = np.random.default_rng(0)
+    pools = [rng.dirichlet(np.ones(3), size=size) for size in (300, 200)]
+    server = CentralServer(connection_type='memory', port=9300, context=create_context('fast'))
+    server_task = asyncio.ensure_future(server.run_server())
+    await asyncio.sleep(0)
+    clients = [ClientDevice(client_id, TableModel(pool), None, connection_type='memory',
+                            unlabeled_data=np.arange(len(pool))[:, None]) for client_id, pool in enumerate(pools)]
+    for client in clients:
+        await client.connect_to_central_server('memory://localhost:9300')
+    # Connected, but never answers queries.
+    silent = ConnectionClient('memory', 'memory://localhost:9300')
+    await silent.connect()
+    await silent.send({'client_id': 'silent'})
+    loops = [asyncio.ensure_future(client.federated_learning(None)) for client in clients]
+    while len(server.clients) < 3:
+        await asyncio.sleep(0.01)
+
+    selection = await server.query_clients(10, strategy='margin', timeout=1.0)
+    # The server identifies clients by connection, in connection order.
+    connection_ids = sorted(server.clients)[:2]
+    scores = np.concatenate([margin(pool) for pool in pools])
+    owners = [(client_id, index) for client_id, pool in zip(connection_ids, pools) for index in range(len(pool))]
+    expected = [owners[position] for position in np.argsort(-scores, kind='stable')[:10]]
+    assert [(client_id, index) for client_id, index, _ in selection] == expected
+    assert server.metrics.events[-1]['answered'] == 2
+    assert list(await server.get_data_from_client(connection_ids[1])) == [
+        index for client_id, index in expected if client_id == connection_ids[1]]
+
+    await asyncio.gather(*(client.connection.channel.close() for client in clients), silent.channel.close())
+    for task in loops + [server_task]:
+        task.cancel()
+    await asyncio.gather(*loops, server_task, return_exceptions=True)
+
+@pytest.mark.asyncio
+async def test_reconnecting_client_resumes_without_download():
+    server = CentralServer(connection_type='memory', port=9313, context=create_context('fast'))
+    server.model_weights = [np.ones(3, dtype=np.float32)]
+    server.round_id = 4
+    server_task = asyncio.ensure_future(server.run_server())
+    await asyncio.sleep(0)
+    client = ClientDevice('phone', TableModel(None), None, connection_type='memory')
+    await client.connect_to_central_server('memory://localhost:9313')
+    while 'phone' not in server.clients:
+        await asyncio.sleep(0.01)
+
+    # Holding the current round: the session resumes and no model is sent.
+    client.round_id = 4
+    await server.connection.clients['phone'].close()
+    assert await client.reconnect()
+    while server.metrics.get('session_resumes_total') is None:
+        await asyncio.sleep(0.01)
+    assert client.connection.channel.inbox.empty()
+    assert server.clients == {'phone'}
+
+    # A stale round gets the current model.
+    client.round_id = 3
+    await server.connection.clients['phone'].close()
+    assert await client.reconnect()
+    message = await client.receive_message()
+    assert message['round'] == 4 and np.array_equal(message['weights'][0], np.ones(3))
+
+    await client.connection.channel.close()
+    server_task.cancel()
+    await asyncio.gather(server_task, return_exceptions=True)
+
+@pytest.mark.asyncio
+async def test_malformed_encrypted_updates_do_not_hold_the_round():
+    context = create_context('fast')
+    server = CentralServer(context=context, quorum=1)
+    server.model_weights = [np.zeros(3)]
+    encrypted = encrypt_weights(context, [np.full(3, 2.0)])
+    # No manifest, then a well-formed manifest with a ciphertext TenSEAL cannot parse.
+    await server.receive_update(1, {'weights': {'chunks': encrypted['chunks']}})
+    await server.receive_update(1, {'weights': {'manifest': encrypted['manifest'], 'chunks': [b'garbage']}})
+    assert server.metrics.get('rejected_updates_total') == 2
+    assert server.round_aggregator is None and server.encrypted_aggregator.manifest is None
+
+    # Plaintext updates are still accepted, and so are valid encrypted ones.
+    await server.receive_update(1, {'weights': [np.ones(3)]})
+    assert server.round_id == 1 and np.allclose(server.model_weights[0], 1.0)
+    server.model_weights = [np.zeros(3)]
+    await server.receive_update(1, {'weights': encrypted})
+    assert server.round_id == 2
+    assert np.allclose(decrypt_weights(context, server.model_weights)[0], 2.0, atol=1e-3)
+
+@pytest.mark.asyncio
+async def test_malformed_query_results_are_dropped():
+    server = CentralServer(context=create_context('fast'))
+    replies = {
+        1: {'indices': np.array([4, 2]), 'scores': np.array([0.9, 0.5])},
+        2: {'indices': np.array([0, 1, 2]), 'scores': np.array([0.8, 0.7])},
+        3: {'indices': np.array([0])},
+        4: {'indices': np.arange(4), 'scores': np.ones(4)},
+        5: {'indices': np.array([0]), 'scores': np.array([np.nan])},
+        6: {'indices': np.array([0.5]), 'scores': np.array([1.0])},
+        7: {'indices': np.array([-1]), 'scores': np.array([1.0])},
+    }
+    server.clients.update(replies)
+
+    async def broadcast(client_ids, message, timeout=None):
+        for client_id in client_ids:
+            asyncio.get_running_loop().call_soon(
+                server.receive_query_result, client_id, {'query_result': message['query'], **replies[client_id]})
+        return list(client_ids)
+
+    server.connection.broadcast = broadcast
+    selection = await server.query_clients(3, timeout=1.0)
+    assert [(client_id, index) for client_id, index, _ in selection] == [(1, 4), (1, 2)]
+    assert server.metrics.get('rejected_query_results_total') == 6
+    assert server.metrics.events[-1]['answered'] == 1
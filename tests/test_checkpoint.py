@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from federated_learning_framework.async_server import AsyncCentralServer
+from federated_learning_framework.central_server import CentralServer
+from federated_learning_framework.checkpoint import CheckpointStore
+from federated_learning_framework.encryption import create_context
+
+def test_deltas_store_only_changed_layers(tmp_path):
+    store = CheckpointStore(str(tmp_path), full_every=3)
+    weights = [np.arange(6, dtype=np.float32).reshape(2, 3), np.ones(4), np.zeros(2)]
+    store.save(1, weights)
+    second = [weights[0], weights[1] * 2, weights[2]]
+    store.save(2, second)
+    third = [second[0] + 1, second[1], second[2]]
+    store.save(3, third)
+    assert [layer is None for layer in store.read(2)['layers']] == [True, False, True]
+    assert [layer is None for layer in store.read(3)['layers']] == [False, True, True]
+
+    loaded, checkpoint = CheckpointStore(str(tmp_path)).load()
+    assert checkpoint['round'] == 3
+    for layer, expected in zip(loaded, third):
+        assert np.array_equal(layer, expected) and layer.dtype == expected.dtype
+        # Layers are views of the mapped file, not copies.
+        assert not layer.flags.writeable and not layer.flags.owndata
+    assert np.array_equal(store.load(2)[0][1], second[1])
+
+def test_full_checkpoints_and_pruning(tmp_path):
+    store = CheckpointStore(str(tmp_path), full_every=2, keep=1)
+    for round_id in range(1, 6):
+        store.save(round_id, [np.full(3, round_id, dtype=np.float32)])
+    # Rounds 1, 3 and 5 are full; only the newest full chain is kept.
+    assert store.rounds() == [5]
+    assert store.info(5)['full']
+    assert np.array_equal(store.load()[0][0], np.full(3, 5))
+
+@pytest.mark.asyncio
+async def test_server_resumes_from_checkpoint(tmp_path):
+    context = create_context('fast')
+    server = CentralServer(connection_type='memory', port=9301, context=context, checkpoint=str(tmp_path))
+    for round_id in range(2):
+        await server.receive_update(1, {'weights': [np.full(4, round_id, dtype=np.float32)], 'num_samples': 1})
+    await server.checkpoint_task
+    assert server.round_id == 2
+
+    restarted = CentralServer(connection_type='memory', port=9302, context=context, checkpoint=str(tmp_path))
+    assert restarted.round_id == 2
+    assert np.array_equal(restarted.model_weights[0], np.ones(4))
+
+@pytest.mark.asyncio
+async def test_async_server_restores_version(tmp_path):
+    server = AsyncCentralServer(connection_type='memory', port=9303, context=create_context('fast'),
+                                initial_weights=[np.zeros(2)], buffer_size=1, checkpoint=str(tmp_path))
+    await server.receive_update(1, {'weights': [np.ones(2)], 'num_samples': 1, 'version': 0})
+    await server.checkpoint_task
+    restarted = AsyncCentralServer(connection_type='memory', port=9304, context=create_context('fast'),
+                                   initial_weights=[np.zeros(2)], checkpoint=str(tmp_path))
+    assert restarted.version == 1
+    assert np.array_equal(restarted.model_weights[0], server.model_weights[0])
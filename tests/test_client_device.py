@@ -23,3 +23,27 @@ async def test_client_device():
     connect_task.cancel()
     with pytest.raises(asyncio.CancelledError):
         await connect_task
+
+class QueuedConnection:
+    def __init__(self, *messages):
+        self.sent = []
+        self.inbox = asyncio.Queue()
+        for message in messages:
+            self.inbox.put_nowait(message)
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def receive(self):
+        return await self.inbox.get()
+
+@pytest.mark.asyncio
+async def test_messages_before_the_compression_reply_are_kept():
+    client = ClientDevice(client_id=1, model=None, context=None, compression='topk')
+    query, dispatch = {'query': 1, 'k': 5}, {'weights': [], 'round': 0}
+    client.connection = QueuedConnection(query, dispatch, {'compression': 'topk'})
+    await client.start_session()
+    assert client.compressor.name == 'topk'
+    assert client.connection.sent[0]['compression'] == 'topk'
+    assert await client.receive_message() is query
+    assert await client.receive_message() is dispatch
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from federated_learning_framework.codec import BinaryCodec, PickleCodec, CodecError, get_codec
+
+def test_binary_codec_roundtrip():
+    codec = BinaryCodec()
+    message = {
+        'weights': [np.random.rand(3, 4).astype(np.float32), np.arange(5, dtype=np.int64)],
+        'round': 7,
+        'num_samples': np.int64(12),
+        'encrypted': {'manifest': [{'shape': [2], 'dtype': '<f4'}], 'chunks': [b'\x00\x01\x02']},
+    }
+    data = b''.join(codec.encode(message))
+    header = codec.decode_header(data)
+    assert header['type'] == 'weights' and header['round'] == 7
+    decoded = codec.decode(data)
+    assert decoded['round'] == 7 and decoded['num_samples'] == 12
+    assert decoded['encrypted']['chunks'] == [b'\x00\x01\x02']
+    for original, restored in zip(message['weights'], decoded['weights']):
+        assert restored.dtype == original.dtype
+        assert np.array_equal(original, restored)
+        # Decoded tensors are views into the received buffer, not copies.
+        assert not restored.flags.owndata
+
+def test_binary_codec_rejects_unknown_data():
+    codec = BinaryCodec()
+    with pytest.raises(CodecError):
+        codec.decode(PickleCodec().encode({'weights': []})[0])
+    with pytest.raises(CodecError):
+        codec.encode({'weights': [np.array([object()])]})
+
+def test_get_codec():
+    assert isinstance(get_codec('pickle'), PickleCodec)
+    message = {'data': np.ones(3)}
+    assert np.array_equal(get_codec('pickle').decode(get_codec('pickle').encode(message)[0])['data'], message['data'])
+    with pytest.raises(ValueError):
+        get_codec('msgpack')
+
+def test_round_none_in_header():
+    codec = get_codec('binary')
+    buffers = codec.encode({'client_id': 1, 'round': None})
+    assert codec.decode_header(buffers[0])['round'] == -1
+    assert codec.decode(b''.join(buffers)) == {'client_id': 1, 'round': None}
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from federated_learning_framework.compression import get_compressor, payload_nbytes, TopKCompressor
+
+def make_weights(seed):
+    rng = np.random.default_rng(seed)
+    return [rng.standard_normal((50, 20)).astype(np.float32), rng.standard_normal(20).astype(np.float32)]
+
+@pytest.mark.parametrize('name', ['none', 'delta', 'quant8', 'quant16'])
+def test_compressor_roundtrip(name):
+    reference = make_weights(0)
+    weights = [ref + 0.01 * noise for ref, noise in zip(reference, make_weights(1))]
+    client, server = get_compressor(name), get_compressor(name)
+    restored = server.decompress(client.compress(weights, reference), reference)
+    tolerance = {'quant8': 1e-3, 'quant16': 1e-5}.get(name, 1e-6)
+    for original, result in zip(weights, restored):
+        assert result.shape == original.shape
+        assert np.allclose(original, result, atol=tolerance)
+
+def test_quantization_shrinks_payload():
+    reference = make_weights(0)
+    weights = make_weights(1)
+    full = payload_nbytes(get_compressor('none').compress(weights, reference))
+    assert payload_nbytes(get_compressor('quant8').compress(weights, reference)) < full / 3
+
+def test_topk_error_feedback():
+    reference = [np.zeros(100, dtype=np.float32)]
+    weights = [np.linspace(-1, 1, 100).astype(np.float32)]
+    client, server = TopKCompressor(ratio=0.1), TopKCompressor(ratio=0.1)
+    payload = client.compress(weights, reference)
+    assert len(payload['indices']) == 10
+    restored = server.decompress(payload, reference)[0]
+    assert np.count_nonzero(restored) == 10
+    # Whatever was not sent is carried over, so sent + residual equals the full delta.
+    assert np.allclose(restored + client.residual, weights[0])
+
+@pytest.mark.asyncio
+async def test_server_decompresses_into_aggregation():
+    from federated_learning_framework.central_server import CentralServer
+    from federated_learning_framework.encryption import create_context
+    server = CentralServer(context=create_context('fast'), quorum=1)
+    server.clients.add(1)
+    server.model_weights = make_weights(0)
+    await server.negotiate_session(1, {'client_id': 1, 'compression': 'delta'})
+    weights = make_weights(1)
+    update = get_compressor('delta').compress(weights, server.model_weights)
+    await server.receive_compressed_update(1, {'update': update, 'compression': 'delta', 'round': 0, 'num_samples': 4})
+    assert server.round_id == 1
+    assert np.allclose(server.model_weights[0], weights[0], atol=1e-6)
+
+def malformed_updates(reference):
+    topk = TopKCompressor(ratio=0.1).compress(make_weights(1), reference)
+    quant = get_compressor('quant8').compress(make_weights(1), reference)
+    return [
+        ('topk', {**topk, 'indices': np.array([1, 10**6], dtype=np.uint32), 'values': np.ones(2, dtype=np.float32)}),
+        ('topk', {**topk, 'indices': np.array([-1], dtype=np.int64), 'values': np.ones(1, dtype=np.float32)}),
+        ('topk', {**topk, 'values': topk['values'][:-1]}),
+        ('topk', {**topk, 'shapes': [[10**6, 10**6], [20]]}),
+        ('topk', {'indices': topk['indices'], 'values': topk['values']}),
+        ('delta', {'delta': [np.zeros((50, 20), dtype=np.float32)]}),
+        ('delta', {'delta': [np.zeros((20, 50), dtype=np.float32), np.zeros(20, dtype=np.float32)]}),
+        ('quant8', {**quant, 'quantized': quant['quantized'][:1]}),
+        ('quant8', {**quant, 'scale': quant['scale'][:1]}),
+        ('none', None),
+    ]
+
+def test_malformed_payloads_raise_value_error():
+    reference = make_weights(0)
+    for name, payload in malformed_updates(reference):
+        with pytest.raises(ValueError):
+            get_compressor(name).decompress(payload, reference)
+
+@pytest.mark.asyncio
+async def test_server_rejects_malformed_compressed_updates():
+    from federated_learning_framework.central_server import CentralServer
+    from federated_learning_framework.encryption import create_context
+    server = CentralServer(context=create_context('fast'), quorum=1)
+    server.clients.add(1)
+    server.model_weights = make_weights(0)
+    # 'none' is never negotiated: such clients send plain weights.
+    updates = [(name, payload) for name, payload in malformed_updates(server.model_weights) if name != 'none']
+    for name, payload in updates:
+        await server.negotiate_session(1, {'client_id': 1, 'compression': name})
+        await server.receive_compressed_update(1, {'update': payload, 'compression': name, 'round': 0})
+    assert server.metrics.get('rejected_updates_total') == len(updates)
+    assert server.round_id == 0
+
+@pytest.mark.asyncio
+async def test_compressed_updates_need_a_global_model():
+    from federated_learning_framework.central_server import CentralServer
+    from federated_learning_framework.encryption import create_context
+    huge = {'indices': np.zeros(1, dtype=np.uint64), 'values': np.ones(1, dtype=np.float32), 'shapes': [[2**37]]}
+    with pytest.raises(ValueError, match='global model'):
+        TopKCompressor().decompress(huge, None)
+    server = CentralServer(context=create_context('fast'), quorum=1)
+    server.clients.add(1)
+    for name in ('topk', 'delta', 'quant8'):
+        await server.negotiate_session(1, {'client_id': 1, 'compression': name})
+        update = huge if name == 'topk' else get_compressor(name).compress(make_weights(1), None)
+        await server.receive_compressed_update(1, {'update': update, 'compression': name})
+    assert server.metrics.get('rejected_updates_total') == 3 and server.round_id == 0
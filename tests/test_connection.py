@@ -1,6 +1,11 @@
 import asyncio
+import numpy as np
 import pytest
-from federated_learning_framework.connection import ConnectionServer, ConnectionClient
+import websockets
+from websockets.exceptions import ConnectionClosed, ConnectionClosedError
+from federated_learning_framework.codec import get_codec
+from federated_learning_framework.connection import (ConnectionServer, ConnectionClient, Channel, MemorySocket, Transfer,
+                                                     CHUNK, CHUNK_HEADER, CHUNK_MAGIC)
 
 @pytest.mark.asyncio
 async def test_connection():
@@ -26,3 +31,266 @@ async def test_connection():
     server_task.cancel()
     with pytest.raises(asyncio.CancelledError):
         await server_task
+
+@pytest.mark.asyncio
+async def test_chunked_transfer():
+    async def handle_client(websocket, client_id):
+        message = await server.receive(client_id)
+        await server.send(client_id, message)
+
+    server = ConnectionServer('websocket', 'localhost', 8091, handle_client, chunk_size=4096, window=2)
+    server_task = asyncio.create_task(server.start())
+    await asyncio.sleep(1)
+
+    client = ConnectionClient('websocket', 'ws://localhost:8091', chunk_size=4096, window=2)
+    await client.connect()
+    weights = [np.random.rand(300, 100).astype(np.float32), np.arange(7, dtype=np.float64)]
+    await client.send({'weights': weights, 'round': 3})
+    received = await client.receive()
+
+    assert received['round'] == 3
+    assert all(np.array_equal(a, b) for a, b in zip(weights, received['weights']))
+    assert client.bytes_sent > 300 * 100 * 4
+
+    await client.connection.close()
+    server_task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await server_task
+
+class LoopbackSocket:
+    def __init__(self, inbox, outbox, fail_after=None):
+        self.inbox = inbox
+        self.outbox = outbox
+        self.fail_after = fail_after
+
+    async def send(self, data):
+        if self.fail_after is not None:
+            if self.fail_after == 0:
+                raise ConnectionClosedError(None, None)
+            self.fail_after -= 1
+        await self.outbox.put(data if isinstance(data, (bytes, bytearray)) else b''.join(bytes(piece) for piece in data))
+
+    async def recv(self):
+        return await self.inbox.get()
+
+@pytest.mark.asyncio
+async def test_chunked_transfer_resumes_after_disconnect():
+    codec = get_codec('binary')
+    receiver_assemblies = {}
+    message = {'weights': [np.random.rand(10000).astype(np.float32)]}
+    transfer = Transfer(codec.encode(message))
+
+    # First connection drops after three chunks.
+    up, down = asyncio.Queue(), asyncio.Queue()
+    sender = Channel(LoopbackSocket(down, up, fail_after=3), codec, {}, chunk_size=4096, window=2)
+    receiver = Channel(LoopbackSocket(up, down), codec, receiver_assemblies, chunk_size=4096, window=2)
+    with pytest.raises(ConnectionClosedError):
+        await sender.send_transfer(transfer)
+    await asyncio.sleep(0.1)
+    assert 0 < transfer.acked < transfer.total
+    assert transfer.transfer_id in receiver_assemblies
+    sender.reader.cancel()
+    receiver.reader.cancel()
+
+    # The retry only sends what was not acknowledged yet.
+    up, down = asyncio.Queue(), asyncio.Queue()
+    sender = Channel(LoopbackSocket(down, up), codec, {}, chunk_size=4096, window=8)
+    receiver = Channel(LoopbackSocket(up, down), codec, receiver_assemblies, chunk_size=4096, window=8)
+    await sender.send_transfer(transfer)
+    received = await receiver.receive()
+    assert np.array_equal(received['weights'][0], message['weights'][0])
+    sender.reader.cancel()
+    receiver.reader.cancel()
+
+@pytest.mark.asyncio
+async def test_broadcast_encodes_once_and_skips_slow_clients():
+    async def handle_client(websocket, client_id):
+        with pytest.raises(ConnectionClosed):
+            while True:
+                await server.receive(client_id)
+
+    server = ConnectionServer('websocket', 'localhost', 8092, handle_client, chunk_size=4096, window=1)
+    encode_calls = []
+    encode = server.codec.encode
+    server.codec.encode = lambda message: encode_calls.append(1) or encode(message)
+    server_task = asyncio.create_task(server.start())
+    await asyncio.sleep(1)
+
+    clients = [ConnectionClient('websocket', 'ws://localhost:8092') for _ in range(3)]
+    for client in clients:
+        await client.connect()
+    # A raw websocket that never reads never acknowledges chunks.
+    slow = await websockets.connect('ws://localhost:8092')
+    await asyncio.sleep(0.2)
+
+    weights = [np.random.rand(20000).astype(np.float32)]
+    delivered = await server.broadcast(list(server.clients), {'weights': weights}, timeout=2)
+    assert len(encode_calls) == 1
+    assert sorted(delivered) == [1, 2, 3]
+    for client in clients:
+        received = await client.receive()
+        assert np.array_equal(received['weights'][0], weights[0])
+
+    for client in clients:
+        await client.connection.close()
+    await slow.close()
+    server_task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await server_task
+
+async def wait_until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+@pytest.mark.asyncio
+async def test_client_ids_are_stable_and_sessions_are_removed():
+    async def handle_client(websocket, client_id):
+        with pytest.raises(ConnectionClosed):
+            while True:
+                await server.receive(client_id)
+
+    server = ConnectionServer('memory', 'localhost', 9310, handle_client, ping_interval=None)
+    server_task = asyncio.ensure_future(server.start())
+    await asyncio.sleep(0)
+    named = ConnectionClient('memory', 'memory://localhost:9310', client_id='device-7')
+    anonymous = [ConnectionClient('memory', 'memory://localhost:9310') for _ in range(2)]
+    for client in [named, *anonymous]:
+        await client.connect()
+    await wait_until(lambda: len(server.clients) == 3)
+    assert sorted(server.clients, key=str) == [1, 2, 'device-7']
+
+    # Ids are not reused after a disconnect, and closed sessions are dropped.
+    await anonymous[0].channel.close()
+    await wait_until(lambda: 1 not in server.clients)
+    late = ConnectionClient('memory', 'memory://localhost:9310')
+    await late.connect()
+    await wait_until(lambda: 3 in server.clients)
+
+    # Reconnecting under the same id replaces the old connection.
+    old_channel = server.clients['device-7']
+    await named.connect()
+    await wait_until(lambda: server.clients['device-7'] is not old_channel)
+    await wait_until(lambda: old_channel.closed is not None)
+    await named.send('still here')
+    assert len(server.clients) == 3
+
+    server_task.cancel()
+    await asyncio.gather(server_task, return_exceptions=True)
+
+@pytest.mark.asyncio
+async def test_silent_peers_are_evicted():
+    async def handle_client(websocket, client_id):
+        with pytest.raises(ConnectionClosed):
+            while True:
+                await server.receive(client_id)
+
+    server = ConnectionServer('memory', 'localhost', 9311, handle_client, ping_interval=0.05, ping_timeout=0.1)
+    server_task = asyncio.ensure_future(server.start())
+    await asyncio.sleep(0)
+    # A ConnectionClient answers pings from its reader; a bare socket never does.
+    alive = ConnectionClient('memory', 'memory://localhost:9311', client_id='alive')
+    await alive.connect()
+    dead, server_end = MemorySocket.pair()
+    server.accept(server_end, 'dead')
+    await wait_until(lambda: 'dead' not in server.clients)
+    await asyncio.sleep(0.2)
+    assert list(server.clients) == ['alive']
+    assert server.metrics.get('evicted_clients_total') == 1
+
+    server_task.cancel()
+    await asyncio.gather(server_task, return_exceptions=True)
+
+@pytest.mark.asyncio
+async def test_reconnect_backs_off_until_the_server_is_back():
+    async def handle_client(websocket, client_id):
+        with pytest.raises(ConnectionClosed):
+            while True:
+                await server.receive(client_id)
+
+    server = ConnectionServer('memory', 'localhost', 9312, handle_client, ping_interval=None)
+    client = ConnectionClient('memory', 'memory://localhost:9312', client_id='phone')
+    reconnect = asyncio.ensure_future(client.reconnect(attempts=20, base_delay=0.01, max_delay=0.05))
+    await asyncio.sleep(0.1)
+    assert not reconnect.done()
+    server_task = asyncio.ensure_future(server.start())
+    assert await reconnect
+    await wait_until(lambda: 'phone' in server.clients)
+    assert client.metrics.get('reconnects_total') == 1
+
+    server_task.cancel()
+    await asyncio.gather(server_task, return_exceptions=True)
+
+def chunk(transfer_id, offset, total, payload=b'x' * 8):
+    return CHUNK_HEADER.pack(CHUNK_MAGIC, CHUNK, 0, transfer_id, offset, total) + payload
+
+@pytest.mark.asyncio
+async def test_malformed_chunks_close_the_connection():
+    async def handle_client(websocket, client_id):
+        with pytest.raises(ConnectionClosed):
+            while True:
+                await server.receive(client_id)
+
+    server = ConnectionServer('memory', 'localhost', 9314, handle_client, ping_interval=None,
+                              max_message_size=1024, max_transfers=1)
+    server_task = asyncio.ensure_future(server.start())
+    await asyncio.sleep(0)
+    # Transfer ids are per client: the same id from two clients is two transfers.
+    sockets = {}
+    for client_id in ('a', 'b'):
+        sockets[client_id], server_end = MemorySocket.pair()
+        server.accept(server_end, client_id)
+        await sockets[client_id].send(chunk(7, 0, 64, bytes([ord(client_id)]) * 8))
+    await wait_until(lambda: all(7 in server.assemblies.get(client_id, {}) for client_id in 'ab'))
+    assert bytes(server.assemblies['a'][7].buffer[:8]) == b'a' * 8
+    assert bytes(server.assemblies['b'][7].buffer[:8]) == b'b' * 8
+
+    # Too large a transfer, a chunk past the end, and too many transfers in flight.
+    for client_id, data in [('big', chunk(1, 0, 1 << 40)), ('overrun', chunk(1, 60, 64)), ('a', chunk(8, 0, 64))]:
+        if client_id not in sockets:
+            sockets[client_id], server_end = MemorySocket.pair()
+            server.accept(server_end, client_id)
+            await wait_until(lambda: client_id in server.clients)
+        await sockets[client_id].send(data)
+        await wait_until(lambda: client_id not in server.clients)
+    assert 1 not in server.assemblies.get('big', {})
+    assert list(server.clients) == ['b']
+
+    server_task.cancel()
+    await asyncio.gather(server_task, return_exceptions=True)
+
+@pytest.mark.asyncio
+async def test_replaced_handler_stops_receiving():
+    received = []
+    finished = []
+
+    async def handle_client(websocket, client_id):
+        try:
+            while True:
+                message = await server.receive(client_id)
+                received.append((websocket, message))
+                # Still busy with a message when the client reconnects.
+                await asyncio.sleep(0.1)
+        except ConnectionClosed:
+            finished.append(websocket)
+
+    server = ConnectionServer('memory', 'localhost', 9315, handle_client, ping_interval=None)
+    server_task = asyncio.ensure_future(server.start())
+    await asyncio.sleep(0)
+    client = ConnectionClient('memory', 'memory://localhost:9315', client_id='phone')
+    await client.connect()
+    await client.send('first')
+    await wait_until(lambda: len(received) == 1)
+    await client.connect()
+    await client.send('second')
+    await wait_until(lambda: len(received) == 2 and finished)
+    await asyncio.sleep(0.2)
+    old, new = received[0][0], received[1][0]
+    assert [message for _, message in received] == ['first', 'second']
+    assert old is not new and finished == [old]
+    assert server.clients['phone'].websocket is new
+
+    await client.channel.close()
+    server_task.cancel()
+    await asyncio.gather(server_task, return_exceptions=True)
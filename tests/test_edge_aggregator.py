@@ -0,0 +1,109 @@
+import asyncio
+import numpy as np
+import pytest
+from federated_learning_framework.aggregation import WeightedAggregator, EncryptedAggregator
+from federated_learning_framework.central_server import CentralServer
+from federated_learning_framework.connection import ConnectionClient
+from federated_learning_framework.edge_aggregator import EdgeAggregator
+from federated_learning_framework.encryption import create_context, encrypt_weights, decrypt_weights, public_context
+
+def test_partial_sums_merge_like_flat_aggregation():
+    updates = [([np.full(3, float(i))], i + 1) for i in range(4)]
+    flat = WeightedAggregator()
+    for weights, num_samples in updates:
+        flat.add(weights, num_samples)
+    root = WeightedAggregator()
+    for group in (updates[:1], updates[1:]):
+        edge = WeightedAggregator()
+        for weights, num_samples in group:
+            edge.add(weights, num_samples)
+        root.add_partial(*edge.partial())
+    assert root.num_updates == 2
+    assert root.total_samples == flat.total_samples
+    assert np.allclose(root.result()[0], flat.result()[0])
+
+def test_encrypted_partial_sums():
+    context = create_context('fast')
+    server_context = public_context(context)
+    root = EncryptedAggregator(server_context)
+    for values in ([(1.0, 1), (5.0, 3)], [(2.0, 4)]):
+        edge = EncryptedAggregator(server_context)
+        for value, num_samples in values:
+            edge.add(encrypt_weights(context, [np.full(4, value)]), num_samples)
+        root.add_partial(*edge.partial())
+    result = decrypt_weights(context, root.result())
+    assert np.allclose(result[0], (1 + 15 + 8) / 8, atol=1e-3)
+
+@pytest.mark.asyncio
+async def test_root_receives_one_update_per_edge():
+    root = CentralServer(port=8095, context=create_context('fast'))
+    received = []
+    receive_update = root.receive_update
+
+    async def count_updates(client_id, message):
+        received.append(client_id)
+        await receive_update(client_id, message)
+
+    root.receive_update = count_updates
+    root_task = asyncio.create_task(root.run_server())
+    await asyncio.sleep(0.2)
+
+    edges = [EdgeAggregator('ws://localhost:8095', port=port, context=root.context) for port in (8096, 8097)]
+    edge_tasks = [asyncio.create_task(edge.run()) for edge in edges]
+    await asyncio.sleep(0.3)
+
+    clients = []
+    for edge in edges:
+        for _ in range(2):
+            client = ConnectionClient('websocket', f'ws://localhost:{edge.connection.port}')
+            await client.connect()
+            clients.append(client)
+    await asyncio.sleep(0.2)
+    assert len(root.clients) == 2
+
+    await root.transmit_weights([np.zeros(3, dtype=np.float32)])
+    for i, client in enumerate(clients):
+        message = await client.receive()
+        assert message['round'] == 0
+        await client.send({'weights': [np.full(3, float(i), dtype=np.float32)], 'num_samples': i + 1,
+                           'round': message['round']})
+    for client in clients:
+        message = await client.receive()
+        assert message['round'] == 1
+        # (0*1 + 1*2 + 2*3 + 3*4) / 10
+        assert np.allclose(message['weights'][0], 2.0)
+    assert len(received) == len(edges)
+
+    for client in clients:
+        await client.connection.close()
+    for task in edge_tasks + [root_task]:
+        task.cancel()
+    await asyncio.gather(*edge_tasks, root_task, return_exceptions=True)
+
+@pytest.mark.asyncio
+async def test_edge_reaches_the_root_over_tcp():
+    root = CentralServer('tcp', port=9330, context=create_context('fast'))
+    root_task = asyncio.create_task(root.run_server())
+    await asyncio.sleep(0.2)
+    # The root link follows the edge's own transport unless root_connection_type says otherwise.
+    edge = EdgeAggregator('tcp://localhost:9330', 'tcp', port=9331, context=root.context)
+    assert EdgeAggregator('ws://localhost:9330', 'tcp', port=9332, context=root.context,
+                          root_connection_type='websocket').root.connection_type == 'websocket'
+    edge_task = asyncio.create_task(edge.run())
+    while len(root.clients) < 1:
+        await asyncio.sleep(0.01)
+
+    client = ConnectionClient('tcp', 'tcp://localhost:9331')
+    await client.connect()
+    while len(edge.clients) < 1:
+        await asyncio.sleep(0.01)
+    await root.transmit_weights([np.zeros(3, dtype=np.float32)])
+    message = await client.receive()
+    await client.send({'weights': [np.full(3, 2.0, dtype=np.float32)], 'num_samples': 1, 'round': message['round']})
+    message = await client.receive()
+    assert message['round'] == 1 and np.allclose(message['weights'][0], 2.0)
+
+    await client.connection.close()
+    for task in (edge_task, root_task):
+        task.cancel()
+    await asyncio.gather(edge_task, root_task, return_exceptions=True)
@@ -1,5 +1,5 @@
 import numpy as np
-from federated_learning_framework.encryption import create_context, encrypt_weights, decrypt_weights
+from federated_learning_framework.encryption import create_context, encrypt_weights, decrypt_weights, save_context, load_context
 
 def test_encryption():
     context = create_context()
@@ -7,3 +7,36 @@ def test_encryption():
     encrypted = encrypt_weights(context, weights)
     decrypted = decrypt_weights(context, encrypted)
     assert np.allclose(weights[0], decrypted[0])
+
+def test_packed_encryption_roundtrip():
+    context = create_context()
+    weights = [np.random.rand(300, 100).astype(np.float32), np.random.rand(100).astype(np.float32),
+               np.random.rand(10, 10), np.arange(3, dtype=np.float32)]
+    encrypted = encrypt_weights(context, weights)
+    # 30213 values fit in two 16384-slot ciphertexts instead of one per layer.
+    assert len(encrypted['chunks']) == 2
+    decrypted = decrypt_weights(context, encrypted)
+    for original, restored in zip(weights, decrypted):
+        assert restored.shape == original.shape
+        assert restored.dtype == original.dtype
+        assert np.allclose(original, restored, atol=1e-4)
+
+def test_context_profiles_and_cache():
+    fast = create_context('fast')
+    assert create_context('fast') is fast
+    assert create_context('fast', cache=False) is not fast
+    assert not fast.has_galois_keys()
+    assert create_context('balanced') is not fast
+
+def test_save_and_load_context(tmp_path):
+    context = create_context('fast')
+    save_context(context, tmp_path / 'public.ctx')
+    save_context(context, tmp_path / 'full.ctx', secret_key=True)
+    server_context = load_context(tmp_path / 'public.ctx')
+    client_context = load_context(tmp_path / 'full.ctx')
+    assert not server_context.has_secret_key()
+    assert client_context.has_secret_key()
+
+    weights = [np.random.rand(5, 5)]
+    encrypted = encrypt_weights(client_context, weights)
+    assert np.allclose(weights[0], decrypt_weights(client_context, encrypted)[0], atol=1e-4)
@@ -0,0 +1,13 @@
+from benchmarks.imports import TARGETS, measure_import
+
+# Generous enough for a slow CI machine; loading TensorFlow or PyTorch alone takes seconds.
+CORE_IMPORT_BUDGET = 1.0
+
+def test_core_import_loads_no_backend():
+    result = measure_import(TARGETS['core'], repeats=2)
+    assert result['loaded'] == []
+    assert result['seconds'] < CORE_IMPORT_BUDGET
+
+def test_backends_load_on_first_use():
+    assert measure_import("from federated_learning_framework import ClientDevice, Simulation")['loaded'] == []
+    assert measure_import(TARGETS['encryption'])['loaded'] == ['tenseal']
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import logging
+import numpy as np
+import pytest
+from federated_learning_framework.central_server import CentralServer
+from federated_learning_framework.connection import ConnectionClient, ConnectionServer
+from federated_learning_framework.encryption import create_context
+from federated_learning_framework.metrics import JsonlSink, MetricsRegistry, PrometheusEndpoint
+
+def test_registry_and_prometheus_text():
+    metrics = MetricsRegistry()
+    metrics.inc('bytes_sent_total', 100, peer=1)
+    metrics.inc('bytes_sent_total', 50, peer=1)
+    metrics.set('connected_clients', 3)
+    metrics.observe('aggregate_seconds', 0.003)
+    metrics.observe('aggregate_seconds', 2.0)
+    assert metrics.get('bytes_sent_total', peer=1) == 150
+    assert metrics.get('aggregate_seconds').count == 2
+    text = metrics.prometheus_text()
+    assert 'federated_learning_bytes_sent_total{peer="1"} 150' in text
+    assert 'federated_learning_connected_clients 3' in text
+    assert 'federated_learning_aggregate_seconds_bucket{le="0.005"} 1' in text
+    assert 'federated_learning_aggregate_seconds_bucket{le="+Inf"} 2' in text
+
+def test_prometheus_label_values_are_escaped():
+    metrics = MetricsRegistry()
+    metrics.inc('bytes_sent_total', 10, peer='evil"} 1\nfake_metric{x="')
+    metrics.inc('bytes_sent_total', 20, peer='back\\slash')
+    lines = metrics.prometheus_text().splitlines()
+    assert not any(line.startswith('fake_metric') for line in lines)
+    assert 'federated_learning_bytes_sent_total{peer="evil\\"} 1\\nfake_metric{x=\\""} 10' in lines
+    assert 'federated_learning_bytes_sent_total{peer="back\\\\slash"} 20' in lines
+
+def test_jsonl_sink(tmp_path):
+    metrics = MetricsRegistry()
+    sink = metrics.add_sink(JsonlSink(tmp_path / 'metrics.jsonl', metrics))
+    metrics.event('round', round=0, total=0.5)
+    metrics.inc('updates_total')
+    sink.close()
+    records = [json.loads(line) for line in open(tmp_path / 'metrics.jsonl')]
+    assert records[0]['event'] == 'round' and records[0]['total'] == 0.5
+    assert records[1]['event'] == 'snapshot' and records[1]['counters']['updates_total'] == 1
+
+@pytest.mark.asyncio
+async def test_prometheus_endpoint():
+    metrics = MetricsRegistry()
+    metrics.inc('updates_total', 7)
+    endpoint = PrometheusEndpoint(metrics, host='localhost', port=9191)
+    await endpoint.start()
+    reader, writer = await asyncio.open_connection('localhost', 9191)
+    writer.write(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    response = (await reader.read()).decode()
+    writer.close()
+    await endpoint.stop()
+    assert response.startswith('HTTP/1.1 200 OK')
+    assert 'federated_learning_updates_total 7' in response
+
+@pytest.mark.asyncio
+async def test_round_metrics():
+    server = CentralServer(context=create_context('fast'), quorum=2)
+    server.clients.update({1, 2})
+    await server.receive_update(1, {'weights': [np.zeros(4)], 'num_samples': 1})
+    await server.receive_update(2, {'weights': [np.ones(4)], 'num_samples': 1})
+    assert server.metrics.get('aggregate_seconds').count == 2
+    assert server.metrics.get('updates_total', kind='plaintext') == 2
+    record = server.metrics.events[-1]
+    assert record['event'] == 'round' and record['updates'] == 2
+    assert record['total'] >= record['aggregation']
+
+class Payload:
+    formatted = 0
+
+    def __repr__(self):
+        Payload.formatted += 1
+        return 'Payload()'
+
+@pytest.mark.asyncio
+async def test_payloads_are_not_formatted_unless_debug_logging(caplog):
+    async def handle_client(websocket, client_id):
+        message = await server.receive(client_id)
+        await server.send(client_id, {'echo': message['n']})
+
+    server = ConnectionServer('memory', 'localhost', 9192, handle_client, codec='pickle')
+    task = asyncio.ensure_future(server.start())
+    await asyncio.sleep(0)
+    client = ConnectionClient('memory', 'memory://localhost:9192', codec='pickle')
+    await client.connect()
+    with caplog.at_level(logging.INFO, logger='federated_learning_framework.connection'):
+        await client.send({'n': 1, 'payload': Payload()})
+        assert await client.receive() == {'echo': 1}
+    assert Payload.formatted == 0
+    assert server.metrics.get('bytes_received_total', peer='1') > 0
+    assert client.metrics.get('bytes_received_total', peer='server') > 0
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
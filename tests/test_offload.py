@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import numpy as np
+import pytest
+from federated_learning_framework import aggregation
+from federated_learning_framework.aggregation import WeightedAggregator, EncryptedAggregator
+from federated_learning_framework.codec import get_codec
+from federated_learning_framework.connection import Channel
+from federated_learning_framework.encryption import create_context, encrypt_weights, decrypt_weights, public_context
+from federated_learning_framework.offload import CPUPool
+
+class RecordingCodec:
+    name = 'recording'
+
+    def __init__(self):
+        self.codec = get_codec('binary')
+        self.threads = []
+
+    def encode(self, message):
+        self.threads.append(threading.current_thread().name)
+        return self.codec.encode(message)
+
+    def decode(self, data):
+        self.threads.append(threading.current_thread().name)
+        return self.codec.decode(data)
+
+class QueueSocket:
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    async def send(self, data):
+        await self.queue.put(data if isinstance(data, (bytes, bytearray)) else b''.join(bytes(piece) for piece in data))
+
+    async def recv(self):
+        return await self.queue.get()
+
+@pytest.mark.asyncio
+async def test_pool_runs_off_the_event_loop():
+    pool = CPUPool(2)
+    assert (await pool.run(lambda: threading.current_thread().name)).startswith('federated-cpu')
+    inline = CPUPool(0)
+    assert await inline.run(lambda: threading.current_thread()) is threading.current_thread()
+    pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_large_messages_are_encoded_and_decoded_on_the_pool():
+    codec = RecordingCodec()
+    socket = QueueSocket()
+    pool = CPUPool(1)
+    channel = Channel(socket, codec, {}, chunk_size=1 << 20, pool=pool)
+    await channel.send({'weights': [np.ones(100000, dtype=np.float32)]})
+    await channel.send({'ping': True})
+    assert np.allclose((await channel.receive())['weights'][0], 1.0)
+    assert await channel.receive() == {'ping': True}
+    # Encode and the large decode ran on the pool; the small message was decoded inline.
+    assert [name.startswith('federated-cpu') for name in codec.threads] == [True, True, True, False]
+    channel.reader.cancel()
+    pool.shutdown()
+
+def test_parallel_weighted_aggregation_matches_serial(monkeypatch):
+    monkeypatch.setattr(aggregation, 'BLOCK_SIZE', 1000)
+    updates = [[np.random.rand(50, 70).astype(np.float32), np.random.rand(3)] for _ in range(3)]
+    serial, parallel = WeightedAggregator(), WeightedAggregator(workers=3)
+    for i, weights in enumerate(updates):
+        serial.add(weights, i + 1)
+        parallel.add(weights, i + 1)
+    for expected, actual in zip(serial.result(), parallel.result()):
+        assert actual.dtype == expected.dtype
+        assert np.allclose(actual, expected)
+
+def test_encrypted_aggregation_across_chunks():
+    context = create_context('fast')
+    aggregator = EncryptedAggregator(public_context(context))
+    # 5000 values span two ciphertext chunks at this profile's 4096 slots.
+    aggregator.add(encrypt_weights(context, [np.full(5000, 1.0)]), 1)
+    aggregator.add(encrypt_weights(context, [np.full(5000, 4.0)]), 2)
+    result = decrypt_weights(context, aggregator.result())
+    assert np.allclose(result[0], 3.0, atol=1e-3)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+# TensorFlow stays out of this module; conftest.py loads torch before any module imports it.
+torch = pytest.importorskip('torch')
+import torch.nn as nn
+from federated_learning_framework.codec import get_codec
+from federated_learning_framework.models.pytorch_model import PyTorchModel
+
+def test_pytorch_weights_are_copied_in_place():
+    module = nn.Sequential(nn.Linear(4, 3), nn.Linear(3, 2))
+    model = PyTorchModel(module)
+    params = list(module.parameters())
+    pointers = [param.data_ptr() for param in params]
+
+    weights = [np.full(weight.shape, i, dtype=np.float32) for i, weight in enumerate(model.get_weights())]
+    model.set_weights(weights)
+    # The same tensors, with the same storage, so an optimizer's references stay valid.
+    assert all(a is b for a, b in zip(module.parameters(), params))
+    assert [param.data_ptr() for param in module.parameters()] == pointers
+    assert torch.all(params[3] == 3)
+
+    flat = model.flat_weights()
+    assert flat.dtype == np.float32 and flat.size == sum(param.numel() for param in params)
+    assert all(np.shares_memory(weight, flat) for weight in model.get_weights())
+    assert [entry['shape'] for entry in model.layer_index()] == [tuple(param.shape) for param in params]
+
+def test_pytorch_round_trip_through_codec_is_zero_copy():
+    model = PyTorchModel(nn.Linear(8, 4))
+    codec = get_codec('binary')
+    buffers = codec.encode({'weights': model.get_weights()})
+    assert np.shares_memory(np.frombuffer(buffers[1], dtype=np.uint8), model.flat)
+
+    target = PyTorchModel(nn.Linear(8, 4))
+    target.set_weights(codec.decode(b''.join(buffers))['weights'])
+    assert torch.equal(target.model.weight, model.model.weight)
+
+def test_pytorch_non_contiguous_and_float64_parameters():
+    module = nn.Module()
+    module.transposed = nn.Parameter(torch.zeros(4, 3).t())
+    module.precise = nn.Parameter(torch.zeros(2, dtype=torch.float64))
+    model = PyTorchModel(module)
+    precise = np.array([1 + 1e-12, 2.0])
+    model.set_weights([np.arange(12, dtype=np.float32).reshape(3, 4), precise])
+    assert not module.transposed.is_contiguous()
+    assert torch.equal(module.transposed, torch.arange(12, dtype=torch.float32).reshape(3, 4))
+    weights = model.get_weights()
+    assert weights[1].dtype == np.float64 and np.array_equal(weights[1], precise)
+
+def classification_data(num_samples=40, features=4, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(num_samples, features)).astype(np.float32)
+    return x, (x[:, 0] > 0).astype(np.int64)
+
+def test_pytorch_mini_batch_training_keeps_its_optimizer():
+    x, y = classification_data()
+    model = PyTorchModel(nn.Linear(4, 2), batch_size=16, lr=0.1, seed=0)
+    stats = model.train(x, y, epochs=2)
+    assert stats['steps'] == 6 and stats['samples'] == 80 and stats['num_samples'] == 40
+    assert stats['samples_per_sec'] > 0
+    optimizer = model.optimizer
+    model.set_weights(model.get_weights())
+    model.train(x, y)
+    assert model.optimizer is optimizer
+    assert model.last_train_stats['steps'] == 3
+
+def test_pytorch_local_steps_and_accumulation_with_a_data_loader():
+    x, y = classification_data()
+    loader = torch.utils.data.DataLoader(torch.utils.data.TensorDataset(torch.from_numpy(x), torch.from_numpy(y)),
+                                         batch_size=8)
+    stats = PyTorchModel(nn.Linear(4, 2), local_steps=7).train(loader)
+    # Five batches per pass, so seven steps run into a second pass over the loader.
+    assert stats['steps'] == 7 and stats['samples'] == 56 and stats['num_samples'] == 40
+    stats = PyTorchModel(nn.Linear(4, 2), accumulation_steps=2).train(loader)
+    assert stats['steps'] == 3 and stats['samples'] == 40
+
+    def generator():
+        for start in range(0, 40, 10):
+            yield torch.from_numpy(x[start:start + 10]), torch.from_numpy(y[start:start + 10])
+
+    stats = PyTorchModel(nn.Linear(4, 2)).train(generator(), epochs=3)
+    assert stats['steps'] == 4 and stats['num_samples'] == 40
+    # A re-iterable without a sized .dataset is counted once, not once per epoch.
+    batches = list(generator())
+    stats = PyTorchModel(nn.Linear(4, 2)).train(batches, epochs=3)
+    assert stats['steps'] == 12 and stats['samples'] == 120 and stats['num_samples'] == 40
@@ -0,0 +1,106 @@
+import asyncio
+import numpy as np
+import pytest
+from federated_learning_framework.central_server import CentralServer
+from federated_learning_framework.encryption import create_context
+from federated_learning_framework.scheduler import RoundScheduler
+
+def make_server(respond):
+    server = CentralServer(context=create_context('fast'))
+    server.clients.update({1, 2, 3, 4})
+
+    async def broadcast(client_ids, message, timeout=None):
+        for client_id in client_ids:
+            asyncio.ensure_future(respond(server, client_id, message))
+        return list(client_ids)
+
+    server.connection.broadcast = broadcast
+    return server
+
+@pytest.mark.asyncio
+async def test_round_samples_clients_and_aggregates():
+    async def respond(server, client_id, message):
+        await asyncio.sleep(0.01 * client_id)
+        weights = [w + client_id for w in message['weights']]
+        await server.receive_update(client_id, {'weights': weights, 'num_samples': 1, 'round': message['round']})
+
+    server = make_server(respond)
+    scheduler = RoundScheduler(server, fraction=0.5, round_timeout=5, seed=0)
+    stats = await scheduler.run(num_rounds=2, initial_weights=[np.zeros(3)])
+
+    assert server.round_id == 2
+    assert [s['participants'] for s in stats] == [2, 2]
+    assert [s['updates'] for s in stats] == [2, 2]
+    assert all(s['dispatch'] is not None and s['aggregation'] is not None and s['slowest_client'] > 0 for s in stats)
+    assert server.model_weights[0].shape == (3,)
+
+@pytest.mark.asyncio
+async def test_deadline_closes_round_and_drops_late_updates():
+    async def respond(server, client_id, message):
+        await asyncio.sleep(0.01 if client_id != 4 else 0.5)
+        await server.receive_update(client_id, {'weights': [np.full(2, float(client_id))], 'num_samples': 1,
+                                                'round': message['round']})
+
+    server = make_server(respond)
+    scheduler = RoundScheduler(server, fraction=1.0, round_timeout=0.2)
+    stats = await scheduler.run(num_rounds=1, initial_weights=[np.zeros(2)])
+    assert stats[0]['updates'] == 3
+    assert np.allclose(server.model_weights[0], 2.0)
+
+    await asyncio.sleep(0.5)
+    # Client 4's update for round 0 arrived after the deadline and was dropped.
+    assert stats[0]['stale'] == 1
+    assert server.round_aggregator is None
+
+@pytest.mark.asyncio
+async def test_participants_that_leave_do_not_hold_the_round_open():
+    async def respond(server, client_id, message):
+        if client_id == 4:
+            # Evicted before reporting; without a deadline the round must not wait for it.
+            await asyncio.sleep(0.05)
+            server.end_session(client_id)
+            return
+        await server.receive_update(client_id, {'weights': [np.full(2, float(client_id))], 'num_samples': 1,
+                                                'round': message['round']})
+
+    server = make_server(respond)
+    scheduler = RoundScheduler(server, fraction=1.0)
+    stats = await asyncio.wait_for(scheduler.run(num_rounds=1, initial_weights=[np.zeros(2)]), 2)
+    assert stats[0]['updates'] == 3
+    assert 4 not in scheduler.participants
+    assert np.allclose(server.model_weights[0], 2.0)
+
+    # A round whose only participant leaves ends without an update.
+    server.clients.intersection_update({1})
+    server.connection.broadcast = lambda client_ids, message, timeout=None: asyncio.sleep(0, list(client_ids))
+    round_task = asyncio.ensure_future(scheduler.run_round())
+    await asyncio.sleep(0.05)
+    server.end_session(1)
+    stats = await asyncio.wait_for(round_task, 2)
+    assert stats['updates'] == 0 and server.round_id == 2
+
+@pytest.mark.asyncio
+async def test_undelivered_dispatch_and_replayed_stale_updates():
+    async def respond(server, client_id, message):
+        pass
+
+    # No sampled client receives the model: the round ends at once, even without a deadline.
+    server = make_server(respond)
+    server.connection.broadcast = lambda client_ids, message, timeout=None: asyncio.sleep(0, [])
+    scheduler = RoundScheduler(server, fraction=1.0, staleness_decay=0.5)
+    stats = await asyncio.wait_for(scheduler.run(num_rounds=1, initial_weights=[np.zeros(2)]), 2)
+    assert stats[0]['participants'] == 4 and stats[0]['updates'] == 0 and server.round_id == 1
+
+    # In round 1, client 1 replays its round-0 update: only the first copy is aggregated.
+    server.connection.broadcast = lambda client_ids, message, timeout=None: asyncio.sleep(0, list(client_ids))
+    round_task = asyncio.ensure_future(scheduler.run_round())
+    await asyncio.sleep(0.01)
+    for _ in range(3):
+        await server.receive_update(1, {'weights': [np.full(2, 4.0)], 'num_samples': 1, 'round': 0})
+    assert server.aggregator.num_updates == 1 and scheduler.current['stale'] == 3
+    for client_id in (1, 2, 3, 4):
+        await server.receive_update(client_id, {'weights': [np.full(2, 1.0)], 'num_samples': 1, 'round': 1})
+    stats = await asyncio.wait_for(round_task, 2)
+    assert stats['updates'] == 4
+    # Four current updates of 1.0 and one stale 4.0 at half weight.
+    assert np.allclose(server.model_weights[0], (4 * 1.0 + 0.5 * 4.0) / 4.5)
@@ -0,0 +1,48 @@
+import time
+import numpy as np
+import pytest
+from federated_learning_framework.models.abstract_model import AbstractModel
+from federated_learning_framework.simulation import Simulation, dirichlet_partition, iid_partition, partition_views
+
+class LinearModel(AbstractModel):
+    def __init__(self, features):
+        self.weights = [np.zeros(features, dtype=np.float32)]
+
+    def get_weights(self):
+        return self.weights
+
+    def set_weights(self, weights):
+        self.weights = [np.array(weight, dtype=np.float32) for weight in weights]
+
+    def train(self, x_train, y_train, epochs=1):
+        for _ in range(epochs):
+            gradient = x_train.T @ (x_train @ self.weights[0] - y_train) / len(x_train)
+            self.weights[0] -= 0.1 * gradient.astype(np.float32)
+
+    def predict(self, data):
+        return data @ self.weights[0]
+
+def test_partitions_cover_the_dataset(tmp_path):
+    labels = np.repeat(np.arange(4), 50)
+    for partitions in (iid_partition(200, 8, seed=0), dirichlet_partition(labels, 8, alpha=0.1, seed=0)):
+        assert np.array_equal(np.sort(np.concatenate(partitions)), np.arange(200))
+    x = np.arange(200, dtype=np.float32).reshape(100, 2)
+    views = partition_views(x, np.arange(100), iid_partition(100, 3, seed=1), str(tmp_path / 'data'))
+    for x_part, y_part in views:
+        assert isinstance(x_part, np.memmap)
+        assert np.array_equal(x_part, x[y_part])
+
+@pytest.mark.asyncio
+async def test_simulation_with_thousands_of_clients(tmp_path):
+    rng = np.random.default_rng(0)
+    true_weights = np.array([1.0, -2.0, 0.5, 3.0], dtype=np.float32)
+    x = rng.normal(size=(20000, 4)).astype(np.float32)
+    y = x @ true_weights
+    simulation = Simulation(LinearModel(4), x, y, num_clients=5000, workdir=str(tmp_path), port=9100, seed=0,
+                            workers=0)
+    started = time.perf_counter()
+    stats = await simulation.run(num_rounds=2)
+    assert [round_stats['updates'] for round_stats in stats] == [5000, 5000]
+    assert time.perf_counter() - started < 120
+    loss = np.mean((x @ simulation.server.model_weights[0] - y) ** 2)
+    assert loss < np.mean(y ** 2)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+tf = pytest.importorskip('tensorflow')
+from federated_learning_framework.models.tensorflow_model import TensorFlowModel
+
+def test_tensorflow_weights_are_assigned_in_place():
+    keras_model = tf.keras.Sequential([tf.keras.Input(shape=(4,)), tf.keras.layers.Dense(3)])
+    model = TensorFlowModel(keras_model)
+    variables = list(keras_model.weights)
+    weights = [np.full(weight.shape, 2.0, dtype=np.float32) for weight in model.get_weights()]
+    model.set_weights(weights)
+    assert all(a is b for a, b in zip(keras_model.weights, variables))
+    assert np.allclose(keras_model.weights[0].numpy(), 2.0)
+    assert all(np.shares_memory(weight, model.flat_weights()) for weight in model.get_weights())
+    model.set_flat_weights(np.zeros(model.flat.size, dtype=np.float32))
+    assert np.allclose(keras_model.get_weights()[1], 0.0)
+
+def classification_data(num_samples=40, features=4, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(num_samples, features)).astype(np.float32)
+    return x, (x[:, 0] > 0).astype(np.int64)
+
+def test_tensorflow_training_from_a_prefetched_pipeline():
+    x, y = classification_data()
+    keras_model = tf.keras.Sequential([tf.keras.Input(shape=(4,)), tf.keras.layers.Dense(2)])
+    keras_model.compile(optimizer='sgd', loss=tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True))
+    model = TensorFlowModel(keras_model, batch_size=16, seed=0)
+    stats = model.train(x, y, epochs=2)
+    assert stats['steps'] == 6 and stats['samples'] == 80 and stats['num_samples'] == 40
+    optimizer = keras_model.optimizer
+    model.local_steps = 4
+    stats = model.train(x, y)
+    assert stats['steps'] == 4 and stats['samples'] == 40 + 16
+    assert keras_model.optimizer is optimizer
+
+def test_tensorflow_counts_the_rows_of_a_prebuilt_dataset():
+    # 40 rows in batches of 16: the last batch has 8 rows, not batch_size.
+    x, y = classification_data()
+    keras_model = tf.keras.Sequential([tf.keras.Input(shape=(4,)), tf.keras.layers.Dense(2)])
+    keras_model.compile(optimizer='sgd', loss=tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True))
+    dataset = tf.data.Dataset.from_tensor_slices((x, y)).batch(16)
+    model = TensorFlowModel(keras_model, batch_size=32)
+    stats = model.train(dataset, epochs=3)
+    # num_samples weighs the update in aggregation: the rows of one pass, as for arrays.
+    assert stats['steps'] == 9 and stats['samples'] == 120 and stats['num_samples'] == 40
+    model.local_steps = 4
+    stats = model.train(dataset)
+    assert stats['steps'] == 4 and stats['samples'] == 40 + 16 and stats['num_samples'] == 40
+    model.local_steps = 2
+    stats = model.train(dataset)
+    assert stats['samples'] == 32 and stats['num_samples'] == 32
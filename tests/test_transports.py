@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+import stat
+import numpy as np
+import pytest
+from websockets.exceptions import ConnectionClosed
+from federated_learning_framework.connection import ConnectionClient, ConnectionServer
+from federated_learning_framework.transports import (DATA, FRAME_HEADER, HELLO, SEGMENT, SHM_DIR, get_transport,
+                                                     unix_socket_path)
+
+async def echo_server(connection_type, port, **options):
+    async def handle_client(websocket, client_id):
+        with pytest.raises(ConnectionClosed):
+            while True:
+                message = await server.receive(client_id)
+                await server.send(client_id, {'echo': message, 'client_id': client_id})
+
+    server = ConnectionServer(connection_type, 'localhost', port, handle_client, ping_interval=None, **options)
+    task = asyncio.ensure_future(server.start())
+    await asyncio.sleep(0.1)
+    return server, task
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('connection_type, port', [('tcp', 9320), ('shm', 9321), ('memory', 9322)])
+async def test_round_trip(connection_type, port):
+    server, task = await echo_server(connection_type, port)
+    client = ConnectionClient(connection_type, f'{connection_type}://localhost:{port}', client_id='edge-1')
+    await client.connect()
+    assert client.connected
+    # Small messages go inline; larger ones (4 MB) exercise the shm segment and partial socket reads.
+    for size in (10, 1_000_000, 300_000, 1_200_000):
+        weights = [np.random.rand(size).astype(np.float32), np.arange(3)]
+        await client.send({'weights': weights, 'round': 1})
+        reply = await client.receive()
+        assert reply['client_id'] == 'edge-1'
+        assert all(np.array_equal(a, b) for a, b in zip(weights, reply['echo']['weights']))
+    assert list(server.clients) == ['edge-1']
+
+    await client.channel.close()
+    while server.clients:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+@pytest.mark.asyncio
+async def test_shm_segments_are_not_left_behind():
+    before = set(os.listdir(SHM_DIR))
+    server, task = await echo_server('shm', 9323)
+    client = ConnectionClient('shm', 'shm://localhost:9323')
+    await client.connect()
+    await client.send({'weights': [np.ones(500_000)]})
+    assert np.array_equal((await client.receive())['echo']['weights'][0], np.ones(500_000))
+    # The sender unlinks its segment once the reply's RELEASE has been processed.
+    for _ in range(100):
+        if set(os.listdir(SHM_DIR)) == before:
+            break
+        await asyncio.sleep(0.01)
+    assert set(os.listdir(SHM_DIR)) == before
+    await client.channel.close()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+def test_unknown_transport():
+    with pytest.raises(NotImplementedError):
+        get_transport('carrier-pigeon')
+
+async def assert_closed_by_server(sock, server, client_id):
+    with pytest.raises(ConnectionClosed):
+        await asyncio.wait_for(sock.next_frame(), 2)
+    for _ in range(100):
+        if client_id not in server.clients:
+            break
+        await asyncio.sleep(0.01)
+    assert client_id not in server.clients
+
+@pytest.mark.asyncio
+async def test_oversized_frames_close_the_connection():
+    server, task = await echo_server('tcp', 9324, max_message_size=1024)
+    transport = get_transport('tcp')
+    # A data frame over max_message_size is refused from its header alone.
+    sock = await transport.connect('tcp://localhost:9324', 'greedy')
+    sock.protocol.transport.write(FRAME_HEADER.pack(DATA, 1 << 40))
+    await assert_closed_by_server(sock, server, 'greedy')
+    # So is an oversized handshake, before any client id is known.
+    sock = await transport.open_connection('tcp://localhost:9324')
+    sock.transport.write(FRAME_HEADER.pack(HELLO, 1 << 30))
+    await asyncio.wait_for(sock.frames.get(), 2)
+    assert sock.closed is not None
+    # Messages within the limit still go through.
+    client = ConnectionClient('tcp', 'tcp://localhost:9324', max_message_size=1024)
+    await client.connect()
+    await client.send({'weights': [np.ones(16)]})
+    assert np.array_equal((await client.receive())['echo']['weights'][0], np.ones(16))
+    await client.channel.close()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+@pytest.mark.asyncio
+async def test_shm_only_reads_its_own_segments(tmp_path):
+    server, task = await echo_server('shm', 9325)
+    assert stat.S_IMODE(os.stat(unix_socket_path(9325)).st_mode) == 0o600
+    transport = get_transport('shm')
+    outside = tmp_path / 'secret'
+    outside.write_bytes(b'secret' * 100)
+    link = os.path.join(SHM_DIR, f'federated-link-{os.getpid()}')
+    os.symlink(outside, link)
+    small = os.path.join(SHM_DIR, f'federated-small-{os.getpid()}')
+    with open(small, 'wb') as f:
+        f.write(b'x' * 10)
+    try:
+        for client_id, descriptor in [('absolute', {'path': str(outside), 'nbytes': 6}),
+                                      ('traversal', {'path': SHM_DIR + '/../..' + str(outside), 'nbytes': 6}),
+                                      ('symlink', {'path': link, 'nbytes': 6}),
+                                      ('too-long', {'path': small, 'nbytes': 100})]:
+            sock = await transport.connect('shm://localhost:9325', client_id)
+            await sock.send(json.dumps(descriptor).encode(), SEGMENT)
+            await assert_closed_by_server(sock, server, client_id)
+    finally:
+        os.unlink(link)
+        os.unlink(small)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
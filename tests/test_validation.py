@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from federated_learning_framework.encryption import create_context, encrypt_weights
+from federated_learning_framework.validation import UpdateValidator
+
+def test_manifest_and_finite_checks():
+    validator = UpdateValidator()
+    reference = [np.zeros((2, 3), dtype=np.float32), np.zeros(4, dtype=np.float32)]
+    update = [np.ones((2, 3), dtype=np.float64), np.ones(4, dtype=np.float32)]
+    weights, norm = validator.validate(update, reference)
+    assert weights is update and norm is None
+    with pytest.raises(ValueError, match='layers'):
+        validator.validate(update[:1], reference)
+    with pytest.raises(ValueError, match='shape'):
+        validator.validate([np.ones((3, 2)), np.ones(4)], reference)
+    with pytest.raises(ValueError, match='dtype'):
+        validator.validate([np.ones((2, 3), dtype=np.complex64), np.ones(4)], reference)
+    with pytest.raises(ValueError, match='NaN'):
+        validator.validate([np.ones((2, 3)), np.array([1, 2, np.inf, 4])], reference)
+    # Before the first round there is no manifest, but values are still checked.
+    with pytest.raises(ValueError, match='NaN'):
+        validator.validate([np.array([np.nan])])
+
+def test_norm_clipping_in_blocks():
+    reference = [np.full(10, 2.0, dtype=np.float32), np.zeros((3, 3), dtype=np.float32)]
+    update = [np.full(10, 5.0, dtype=np.float32), np.full((3, 3), 4.0, dtype=np.float32)]
+    expected_norm = np.sqrt(10 * 9 + 9 * 16)
+    # A block smaller than the layers exercises the blockwise scan and clip.
+    validator = UpdateValidator(max_norm=1.0, block_size=4)
+    weights, norm = validator.validate(update, reference)
+    assert np.isclose(norm, expected_norm)
+    delta = np.concatenate([(w - r).ravel() for w, r in zip(weights, reference)])
+    assert np.isclose(np.linalg.norm(delta), 1.0, atol=1e-5)
+    assert np.allclose(delta[:10], 3.0 / expected_norm, atol=1e-6)
+    assert weights[0].dtype == np.float32
+    assert np.array_equal(update[0], np.full(10, 5.0))
+
+    small, norm = UpdateValidator(max_norm=100.0).validate(update, reference)
+    assert small is update and np.isclose(norm, expected_norm)
+    # Partial sums from edge aggregators are not clipped.
+    partial, norm = validator.validate(update, reference, partial=True)
+    assert partial is update and norm is None
+
+def test_encrypted_update_structure():
+    validator = UpdateValidator()
+    reference = [np.zeros((2, 3), dtype=np.float32), np.zeros(4, dtype=np.float32)]
+    update = encrypt_weights(create_context('fast'), [np.ones((2, 3)), np.ones(4)])
+    weights, norm = validator.validate(update, reference)
+    assert weights is update and norm is None
+    # An encrypted global model is compared by its manifest.
+    assert validator.validate(update, update)[0] is update
+    manifest, chunks = update['manifest'], update['chunks']
+    malformed = {
+        'manifest': {'chunks': chunks},
+        'layer manifest': {'manifest': [], 'chunks': chunks},
+        'shape': {'manifest': [{'shape': [-1], 'dtype': '<f8'}], 'chunks': chunks},
+        'dtype': {'manifest': [{'shape': [2], 'dtype': '<c16'}], 'chunks': chunks},
+        'chunks': {'manifest': manifest, 'chunks': ['not bytes']},
+        'do not match': {'manifest': manifest[:1], 'chunks': chunks},
+    }
+    for message, weights in malformed.items():
+        with pytest.raises(ValueError, match=message):
+            validator.validate(weights, reference)
+    with pytest.raises(ValueError, match='encrypted'):
+        validator.validate(reference, update)